@@ -0,0 +1,700 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Collection, Hashable, Iterable, Iterator, Mapping
+
+try:
+  from aiobotocore.config import AioConfig
+  from aiobotocore.session import AioSession
+except ImportError:
+  AioConfig = None
+  AioSession = None
+
+from cache import open_store, service_ttl
+from function import (
+  CellFailure,
+  Job,
+  build_cache_key,
+  cached_pages,
+  cached_responses,
+  empty_cell_key,
+  is_empty_page,
+  job_cache_keys,
+  job_cells,
+  project,
+  skip_recently_empty,
+  split_parameters,
+)
+from pipeline import END, PageQueue
+from scheduler import (
+  Scheduler,
+  SchedulerSettings,
+  botocore_retries,
+  is_throttle_error,
+  operation_name,
+)
+from stats import CACHE, Recorder
+
+# Marks the end of one cell's items on its outbox.
+_DONE = object()
+
+
+def available() -> bool:
+  return AioSession is not None
+
+
+class AsyncTokenBucket:
+  """TokenBucket for coroutines on one event loop; a rate of zero or less disables it."""
+
+  def __init__(self, rate: float, burst: int) -> None:
+    self.rate = rate
+    self.capacity = max(1, burst)
+    self._tokens = float(self.capacity)
+    self._updated = time.monotonic()
+
+  async def acquire(self) -> None:
+    if self.rate <= 0:
+      return
+    while True:
+      now = time.monotonic()
+      self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+      self._updated = now
+      if self._tokens >= 1:
+        self._tokens -= 1
+        return
+      await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncScheduler:
+  """Scheduler for coroutines on one event loop.
+
+  The same per-cell token buckets, AIMD concurrency limit and full-jitter
+  throttle retries as scheduler.Scheduler, but an in-flight request holds
+  a coroutine instead of a thread, so the limit is bounded by
+  settings.async_concurrency rather than max_workers.
+  """
+
+  def __init__(self, settings: SchedulerSettings | None = None, recorder: Recorder | None = None) -> None:
+    self.settings = settings or SchedulerSettings()
+    self.recorder = recorder
+    self.max_limit = self.settings.async_concurrency
+    self.limit = self.max_limit
+    self.throttles = 0
+    self._in_flight = 0
+    self._successes = 0
+    self._slots = asyncio.Condition()
+    self._buckets: dict[Hashable, AsyncTokenBucket] = {}
+
+  def bucket(self, cell: Hashable) -> AsyncTokenBucket:
+    bucket = self._buckets.get(cell)
+    if bucket is None:
+      bucket = AsyncTokenBucket(self.settings.rate, self.settings.burst)
+      self._buckets[cell] = bucket
+    return bucket
+
+  def backoff(self, attempt: int) -> float:
+    ceiling = min(self.settings.max_delay, self.settings.base_delay * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+  async def _acquire_slot(self) -> None:
+    async with self._slots:
+      await self._slots.wait_for(lambda: self._in_flight < self.limit)
+      self._in_flight += 1
+
+  async def _release_slot(self, throttled: bool) -> None:
+    async with self._slots:
+      self._in_flight -= 1
+      if throttled:
+        self.throttles += 1
+        self._successes = 0
+        self.limit = max(self.settings.min_workers, self.limit // 2)
+      else:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+          self.limit += 1
+          self._successes = 0
+      self._slots.notify_all()
+
+  async def _attempt(self, cell: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+    await self.bucket(cell).acquire()
+    await self._acquire_slot()
+    throttled = False
+    try:
+      return await fn(*args, **kwargs)
+    except Exception as error:
+      throttled = is_throttle_error(error)
+      raise
+    finally:
+      await self._release_slot(throttled)
+
+  async def call(self, cell: Hashable, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any) -> Any:
+    started = time.perf_counter()
+    attempt = 0
+    retried = 0
+    while True:
+      try:
+        response = await self._attempt(cell, fn, *args, **kwargs)
+      except Exception as error:
+        attempt += 1
+        retried += botocore_retries(getattr(error, "response", None))
+        if not is_throttle_error(error) or attempt >= self.settings.max_attempts:
+          if self.recorder is not None:
+            self.recorder.record(cell, operation_name(fn), started, attempts=attempt + retried, error=error)
+          raise
+        await asyncio.sleep(self.backoff(attempt))
+        continue
+      if self.recorder is not None:
+        self.recorder.record(
+          cell,
+          operation_name(fn),
+          started,
+          attempts=attempt + 1 + retried + botocore_retries(response),
+          response=response,
+        )
+      return response
+
+  async def iterate(
+    self,
+    cell: Hashable,
+    factory: Callable[[], AsyncIterator[Any]],
+    *,
+    operation: str = "",
+  ) -> AsyncIterator[Any]:
+    """Async counterpart of Scheduler.iterate, rebuilding the iterator after a throttle."""
+    iterator = factory().__aiter__()
+    delivered = 0
+    skip = 0
+    attempt = 0
+    retried = 0
+    started = time.perf_counter()
+    while True:
+      try:
+        item = await self._attempt(cell, iterator.__anext__)
+      except StopAsyncIteration:
+        return
+      except Exception as error:
+        attempt += 1
+        retried += botocore_retries(getattr(error, "response", None))
+        if not is_throttle_error(error) or attempt >= self.settings.max_attempts:
+          if self.recorder is not None:
+            self.recorder.record(cell, operation, started, attempts=attempt + retried, error=error)
+          raise
+        await asyncio.sleep(self.backoff(attempt))
+        iterator = factory().__aiter__()
+        skip = delivered
+        continue
+      if skip:
+        skip -= 1
+        continue
+      if self.recorder is not None:
+        self.recorder.record(
+          cell,
+          operation,
+          started,
+          attempts=attempt + 1 + retried + botocore_retries(item),
+          response=item,
+        )
+      attempt = 0
+      retried = 0
+      delivered += 1
+      yield item
+      started = time.perf_counter()
+
+
+class AsyncClients:
+  """aiobotocore clients for one run, one per (profile, region, service) cell.
+
+  Sessions share one botocore data loader as in clients.ClientCache, and
+  each client gets the per-service options CLIENT_CACHE was configured
+  with, except that its pool holds up to max_pool_connections keep-alive
+  connections. All of them are closed when the context exits.
+
+  Set as Scheduler.async_clients, one instance serves every call of a run
+  on its own event loop thread (see event_loop); close() ends it.
+  """
+
+  def __init__(self, max_pool_connections: int, endpoint_url: str | None = None) -> None:
+    if AioSession is None:
+      raise RuntimeError("the async engine requires aiobotocore")
+    from clients import CLIENT_CACHE
+
+    # Fixed at construction; a shell replaces its clients when these change.
+    self.options = CLIENT_CACHE.options
+    self._max_pool_connections = max_pool_connections
+    self._configs: dict[str, Any] = {}
+    self._endpoint_url = endpoint_url
+    self._sessions: dict[str, Any] = {}
+    self._clients: dict[tuple[str, str, str], Any] = {}
+    self._locks: dict[tuple[str, str, str], asyncio.Lock] = {}
+    self._loader: Any = None
+    self._stack = AsyncExitStack()
+    self._loop: asyncio.AbstractEventLoop | None = None
+    self._thread: threading.Thread | None = None
+
+  async def __aenter__(self) -> AsyncClients:
+    return self
+
+  async def __aexit__(self, *exc_info: Any) -> None:
+    await self._stack.aclose()
+
+  def event_loop(self) -> asyncio.AbstractEventLoop:
+    """The loop these clients live on when shared, started on first use."""
+    if self._loop is None:
+      self._loop = asyncio.new_event_loop()
+      self._thread = threading.Thread(target=self._loop.run_forever, name="at-async-engine", daemon=True)
+      self._thread.start()
+    return self._loop
+
+  def close(self) -> None:
+    """Close every client and stop the event_loop thread, if it was started."""
+    loop, self._loop = self._loop, None
+    if loop is None:
+      return
+    asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    self._thread.join()
+    loop.close()
+    self._sessions.clear()
+    self._clients.clear()
+    self._locks.clear()
+    self._stack = AsyncExitStack()
+
+  async def _shutdown(self) -> None:
+    await self._stack.aclose()
+    loop = asyncio.get_running_loop()
+    await loop.shutdown_asyncgens()
+    await loop.shutdown_default_executor()
+
+  def config(self, client_type: str) -> Any:
+    config = self._configs.get(client_type)
+    if config is None:
+      options = {
+        **self.options.get(client_type, self.options.get("default", {})),
+        "max_pool_connections": self._max_pool_connections,
+      }
+      config = AioConfig(**options)
+      self._configs[client_type] = config
+    return config
+
+  def session(self, profile_name: str) -> Any:
+    session = self._sessions.get(profile_name)
+    if session is None:
+      session = AioSession(profile=profile_name)
+      if self._loader is None:
+        self._loader = session.get_component("data_loader")
+      else:
+        session.register_component("data_loader", self._loader)
+      self._sessions[profile_name] = session
+    return session
+
+  async def client(self, profile_name: str, region: str, client_type: str) -> Any:
+    cell = (profile_name, region, client_type)
+    client = self._clients.get(cell)
+    if client is not None:
+      return client
+    async with self._locks.setdefault(cell, asyncio.Lock()):
+      client = self._clients.get(cell)
+      if client is None:
+        client = await self._stack.enter_async_context(
+          self.session(profile_name).create_client(
+            client_type,
+            region_name=region,
+            endpoint_url=self._endpoint_url,
+            config=self.config(client_type),
+          )
+        )
+        self._clients[cell] = client
+    return client
+
+
+async def _iter_pages(
+  client: Any,
+  function_name: str,
+  parameters: Iterable[Any] | Mapping[str, Any] | None,
+  paginate: bool,
+  scheduler: AsyncScheduler,
+  cell: tuple[str, str, str],
+) -> AsyncIterator[Any]:
+  args, kwargs = split_parameters(parameters)
+  if paginate and client.can_paginate(function_name):
+    paginator = client.get_paginator(function_name)
+    pages = scheduler.iterate(cell, lambda: paginator.paginate(*args, **kwargs), operation=function_name)
+    async for page in pages:
+      yield page
+  else:
+    yield await scheduler.call(cell, getattr(client, function_name), *args, **kwargs)
+
+
+@asynccontextmanager
+async def _run_clients(
+  shared: AsyncClients | None,
+  max_pool_connections: int,
+  endpoint_url: str | None,
+) -> AsyncIterator[AsyncClients]:
+  if shared is not None:
+    yield shared
+    return
+  async with AsyncClients(max_pool_connections, endpoint_url) as engine:
+    yield engine
+
+
+def _drive(
+  produce: Callable[[Callable[[Any], Awaitable[bool]]], Awaitable[None]],
+  max_pending: int,
+  shared: AsyncClients | None = None,
+) -> Iterator[Any]:
+  """Run produce(emit) on an event loop thread and yield what it emits.
+
+  The loop is shared's, or else private to this call. emit hands one item
+  to the calling thread through a bounded PageQueue and returns False once
+  the consumer has gone away. Closing the iterator cancels produce and
+  waits for it to finish.
+  """
+  channel = PageQueue(1, max_pending)
+
+  async def _emit(item: Any) -> bool:
+    return await asyncio.to_thread(channel.put, 0, item)
+
+  async def _main() -> None:
+    try:
+      await produce(_emit)
+    except Exception as error:
+      await _emit(error)
+    await asyncio.to_thread(channel.finish, 0)
+
+  if shared is not None:
+    loop = shared.event_loop()
+
+    async def _start() -> asyncio.Task[None]:
+      return asyncio.ensure_future(_main())
+
+    task = asyncio.run_coroutine_threadsafe(_start(), loop).result()
+    thread = None
+  else:
+    loop = asyncio.new_event_loop()
+    task = loop.create_task(_main())
+
+    def _run() -> None:
+      try:
+        loop.run_until_complete(task)
+      except asyncio.CancelledError:
+        pass
+      finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.run_until_complete(loop.shutdown_default_executor())
+        loop.close()
+
+    thread = threading.Thread(target=_run, name="at-async-engine", daemon=True)
+    thread.start()
+  try:
+    while True:
+      item = channel.get()
+      if item is END:
+        break
+      if isinstance(item, BaseException):
+        raise item
+      yield item
+  finally:
+    channel.stop()
+    try:
+      loop.call_soon_threadsafe(task.cancel)
+    except RuntimeError:
+      pass
+    if thread is not None:
+      thread.join()
+    else:
+      asyncio.run_coroutine_threadsafe(asyncio.wait([task]), loop).result()
+
+
+def stream_jobs(
+  clients: Mapping[str, Mapping[str, Iterable[str]]],
+  jobs: Iterable[Job],
+  *,
+  read: bool = False,
+  write: bool = False,
+  key: str | None = None,
+  directory: str = "./cache/",
+  paginate: bool = True,
+  max_pending_pages: int = 64,
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  endpoint_url: str | None = None,
+  recheck_empty: float | None = None,
+  failures: list[CellFailure] | None = None,
+) -> Iterator[tuple[str, str, str, str, Any]]:
+  """function.stream_jobs on aiobotocore: every cell is a coroutine on one loop.
+
+  Takes the same arguments and yields the same tuples; only the keys of
+  clients are used, the aiobotocore clients are the scheduler's
+  async_clients or, without them, built for this call. The scheduler's
+  settings, not its threads, govern rate limits, retries and concurrency.
+  endpoint_url points every client built here at one endpoint, such as a
+  local moto server.
+  """
+  settings = scheduler.settings if scheduler is not None else SchedulerSettings()
+  recorder = scheduler.recorder if scheduler is not None else None
+  shared = scheduler.async_clients if scheduler is not None else None
+  uses_store = read or write or ttl is not None or recheck_empty is not None
+  store = open_store(directory) if uses_store else None
+  cells = job_cells(clients, jobs)
+  if recheck_empty is not None:
+    cells = skip_recently_empty(store, cells, paginate, recheck_empty)
+
+  async def _cell_pages(
+    engine: AsyncClients,
+    limiter: AsyncScheduler,
+    job: Job,
+    profile_name: str,
+    region: str,
+    client_type: str,
+    client_region: str,
+  ) -> AsyncIterator[Any]:
+    cache_key, full_key = job_cache_keys(key, job, profile_name, region, client_type, paginate)
+    max_age = service_ttl(ttl, client_type)
+    cached = cached_pages(
+      store,
+      cache_key,
+      read=read,
+      max_age=max_age,
+      directory=directory,
+      paginate=paginate,
+      full_key=full_key,
+    )
+    if cached is not None:
+      if limiter.recorder is not None:
+        cached = limiter.recorder.cached((profile_name, region, client_type), job.function_name, cached)
+      for page in cached:
+        yield page
+      return
+    store_pages = write or max_age is not None
+    if store_pages:
+      store.discard(cache_key)
+    count = 0
+    empty = True
+    pages = _iter_pages(
+      await engine.client(profile_name, client_region, client_type),
+      job.function_name,
+      job.parameters,
+      paginate,
+      limiter,
+      (profile_name, region, client_type),
+    )
+    async for page in pages:
+      if job.projection:
+        page = project(page, job.projection)
+      if store_pages:
+        store.add_page(cache_key, count, page)
+      count += 1
+      empty = empty and is_empty_page(page)
+      yield page
+    if store_pages:
+      store.commit(cache_key, count)
+    if recheck_empty is not None:
+      store.mark_empty(empty_cell_key(job, profile_name, region, client_type, paginate), empty)
+
+  async def _produce(emit: Callable[[Any], Awaitable[bool]]) -> None:
+    if not cells:
+      return
+    limiter = AsyncScheduler(settings, recorder)
+    if ordered:
+      per_cell = max(1, max_pending_pages // len(cells))
+      outboxes = [asyncio.Queue(maxsize=per_cell) for _cell in cells]
+    else:
+      outboxes = [asyncio.Queue(maxsize=max_pending_pages)] * len(cells)
+
+    async def _run_cell(
+      index: int,
+      job: Job,
+      profile_name: str,
+      region: str,
+      client_type: str,
+      _region_clients: Any,
+      fan_out: list[str],
+    ) -> None:
+      outbox = outboxes[index]
+      try:
+        # A global cell's client is the one for its first region, as in function.stream_jobs.
+        pages = _cell_pages(engine, limiter, job, profile_name, region, client_type, fan_out[0])
+        async for page in pages:
+          for fan_out_region in fan_out:
+            await outbox.put((job.label, profile_name, fan_out_region, client_type, page))
+      except Exception as error:
+        if failures is None:
+          await outbox.put(error)
+        else:
+          failures.append(CellFailure(job.label, profile_name, region, client_type, error))
+      await outbox.put(_DONE)
+
+    async with _run_clients(shared, settings.async_concurrency, endpoint_url) as engine:
+      tasks = [asyncio.create_task(_run_cell(index, *cell)) for index, cell in enumerate(cells)]
+      try:
+        if ordered:
+          for outbox in outboxes:
+            while (item := await outbox.get()) is not _DONE:
+              if not await emit(item):
+                return
+        else:
+          remaining = len(cells)
+          while remaining:
+            item = await outboxes[0].get()
+            if item is _DONE:
+              remaining -= 1
+            elif not await emit(item):
+              return
+      finally:
+        for task in tasks:
+          task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+  try:
+    yield from _drive(_produce, max_pending_pages, shared)
+  finally:
+    if store is not None:
+      store.flush()
+
+
+def invoke_function_special_parameters(
+  clients: Mapping[str, Mapping[str, Iterable[str]]],
+  function_name: str,
+  parameters_dict: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  *,
+  read: bool = False,
+  write: bool = False,
+  key: str | None = None,
+  directory: str = "./cache/",
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  endpoint_url: str | None = None,
+  failures: list[CellFailure] | None = None,
+  unhashed: Collection[str] = (),
+) -> list[tuple[str, str, str, str, Any]]:
+  """function.invoke_function_special_parameters on aiobotocore.
+
+  Every nickname is its own coroutine, so thousands of per-resource calls
+  can be in flight at once over each cell's connection pool.
+  """
+  settings = scheduler.settings if scheduler is not None else SchedulerSettings()
+  recorder = scheduler.recorder if scheduler is not None else None
+  shared = scheduler.async_clients if scheduler is not None else None
+  store = open_store(directory) if read or write or ttl is not None else None
+
+  async def _call_nickname(
+    engine: AsyncClients,
+    limiter: AsyncScheduler,
+    profile_name: str,
+    region: str,
+    client_type: str,
+    params: Any,
+  ) -> Any:
+    client = await engine.client(profile_name, region, client_type)
+    args, kwargs = split_parameters(params)
+    return await limiter.call(
+      (profile_name, region, client_type),
+      getattr(client, function_name),
+      *args,
+      **kwargs,
+    )
+
+  async def _call_method_for_region(
+    engine: AsyncClients,
+    limiter: AsyncScheduler,
+    profile_name: str,
+    region: str,
+    client_types: Iterable[str],
+    region_parameters: Mapping[str, Any],
+  ) -> list[tuple[str, str, str, str, Any]]:
+    local_results: list[tuple[str, str, str, str, Any]] = []
+    for client_type in client_types:
+      cache_keys = {
+        nickname: build_cache_key(
+          key,
+          profile_name,
+          region,
+          client_type,
+          function_name,
+          params,
+          True,
+          nickname,
+          unhashed=unhashed,
+        )
+        for nickname, params in region_parameters.items()
+      }
+      max_age = service_ttl(ttl, client_type)
+      started = time.perf_counter()
+      responses = cached_responses(
+        store,
+        cache_keys,
+        read=read,
+        max_age=max_age,
+        directory=directory,
+      )
+      if responses and limiter.recorder is not None:
+        limiter.recorder.record(
+          (profile_name, region, client_type),
+          function_name,
+          started,
+          source=CACHE,
+          attempts=0,
+          pages=len(responses),
+        )
+      missing = [nickname for nickname in region_parameters if nickname not in responses]
+      fetched = await asyncio.gather(
+        *(
+          _call_nickname(engine, limiter, profile_name, region, client_type, region_parameters[nickname])
+          for nickname in missing
+        ),
+        return_exceptions=failures is not None,
+      )
+      for nickname, response in zip(missing, fetched):
+        if isinstance(response, Exception):
+          failures.append(CellFailure(nickname, profile_name, region, client_type, response))
+          continue
+        if isinstance(response, BaseException):
+          raise response
+        responses[nickname] = response
+        if write or max_age is not None:
+          store.put(cache_keys[nickname], response)
+      for nickname in region_parameters:
+        if nickname in responses:
+          local_results.append((profile_name, region, client_type, nickname, responses[nickname]))
+    return local_results
+
+  async def _produce(emit: Callable[[Any], Awaitable[bool]]) -> None:
+    limiter = AsyncScheduler(settings, recorder)
+    async with _run_clients(shared, settings.async_concurrency, endpoint_url) as engine:
+      tasks = [
+        asyncio.create_task(
+          _call_method_for_region(
+            engine,
+            limiter,
+            profile_name,
+            region,
+            region_clients,
+            parameters_dict.get(profile_name, {}).get(region, {}),
+          )
+        )
+        for profile_name, regions in clients.items()
+        for region, region_clients in regions.items()
+      ]
+      try:
+        for next_result in tasks if ordered else asyncio.as_completed(tasks):
+          for result in await next_result:
+            if not await emit(result):
+              return
+      finally:
+        for task in tasks:
+          task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+  try:
+    return list(_drive(_produce, 64, shared))
+  finally:
+    if store is not None:
+      store.flush()
+
@@ -5,16 +5,28 @@ from __future__ import annotations
 
 import argparse
 import sys
+from typing import TYPE_CHECKING
 
-import yaml
+from key import create_key
 
-import output_parsing
+if TYPE_CHECKING:
+  from function import CellFailure
+  from scheduler import Scheduler, SchedulerSettings
+  from stats import Recorder
 
+# Imports of boto3, PyYAML, sqlite3 and the output writers are deferred to
+# the commands that use them, so `at -v`, `at --help` and `at debug` start
+# without loading them.
 
-from clients import create_clients
-from function import invoke_function, invoke_function_special_parameters
-from key import create_key
-from output import write_output
+ENGINES = ("threads", "async")
+
+# Short --filter names per command, mapped to the AWS filter names.
+FILTER_ALIASES = {
+  "ec2list": {"state": "instance-state-name", "type": "instance-type"},
+  "ebslist": {"state": "status", "type": "volume-type"},
+  "rdslist": {},
+  "freeform": {},
+}
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -48,12 +60,28 @@ def build_parser() -> argparse.ArgumentParser:
     metavar="REGION",
     help="AWS region to use.",
   )
+  parser.add_argument(
+    "--all-regions",
+    action="store_true",
+    help=(
+      "Run in every region enabled for each account, discovered with ec2.describe_regions, "
+      "skipping cells that were recently empty (config: discovery)."
+    ),
+  )
   parser.add_argument(
     "-t",
     "--reruntoken",
     metavar="TOKEN",
     help="Rerun token to rerun against data from a previous run.",
   )
+  parser.add_argument(
+    "--resume",
+    metavar="TOKEN",
+    help=(
+      "Resume a --write run: read the cells it completed under TOKEN and fetch and "
+      "save only the missing or failed ones (the same as -t TOKEN --read --write)."
+    ),
+  )
   parser.add_argument(
     "--read",
     action="store_true",
@@ -64,6 +92,82 @@ def build_parser() -> argparse.ArgumentParser:
     action="store_true",
     help="Enable write mode.",
   )
+  parser.add_argument(
+    "--cache-ttl",
+    nargs="?",
+    const="config",
+    default=None,
+    metavar="SECONDS",
+    help=(
+      "Read-through cache: serve responses younger than SECONDS from any earlier "
+      "run and fetch the rest (default: per-service cache_ttl in the config file)."
+    ),
+  )
+  parser.add_argument(
+    "--paginate",
+    action=argparse.BooleanOptionalAction,
+    default=True,
+    help="Follow paginated responses to the last page (default: on).",
+  )
+  parser.add_argument(
+    "--engine",
+    default="threads",
+    choices=ENGINES,
+    help=(
+      "Run API requests on a thread pool or as asyncio coroutines "
+      "(async needs aiobotocore; config: scheduler.async_concurrency)."
+    ),
+  )
+  parser.add_argument(
+    "--max-workers",
+    type=int,
+    default=None,
+    metavar="N",
+    help="Upper bound on concurrent API requests (config: scheduler.max_workers).",
+  )
+  parser.add_argument(
+    "--rate",
+    type=float,
+    default=None,
+    metavar="RPS",
+    help="Requests per second per account/region/service; 0 disables (config: scheduler.rate).",
+  )
+  parser.add_argument(
+    "--burst",
+    type=int,
+    default=None,
+    metavar="N",
+    help="Token bucket burst size (config: scheduler.burst).",
+  )
+  parser.add_argument(
+    "--max-attempts",
+    type=int,
+    default=None,
+    metavar="N",
+    help="Attempts per request when throttled (config: scheduler.max_attempts).",
+  )
+  parser.add_argument(
+    "--filter",
+    action="append",
+    default=[],
+    dest="filters",
+    metavar="NAME=VALUE[,VALUE...]",
+    help=(
+      "Server-side filter for ec2list, ebslist, rdslist and freeform; repeat for more "
+      "(e.g. state=running, type=gp3, tag:Env=prod, or any AWS filter name)."
+    ),
+  )
+  parser.add_argument(
+    "--stats",
+    action="store_true",
+    help="Print request counts, retries, bytes, cache hits and latency percentiles to stderr.",
+  )
+  parser.add_argument(
+    "--trace",
+    default=None,
+    metavar="FILE",
+    help="Write a Chrome trace (chrome://tracing, Perfetto) of every request to FILE.",
+  )
   parser.add_argument(
     "-d",
     "--directory",
@@ -75,15 +179,26 @@ def build_parser() -> argparse.ArgumentParser:
     "-o",
     "--output",
     default="console",
-    choices=["console", "csv", "excel"],
-    help="Output format (console, csv, excel).",
+    choices=["console", "csv", "excel", "ndjson", "parquet", "arrow"],
+    help="Output format (console, csv, excel, ndjson, parquet, arrow; parquet and arrow need pyarrow).",
+  )
+  parser.add_argument(
+    "--ordered",
+    action="store_true",
+    help="Write rows in profile/region order instead of as each response arrives.",
+  )
+  parser.add_argument(
+    "--echo",
+    action=argparse.BooleanOptionalAction,
+    default=None,
+    help="Also print rows to the console when writing a file (default: console output only).",
   )
   parser.add_argument(
     "-f",
     "--file",
-    default="out.csv",
+    default=None,
     metavar="FILE",
-    help="Output file name (default: out.csv).",
+    help="Output file name (default: out.csv, out.xlsx, out.ndjson, ... to match --output).",
   )
 
   subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
@@ -126,6 +241,96 @@ def build_parser() -> argparse.ArgumentParser:
     "freeform_command",
     help="Command name.",
   )
+  freeform_parser.add_argument(
+    "--parameters",
+    default=None,
+    metavar="JSON|YAML|@FILE",
+    help=(
+      "Request parameters as a JSON or YAML mapping, or a list of mappings to call "
+      "once per mapping. Every mapping runs in every profile/region; use --fan-out to "
+      "call each resource only where it lives."
+    ),
+  )
+  freeform_parser.add_argument(
+    "--fan-out",
+    default=None,
+    metavar="PARAM=COMMAND.COLUMN",
+    help=(
+      "Call once per value of COLUMN in the cached COMMAND run named by --from, with PARAM "
+      "set to the value, in the value's profile and region whatever --regions says "
+      "(e.g. InstanceId=ec2list.instance_id or Bucket=s3list.bucket_name). "
+      "Calls that fan out, here or through --parameters, are not paginated."
+    ),
+  )
+  freeform_parser.add_argument(
+    "--from",
+    default=None,
+    dest="fan_out_token",
+    metavar="TOKEN",
+    help="Rerun token of the cached run --fan-out reads.",
+  )
+  freeform_parser.add_argument(
+    "--query",
+    default=None,
+    metavar="JMESPATH",
+    help="JMESPath expression applied to each response, as in the AWS CLI.",
+  )
+  subparsers.add_parser(
+    "shell",
+    help=(
+      "Read commands from stdin and run them in one process, keeping sessions, "
+      "clients, service models and caches warm; options given before `shell` "
+      "apply to every command."
+    ),
+  )
+  diff_parser = subparsers.add_parser(
+    "diff",
+    help="Show added, removed and changed resources between two cached runs.",
+  )
+  diff_parser.add_argument("token_a", metavar="TOKEN_A", help="Rerun token of the earlier run.")
+  diff_parser.add_argument("token_b", metavar="TOKEN_B", help="Rerun token of the later run.")
+  diff_parser.add_argument(
+    "diff_command",
+    metavar="COMMAND",
+    help="Command whose inventory to compare (ec2list, ebslist or rdslist).",
+  )
+  query_parser = subparsers.add_parser(
+    "query",
+    help="Filter, group and aggregate a cached run's inventory without calling AWS.",
+  )
+  query_parser.add_argument("query_token", metavar="TOKEN", help="Rerun token of the cached run.")
+  query_parser.add_argument(
+    "query_command",
+    metavar="COMMAND",
+    help="Command whose rows to query (ec2list, ebslist or rdslist).",
+  )
+  query_parser.add_argument(
+    "--where",
+    action="append",
+    default=[],
+    metavar="CONDITION",
+    help="COLUMN OP VALUE with OP one of = != < <= > >= ~ (LIKE); repeat to AND them.",
+  )
+  query_parser.add_argument(
+    "--group-by",
+    default="",
+    metavar="COLUMNS",
+    help="Comma-separated columns to group by.",
+  )
+  query_parser.add_argument(
+    "--agg",
+    action="append",
+    default=[],
+    metavar="FUNCTION(COLUMN)",
+    help="Aggregate: count, sum, avg, min or max; repeat for more.",
+  )
+  query_parser.add_argument(
+    "--order-by",
+    default="",
+    metavar="COLUMNS",
+    help="Comma-separated output columns to sort by; prefix one with - for descending (--order-by=-size).",
+  )
+  query_parser.add_argument("--limit", type=int, default=None, metavar="N", help="Return at most N rows.")
   # Placeholder subcommand
   subparsers.add_parser("example", help="Example subcommand (placeholder).")
 
@@ -134,19 +339,112 @@ def build_parser() -> argparse.ArgumentParser:
 
 def main(argv: list[str] | None = None) -> int:
   parser = build_parser()
+  argv = sys.argv[1:] if argv is None else list(argv)
   args = parser.parse_args(argv)
+  if args.command == "shell":
+    # shell takes no arguments of its own, so it is always the last word.
+    return run_shell(parser, argv[:-1])
+  return execute(parser, args)
+
+
+def run_shell(parser: argparse.ArgumentParser, shell_argv: list[str]) -> int:
+  """Run one command per input line until end of input or `exit`.
+
+  Each line is parsed as the arguments after `at`, following the options
+  given to the shell. Everything process-wide stays loaded between
+  commands: boto3 sessions and their credentials, clients and service
+  models, the cache store, bucket regions and the parsed config, and one
+  scheduler per distinct scheduler settings, with its async engine clients
+  and their event loop.
+  """
+  import shlex
+
+  interactive = sys.stdin.isatty()
+  if interactive:
+    try:
+      import readline  # noqa: F401  (line editing and history for input())
+    except ImportError:
+      pass
+  schedulers: dict[SchedulerSettings, Scheduler] = {}
+  status = 0
+  try:
+    while True:
+      try:
+        line = input("at> " if interactive else "")
+      except EOFError:
+        break
+      except KeyboardInterrupt:
+        print()
+        continue
+      try:
+        words = shlex.split(line, comments=True)
+      except ValueError as error:
+        print(f"at: {error}", file=sys.stderr)
+        continue
+      if not words:
+        continue
+      if words[0] in ("exit", "quit"):
+        break
+      try:
+        args = parser.parse_args(shell_argv + words)
+      except SystemExit as error:
+        status = error.code or 0
+        continue
+      if args.command == "shell":
+        print("at: already in a shell", file=sys.stderr)
+        continue
+      try:
+        status = execute(parser, args, schedulers)
+      except SystemExit as error:
+        status = error.code or 0
+      except KeyboardInterrupt:
+        print("at: interrupted", file=sys.stderr)
+        status = 130
+      except Exception as error:
+        print(f"at: {args.command} failed: {error!r}", file=sys.stderr)
+        status = 1
+  finally:
+    for scheduler in schedulers.values():
+      if scheduler.async_clients is not None:
+        scheduler.async_clients.close()
+      scheduler.shutdown()
+  return status
+
+
+def execute(
+  parser: argparse.ArgumentParser,
+  args: argparse.Namespace,
+  schedulers: dict[SchedulerSettings, Scheduler] | None = None,
+) -> int:
+  """Run one parsed command line.
+
+  With schedulers, the scheduler for the command's settings is taken from
+  (or added to) that dict and left running for the next command, along
+  with its async_clients; otherwise both are created and closed around
+  the command.
+  """
+  if args.version:
+    print("at 0.2.0")
+    return 0
+
+  if args.command is None:
+    parser.print_help()
+    return 0
+
+  from config_loader import load_config
+
   config = args.config
   profile = args.profile
   rerun_token = args.reruntoken
-  read = args.read
-  write = args.write
-  directory = args.directory
-  output_format = args.output
-  output_file = args.file
+  if args.resume:
+    if rerun_token and rerun_token != args.resume:
+      parser.error("--resume and --reruntoken name different runs")
+    rerun_token = args.resume
+  write = args.write or bool(args.resume)
   if write and not rerun_token:
     rerun_token = create_key()
-  with open(config, "r", encoding="utf-8") as handle:
-    config_data = yaml.safe_load(handle) or {}
+    print(f"rerun token: {rerun_token}", file=sys.stderr)
+  config_data = load_config(config, args.directory)
   if profile:
     profiles = [profile]
   else:
@@ -156,24 +454,274 @@ def main(argv: list[str] | None = None) -> int:
   else:
     regions = config_data.get("regions", ["us-east-2"])
 
-  if args.version:
-    print("at 0.2.0")
-    return 0
-
-  if args.command is None:
-    parser.print_help()
-    return 0
-
   if args.command == "debug":
     print(f'config file: {config}')
     print(f'profiles: {profiles}')
     print(f'regions: {regions}')
     return 0
 
+  import importlib.util
+
+  from output import ARROW_FORMATS, FILE_EXTENSIONS
+
+  if args.output in ARROW_FORMATS and importlib.util.find_spec("pyarrow") is None:
+    parser.error(f"--output {args.output} requires pyarrow")
+  if args.file is None:
+    args.file = f"out.{FILE_EXTENSIONS.get(args.output, 'csv')}"
+
+  if args.command == "diff":
+    return run_diff(parser, args)
+
+  if args.command == "query":
+    return run_query(parser, args)
+
+  from cache import resolve_ttls
+  from clients import CLIENT_CACHE, resolve_client_options
+  from function import CellFailure
+  from scheduler import Scheduler, SchedulerSettings
+
+  if args.engine == "async" and importlib.util.find_spec("aiobotocore") is None:
+    parser.error("--engine async requires aiobotocore")
+
+  if args.cache_ttl is None:
+    ttl = None
+  elif args.cache_ttl == "config":
+    ttl = resolve_ttls(config_data)
+  else:
+    try:
+      ttl = resolve_ttls(config_data, float(args.cache_ttl))
+    except ValueError:
+      parser.error(f"--cache-ttl expects a number of seconds, got {args.cache_ttl!r}")
+
+  settings = SchedulerSettings.from_config(
+    config_data,
+    max_workers=args.max_workers,
+    rate=args.rate,
+    burst=args.burst,
+    max_attempts=args.max_attempts,
+  )
+  CLIENT_CACHE.configure(
+    resolve_client_options(config_data, max_pool_connections=settings.max_workers)
+  )
+  if schedulers is not None:
+    scheduler = schedulers.get(settings)
+    if scheduler is None:
+      scheduler = schedulers[settings] = Scheduler(settings)
+  else:
+    scheduler = Scheduler(settings)
+  recorder = None
+  if args.stats or args.trace:
+    from stats import Recorder
+
+    recorder = Recorder()
+  scheduler.recorder = recorder
+  if args.engine == "async":
+    from async_engine import AsyncClients
+
+    # One event loop and one set of connection pools for every call of the
+    # run, or of the shell session while the client options stay the same.
+    if scheduler.async_clients is not None and scheduler.async_clients.options != CLIENT_CACHE.options:
+      scheduler.async_clients.close()
+      scheduler.async_clients = None
+    if scheduler.async_clients is None:
+      scheduler.async_clients = AsyncClients(settings.async_concurrency)
+  try:
+    recheck_empty = None
+    failures: list[CellFailure] = []
+    if args.all_regions:
+      from regions import discover_regions, discovery_settings
+
+      if args.region:
+        parser.error("--all-regions and --region cannot be combined")
+      regions_ttl, recheck_empty = discovery_settings(config_data)
+      regions = discover_regions(
+        profiles,
+        regions[0],
+        directory=args.directory,
+        scheduler=scheduler,
+        regions_ttl=regions_ttl,
+        engine=args.engine,
+        failures=failures,
+      )
+      profiles = [profile_name for profile_name in profiles if profile_name in regions]
+    status = run_command(
+      parser,
+      args,
+      profiles,
+      regions,
+      rerun_token,
+      scheduler,
+      ttl,
+      recheck_empty,
+      failures,
+    )
+    if failures:
+      report_failures(failures, rerun_token if write else None)
+      return 1
+    return status
+  finally:
+    scheduler.recorder = None
+    if schedulers is None:
+      if scheduler.async_clients is not None:
+        scheduler.async_clients.close()
+      scheduler.shutdown()
+    if recorder is not None:
+      report_stats(args, recorder)
+
+
+def report_failures(failures: list[CellFailure], rerun_token: str | None) -> None:
+  print(f"{len(failures)} cell(s) failed; their rows are missing or incomplete:", file=sys.stderr)
+  sso_profiles: set[str] = set()
+  for failure in sorted(failures, key=lambda failure: (failure.profile, failure.region, failure.job)):
+    print(
+      f"  {failure.profile} {failure.region} {failure.client_type} {failure.job}: {failure.message}",
+      file=sys.stderr,
+    )
+    if "SSO" in type(failure.error).__name__:
+      sso_profiles.add(failure.profile)
+  for profile in sorted(sso_profiles):
+    print(f"SSO session expired: aws sso login --profile {profile}", file=sys.stderr)
+  if rerun_token:
+    print(f"Fetch only the failed cells with: at --resume {rerun_token} followed by the same command", file=sys.stderr)
+  else:
+    print("Run with --write to keep completed cells, then --resume to fetch only the failed ones.", file=sys.stderr)
+
+
+def report_stats(args: argparse.Namespace, recorder: Recorder) -> None:
+  from stats import summarize, write_trace
+
+  if args.stats:
+    print(summarize(recorder.records()), end="", file=sys.stderr)
+  if args.trace:
+    write_trace(args.trace, recorder)
+
+
+def run_diff(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+  import output_parsing
+  from cache import open_store
+  from diff import DIFF_SPECS, diff_runs, has_run
+  from output import write_output
+
+  spec = DIFF_SPECS.get(args.diff_command)
+  if spec is None:
+    parser.error(f"diff supports {', '.join(DIFF_SPECS)}, not {args.diff_command!r}")
+  store = open_store(args.directory)
+  for token in (args.token_a, args.token_b):
+    if not has_run(store, token, spec):
+      print(f"no such run: {token} has no cached {args.diff_command} responses", file=sys.stderr)
+      return 1
+  write_output(
+    spec.diff_headers,
+    diff_runs(store, args.token_a, args.token_b, spec),
+    args.output,
+    args.file,
+    echo=args.echo,
+    column_types=output_parsing.COLUMN_TYPES,
+  )
+  return 0
+
+
+def run_query(parser: argparse.ArgumentParser, args: argparse.Namespace) -> int:
+  import output_parsing
+  from cache import open_store
+  from diff import DIFF_SPECS, has_run
+  from output import write_output
+  from query import (
+    InventoryIndex,
+    aggregate_column_types,
+    parse_aggregate,
+    parse_columns,
+    parse_condition,
+    split_columns,
+  )
+
+  spec = DIFF_SPECS.get(args.query_command)
+  if spec is None:
+    parser.error(f"query supports {', '.join(DIFF_SPECS)}, not {args.query_command!r}")
+  try:
+    where = [parse_condition(expression, spec.headers) for expression in args.where]
+    aggregates = [parse_aggregate(expression, spec.headers) for expression in args.agg]
+    group_by = parse_columns(args.group_by, spec.headers)
+  except ValueError as error:
+    parser.error(f"query: {error}")
+
+  store = open_store(args.directory)
+  if not has_run(store, args.query_token, spec):
+    print(f"no such run: {args.query_token} has no cached {args.query_command} responses", file=sys.stderr)
+    return 1
+  index = InventoryIndex(args.directory)
+  try:
+    index.load(store, args.query_token, args.query_command)
+    try:
+      headers, rows = index.query(
+        args.query_token,
+        args.query_command,
+        where=where,
+        group_by=group_by,
+        aggregates=aggregates,
+        order_by=split_columns(args.order_by),
+        limit=args.limit,
+      )
+    except ValueError as error:
+      parser.error(f"query: {error}")
+    write_output(
+      headers,
+      rows,
+      args.output,
+      args.file,
+      echo=args.echo,
+      column_types={**output_parsing.COLUMN_TYPES, **aggregate_column_types(aggregates)},
+    )
+  finally:
+    index.close()
+  return 0
+
+
+def run_command(
+  parser: argparse.ArgumentParser,
+  args: argparse.Namespace,
+  profiles: list[str],
+  regions: list[str] | dict[str, list[str]],
+  rerun_token: str | None,
+  scheduler: Scheduler,
+  ttl: dict[str, float] | None = None,
+  recheck_empty: float | None = None,
+  failures: list[CellFailure] | None = None,
+) -> int:
+  import output_parsing
+  from clients import create_clients, select_clients
+  from function import (
+    Job,
+    invoke_function_special_parameters,
+    invoke_jobs,
+    parse_filters,
+    stream_function,
+    stream_jobs,
+  )
+  from output import write_output
+
+  read = args.read or bool(args.resume)
+  write = args.write or bool(args.resume)
+  directory = args.directory
+  output_format = args.output
+  output_file = args.file
+  paginate = args.paginate
+  ordered = args.ordered
+  engine = args.engine
+
+  parameters = None
+  if args.filters:
+    if args.command not in FILTER_ALIASES:
+      parser.error(f"--filter is not supported by {args.command}")
+    try:
+      parameters = {"Filters": parse_filters(args.filters, FILTER_ALIASES[args.command])}
+    except ValueError as error:
+      parser.error(f"--filter: {error}")
+
   if args.command == "gci":
     function_name = "get_caller_identity"
     sessions, clients = create_clients(profiles, regions, ["sts"])
-    result = invoke_function(
+    result = stream_function(
       clients,
       function_name,
       parameters=None,
@@ -181,73 +729,129 @@ def main(argv: list[str] | None = None) -> int:
       write=write,
       key=rerun_token,
       directory=directory,
+      paginate=paginate,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      recheck_empty=recheck_empty,
+      failures=failures,
+      projection=output_parsing.GCI.projection,
+    )
+    headers = output_parsing.GCI_HEADERS
+    output = output_parsing.iter_gci(result)
+    write_output(
+      headers,
+      output,
+      output_format,
+      output_file,
+      echo=args.echo,
+      column_types=output_parsing.COLUMN_TYPES,
     )
-    headers, output = output_parsing.parse_gci(result)
-    write_output(headers, output, output_format, output_file)
     return 0
 
   if args.command == "ec2list":
     function_name = "describe_instances"
     sessions, clients = create_clients(profiles, regions, ["ec2"])
-    result = invoke_function(
+    result = stream_function(
       clients,
       function_name,
-      parameters=None,
+      parameters=parameters,
       read=read,
       write=write,
       key=rerun_token,
       directory=directory,
+      paginate=paginate,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      recheck_empty=recheck_empty,
+      failures=failures,
+      projection=output_parsing.EC2LIST.projection,
+    )
+    headers = output_parsing.EC2LIST_HEADERS
+    output = output_parsing.iter_ec2list(result)
+    write_output(
+      headers,
+      output,
+      output_format,
+      output_file,
+      echo=args.echo,
+      column_types=output_parsing.COLUMN_TYPES,
     )
-    headers, output = output_parsing.parse_ec2list(result)
-    write_output(headers, output, output_format, output_file)
     return 0
 
   if args.command == "ebslist":
     function_name = "describe_volumes"
     sessions, clients = create_clients(profiles, regions, ["ec2"])
-    result = invoke_function(
+    result = stream_function(
       clients,
       function_name,
-      parameters=None,
+      parameters=parameters,
       read=read,
       write=write,
       key=rerun_token,
       directory=directory,
+      paginate=paginate,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      recheck_empty=recheck_empty,
+      failures=failures,
+      projection=output_parsing.EBSLIST.projection,
+    )
+    headers = output_parsing.EBSLIST_HEADERS
+    output = output_parsing.iter_ebslist(result)
+    write_output(
+      headers,
+      output,
+      output_format,
+      output_file,
+      echo=args.echo,
+      column_types=output_parsing.COLUMN_TYPES,
     )
-    headers, output = output_parsing.parse_ebslist(result)
-    write_output(headers, output, output_format, output_file)
     return 0
 
   if args.command == "rdslist":
-    function_name = "describe_db_instances"
     sessions, clients = create_clients(profiles, regions, ["rds"])
-    instances_result = invoke_function(
+    result = stream_jobs(
       clients,
-      function_name,
-      parameters=None,
+      [
+        Job("describe_db_clusters", parameters, projection=output_parsing.RDS_CLUSTERS.projection),
+        Job("describe_db_instances", parameters, projection=output_parsing.RDS_INSTANCES.projection),
+      ],
       read=read,
       write=write,
       key=rerun_token,
       directory=directory,
+      paginate=paginate,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      recheck_empty=recheck_empty,
+      failures=failures,
     )
-    function_name = "describe_db_clusters"
-    clusters_result = invoke_function(
-      clients,
-      function_name,
-      parameters=None,
-      read=read,
-      write=write,
-      key=rerun_token,
-      directory=directory,
+    headers = output_parsing.RDSLIST_HEADERS
+    output = output_parsing.iter_rdslist_jobs(result)
+    write_output(
+      headers,
+      output,
+      output_format,
+      output_file,
+      echo=args.echo,
+      column_types=output_parsing.COLUMN_TYPES,
     )
-    headers, output = output_parsing.parse_rdslist(instances_result, clusters_result)
-    write_output(headers, output, output_format, output_file)
     return 0
 
   if args.command == "s3list":
+    from buckets import bucket_regions
+
     function_name = "list_buckets"
     sessions, clients = create_clients(profiles, regions, ["s3"])
-    result = invoke_function(
+    result = stream_function(
       clients,
       function_name,
       parameters=None,
@@ -255,80 +859,194 @@ def main(argv: list[str] | None = None) -> int:
       write=write,
       key=rerun_token,
       directory=directory,
+      paginate=paginate,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      recheck_empty=recheck_empty,
+      failures=failures,
+    )
+    result = list(result)
+    locations = bucket_regions(
+      clients,
+      result,
+      scheduler=scheduler,
+      directory=directory,
+      lookup=not args.read,
+    )
+    headers = output_parsing.S3LIST_HEADERS
+    output = output_parsing.iter_s3list(result, locations)
+    write_output(
+      headers,
+      output,
+      output_format,
+      output_file,
+      echo=args.echo,
+      column_types=output_parsing.COLUMN_TYPES,
     )
-    headers, output = output_parsing.parse_s3list(result)
-    write_output(headers, output, output_format, output_file)
     return 0
 
   if args.command == "s3sizes":
-    function_name = "list_buckets"
-    sessions, clients = create_clients(profiles, regions, ["s3"])
-    result = invoke_function(
+    from buckets import bucket_regions
+    from cloudwatch import S3_SIZE_WINDOW_PARAMETERS, build_s3_size_parameters, s3_size_metrics
+
+    sessions, clients = create_clients(profiles, regions, ["s3", "cloudwatch"])
+    cloudwatch_clients = select_clients(clients, ["cloudwatch"])
+    listings = invoke_jobs(
       clients,
-      function_name,
-      parameters=None,
+      [
+        Job("list_buckets", client_type="s3"),
+        Job(
+          "list_metrics",
+          {"Namespace": "AWS/S3", "MetricName": "BucketSizeBytes"},
+          client_type="cloudwatch",
+        ),
+      ],
       read=read,
       write=write,
       key=rerun_token,
       directory=directory,
+      paginate=paginate,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      recheck_empty=recheck_empty,
+      failures=failures,
     )
-    headers, output = output_parsing.parse_s3list(result)
-    bucket_map: dict[str, dict[str, list[str]]] = {}
-    for profile_name, region, bucket_name in output:
-      bucket_map.setdefault(profile_name, {}).setdefault(region, []).append(bucket_name)
-    sessions, cloudwatch_clients = create_clients(profiles, regions, ["cloudwatch"])
-    cloudwatch_parameters = {}
-    for key_profile, regions in bucket_map.items():
-      for key_region, buckets in regions.items():
-        for bucket in buckets:
-          cloudwatch_parameters.setdefault(key_profile, {}).setdefault(key_region, {})[bucket] = {
-            "Namespace": "AWS/S3",
-            "MetricName": "BucketSizeBytes",
-            "Dimensions": [
-              {"Name": "BucketName", "Value": bucket},
-              {"Name": "StorageType", "Value": "StandardStorage"},
-            ],
-            "StartTime": "2024-01-01T00:00:00Z",
-            "EndTime": "2024-12-31T23:59:59Z",
-            "Period": 86400,
-            "Statistics": ["Average"],
-          }
+    result = listings["list_buckets"]
+    metrics_result = listings["list_metrics"]
+    locations = bucket_regions(
+      clients,
+      result,
+      scheduler=scheduler,
+      directory=directory,
+      lookup=not args.read,
+    )
+    headers, buckets = output_parsing.parse_s3list(result, locations)
+    cloudwatch_parameters = build_s3_size_parameters(s3_size_metrics(metrics_result))
     cloudwatch_results = invoke_function_special_parameters(
       cloudwatch_clients,
-      "get_metric_statistics",
+      "get_metric_data",
       parameters_dict=cloudwatch_parameters,
       read=read,
       write=write,
       key=rerun_token,
       directory=directory,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      failures=failures,
+      unhashed=S3_SIZE_WINDOW_PARAMETERS,
     )
 
-    headers, output = output_parsing.parse_s3sizes(cloudwatch_results)
-    write_output(headers, output, output_format, output_file)
+    headers = output_parsing.S3SIZES_HEADERS
+    output = output_parsing.iter_s3sizes(cloudwatch_results, buckets)
+    write_output(
+      headers,
+      output,
+      output_format,
+      output_file,
+      echo=args.echo,
+      column_types=output_parsing.COLUMN_TYPES,
+    )
 
     return 0
 
   if args.command == "freeform":
-    print(f'Running freeform command: {args.service} {args.freeform_command}')
+    import importlib.util
+
+    import freeform
+    from cache import open_store
+    from function import stream_function_special_parameters
+
+    print(f'Running freeform command: {args.service} {args.freeform_command}', file=sys.stderr)
     if not args.service or not args.freeform_command:
       parser.error("freeform requires two arguments: service and command")
-    sessions, clients = create_clients(profiles, regions, [args.service])
-    result = invoke_function(
-      clients,
-      args.freeform_command,
-      parameters=None,
-      read=read,
-      write=write,
-      key=rerun_token,
-      directory=directory,
-    )
-    for profile_name, region, client_type, response in result:
-      print(f"{profile_name} {region} {client_type}")
-      if isinstance(response, dict):
-        for key, value in response.items():
-          print(f"{key}: {value}")
+    if args.query and importlib.util.find_spec("jmespath") is None:
+      parser.error("--query requires jmespath")
+    if args.fan_out and not args.fan_out_token:
+      parser.error("--fan-out requires --from TOKEN")
+    try:
+      parameter_sets = freeform.parse_parameters(args.parameters) if args.parameters else [{}]
+      fan_out = freeform.parse_fan_out(args.fan_out) if args.fan_out else None
+      search = freeform.compile_query(args.query) if args.query else None
+    except ValueError as error:
+      parser.error(f"freeform: {error}")
+    if parameters:
+      parameter_sets = [
+        {**parameter_set, "Filters": [*parameter_set.get("Filters", []), *parameters["Filters"]]}
+        for parameter_set in parameter_sets
+      ]
+
+    if fan_out is None:
+      sessions, clients = create_clients(profiles, regions, [args.service])
+    else:
+      store = open_store(directory)
+      locations = None
+      if fan_out.command == "s3list":
+        from buckets import bucket_regions
+
+        _s3_sessions, s3_clients = create_clients(profiles, regions, ["s3"])
+        locations = bucket_regions(
+          s3_clients,
+          freeform.s3list_results(store, args.fan_out_token),
+          scheduler=scheduler,
+          directory=directory,
+        )
+      values = freeform.fan_out_values(store, args.fan_out_token, fan_out, locations)
+      # Each value is called in its own region, so the cells come from the
+      # values rather than --regions.
+      sessions, clients = create_clients(profiles, values, [args.service])
+    if fan_out is None and len(parameter_sets) == 1:
+      result = stream_function(
+        clients,
+        args.freeform_command,
+        parameters=parameter_sets[0] or None,
+        read=read,
+        write=write,
+        key=rerun_token,
+        directory=directory,
+        paginate=paginate,
+        scheduler=scheduler,
+        ttl=ttl,
+        ordered=ordered,
+        engine=engine,
+        recheck_empty=recheck_empty,
+        failures=failures,
+      )
+      results = (
+        (profile_name, region, client_type, "", response)
+        for profile_name, region, client_type, response in result
+      )
+    else:
+      if fan_out is None:
+        parameters_dict = freeform.parameters_by_cell(clients, parameter_sets)
       else:
-        print(response)
+        parameters_dict = freeform.parameters_by_cell(clients, parameter_sets, fan_out.parameter, values)
+      results = stream_function_special_parameters(
+        clients,
+        args.freeform_command,
+        parameters_dict,
+        read=read,
+        write=write,
+        key=rerun_token,
+        directory=directory,
+        scheduler=scheduler,
+        ttl=ttl,
+        ordered=ordered,
+        engine=engine,
+        failures=failures,
+      )
+    write_output(
+      freeform.FREEFORM_HEADERS,
+      freeform.freeform_rows(results, search, encode=output_format != "ndjson"),
+      output_format,
+      output_file,
+      echo=args.echo,
+    )
     return 0
 
 
@@ -0,0 +1,607 @@
+#!/usr/bin/env python3
+"""Benchmarks for the invoke, cache, parse and output hot paths.
+
+Every benchmark runs against a synthetic fleet, by default 50 accounts x
+17 regions with 10k instances, 10k volumes and 5k buckets (--scale
+shrinks or grows it). API calls go to in-process fake clients with an
+injected per-request latency. create_clients needs boto3; excel, parquet
+and arrow output need openpyxl and pyarrow; benchmarks whose dependency
+is missing are reported as skipped.
+
+Each run appends one record to bench_history.jsonl and compares every
+timing with the last run at the same scale, so a slowdown shows up in
+review next to the change that caused it.
+"""
+
+from __future__ import annotations
+
+import argparse
+from contextlib import redirect_stdout
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+import fnmatch
+import importlib.util
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Iterator
+
+ROOT = Path(__file__).resolve().parent
+HISTORY_FILE = ROOT / "bench_history.jsonl"
+REPORT_FILE = ROOT / "bench_output.txt"
+REGRESSION_THRESHOLD = 0.10
+
+REGION_NAMES = [
+  "us-east-1",
+  "us-east-2",
+  "us-west-1",
+  "us-west-2",
+  "ca-central-1",
+  "eu-west-1",
+  "eu-west-2",
+  "eu-west-3",
+  "eu-central-1",
+  "eu-north-1",
+  "ap-south-1",
+  "ap-northeast-1",
+  "ap-northeast-2",
+  "ap-northeast-3",
+  "ap-southeast-1",
+  "ap-southeast-2",
+  "sa-east-1",
+]
+PAGE_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class Fleet:
+  accounts: int = 50
+  regions: int = 17
+  instances: int = 10000
+  volumes: int = 10000
+  buckets: int = 5000
+
+  def scaled(self, scale: float) -> Fleet:
+    return Fleet(
+      accounts=max(1, round(self.accounts * min(scale, 1.0))),
+      regions=max(1, min(len(REGION_NAMES), round(self.regions * min(scale, 1.0)))),
+      instances=max(1, round(self.instances * scale)),
+      volumes=max(1, round(self.volumes * scale)),
+      buckets=max(1, round(self.buckets * scale)),
+    )
+
+  @property
+  def profiles(self) -> list[str]:
+    return [f"account-{number:03d}" for number in range(self.accounts)]
+
+  @property
+  def region_names(self) -> list[str]:
+    return REGION_NAMES[: self.regions]
+
+  @property
+  def cells(self) -> list[tuple[str, str]]:
+    return [(profile, region) for profile in self.profiles for region in self.region_names]
+
+
+def _spread(total: int, buckets: int) -> list[int]:
+  return [total // buckets + (1 if index < total % buckets else 0) for index in range(buckets)]
+
+
+def _pages(items: list[dict[str, Any]], key: str) -> list[dict[str, Any]]:
+  pages = [{key: items[start : start + PAGE_SIZE]} for start in range(0, len(items), PAGE_SIZE)]
+  return pages or [{key: []}]
+
+
+class SyntheticFleet:
+  """Responses for every cell of a Fleet, built once and shared by benchmarks."""
+
+  def __init__(self, fleet: Fleet) -> None:
+    self.fleet = fleet
+    launched = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    cells = fleet.cells
+    self.responses: dict[tuple[str, str, str], list[dict[str, Any]]] = {}
+    for index, ((profile, region), instances, volumes) in enumerate(
+      zip(cells, _spread(fleet.instances, len(cells)), _spread(fleet.volumes, len(cells)))
+    ):
+      self.responses[(profile, region, "describe_instances")] = [
+        {"Reservations": [{"Instances": page["Instances"]}]}
+        for page in _pages(
+          [
+            {
+              "InstanceId": f"i-{index:05x}{number:07x}",
+              "State": {"Name": "running" if number % 5 else "stopped"},
+              "InstanceType": ("t3.micro", "m5.large", "c6i.xlarge")[number % 3],
+              "LaunchTime": launched,
+            }
+            for number in range(instances)
+          ],
+          "Instances",
+        )
+      ]
+      self.responses[(profile, region, "describe_volumes")] = _pages(
+        [
+          {
+            "VolumeId": f"vol-{index:05x}{number:07x}",
+            "State": "in-use",
+            "Size": 8 + number % 500,
+            "VolumeType": ("gp3", "io2")[number % 2],
+            "Iops": 3000,
+            "CreateTime": launched,
+          }
+          for number in range(volumes)
+        ],
+        "Volumes",
+      )
+      self.responses[(profile, region, "describe_db_instances")] = [
+        {"DBInstances": [{"DBName": f"db{index}"}]}
+      ]
+      self.responses[(profile, region, "describe_db_clusters")] = [
+        {"DBClusters": [{"DatabaseName": f"cluster{index}"}]}
+      ]
+      self.responses[(profile, region, "get_caller_identity")] = [
+        {"UserId": "AIDAEXAMPLE", "Account": f"{index:012d}", "Arn": f"arn:aws:iam::{index:012d}:user/bench"}
+      ]
+
+    self.bucket_names: dict[str, list[str]] = {}
+    for number, (profile, count) in enumerate(zip(fleet.profiles, _spread(fleet.buckets, fleet.accounts))):
+      names = [f"bench-{number:03d}-{bucket:06d}" for bucket in range(count)]
+      self.bucket_names[profile] = names
+      self.responses[(profile, fleet.region_names[0], "list_buckets")] = [
+        {
+          "Buckets": [
+            {
+              "Name": name,
+              "CreationDate": launched,
+              "BucketRegion": fleet.region_names[bucket % fleet.regions],
+            }
+            for bucket, name in enumerate(names)
+          ]
+        }
+      ]
+
+  def results(self, operation: str, client_type: str = "ec2") -> list[tuple[str, str, str, dict[str, Any]]]:
+    return [
+      (profile, region, client_type, page)
+      for (profile, region, name), pages in self.responses.items()
+      if name == operation
+      for page in pages
+    ]
+
+  def metric_results(self) -> list[tuple[str, str, str, str, dict[str, Any]]]:
+    now = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    results = []
+    for profile, names in self.bucket_names.items():
+      results.append(
+        (
+          profile,
+          self.fleet.region_names[0],
+          "cloudwatch",
+          "sizes0000",
+          {
+            "MetricDataResults": [
+              {
+                "Label": f"{name} StandardStorage",
+                "Timestamps": [now - timedelta(days=day) for day in range(3)],
+                "Values": [float(1024 ** 2 * (number + day)) for day in range(3)],
+              }
+              for number, name in enumerate(names)
+            ]
+          },
+        )
+      )
+    return results
+
+
+class FakeClient:
+  """Serves a SyntheticFleet's pages for one cell, sleeping `latency` per request."""
+
+  def __init__(self, fleet: SyntheticFleet, profile: str, region: str, latency: float) -> None:
+    self._fleet = fleet
+    self._profile = profile
+    self._region = region
+    self._latency = latency
+
+  def _pages(self, operation: str) -> list[dict[str, Any]]:
+    return self._fleet.responses.get((self._profile, self._region, operation), [{}])
+
+  def can_paginate(self, operation: str) -> bool:
+    return len(self._pages(operation)) > 1
+
+  def get_paginator(self, operation: str) -> Any:
+    client = self
+
+    class _Paginator:
+      def paginate(self, *args: Any, **kwargs: Any) -> Iterator[dict[str, Any]]:
+        for page in client._pages(operation):
+          time.sleep(client._latency)
+          yield page
+
+    return _Paginator()
+
+  def __getattr__(self, operation: str) -> Callable[..., dict[str, Any]]:
+    def _call(*args: Any, **kwargs: Any) -> dict[str, Any]:
+      time.sleep(self._latency)
+      return self._pages(operation)[0]
+
+    return _call
+
+
+@dataclass
+class Context:
+  fleet: SyntheticFleet
+  latency: float
+  directory: str
+
+  def clients(self, client_type: str) -> dict[str, dict[str, dict[str, FakeClient]]]:
+    clients: dict[str, dict[str, dict[str, FakeClient]]] = {}
+    for profile, region in self.fleet.fleet.cells:
+      clients.setdefault(profile, {})[region] = {
+        client_type: FakeClient(self.fleet, profile, region, self.latency)
+      }
+    return clients
+
+
+BENCHMARKS: dict[str, tuple[Callable[[Context], int], tuple[str, ...]]] = {}
+
+
+def benchmark(name: str, *requires: str) -> Callable[[Callable[[Context], int]], Callable[[Context], int]]:
+  """Register fn(context) -> items processed under name; requires lists optional modules."""
+
+  def _register(fn: Callable[[Context], int]) -> Callable[[Context], int]:
+    BENCHMARKS[name] = (fn, requires)
+    return fn
+
+  return _register
+
+
+def _aws_config(profiles: list[str], directory: str) -> None:
+  config_path = Path(directory) / "aws_config"
+  config_path.write_text(
+    "".join(
+      f"[profile {profile}]\nregion = us-east-1\naws_access_key_id = bench\naws_secret_access_key = bench\n"
+      for profile in profiles
+    ),
+    encoding="utf-8",
+  )
+  os.environ["AWS_CONFIG_FILE"] = str(config_path)
+  os.environ["AWS_SHARED_CREDENTIALS_FILE"] = str(Path(directory) / "aws_credentials")
+
+
+@benchmark("create_clients.lazy", "boto3")
+def bench_create_clients_lazy(context: Context) -> int:
+  from clients import ClientCache, create_clients
+
+  fleet = context.fleet.fleet
+  _aws_config(fleet.profiles, context.directory)
+  _sessions, clients = create_clients(fleet.profiles, fleet.region_names, ["ec2"], cache=ClientCache())
+  return sum(len(regions) for regions in clients.values())
+
+
+@benchmark("create_clients.eager", "boto3")
+def bench_create_clients_eager(context: Context) -> int:
+  from clients import ClientCache, create_clients
+
+  fleet = context.fleet.fleet
+  _aws_config(fleet.profiles, context.directory)
+  create_clients(fleet.profiles, fleet.region_names, ["ec2"], lazy=False, cache=ClientCache())
+  return len(fleet.cells)
+
+
+def _invoke(context: Context, **options: Any) -> int:
+  from function import stream_function
+  from scheduler import Scheduler, SchedulerSettings
+
+  with Scheduler(SchedulerSettings(rate=0)) as scheduler:
+    return sum(
+      1
+      for _page in stream_function(
+        context.clients("ec2"),
+        "describe_instances",
+        directory=context.directory,
+        key="bench",
+        scheduler=scheduler,
+        **options,
+      )
+    )
+
+
+@benchmark("invoke.threads")
+def bench_invoke_threads(context: Context) -> int:
+  return _invoke(context)
+
+
+@benchmark("invoke.threads.write")
+def bench_invoke_write(context: Context) -> int:
+  return _invoke(context, write=True)
+
+
+@benchmark("invoke.threads.read")
+def bench_invoke_read(context: Context) -> int:
+  return _invoke(context, read=True)
+
+
+def _cache_keys(context: Context) -> list[Any]:
+  from cache import CacheKey
+
+  return [
+    CacheKey("bench-cache", profile, region, "ec2", "describe_instances")
+    for profile, region in context.fleet.fleet.cells
+  ]
+
+
+@benchmark("cache.write")
+def bench_cache_write(context: Context) -> int:
+  from cache import open_store
+
+  store = open_store(context.directory)
+  pages = 0
+  for key in _cache_keys(context):
+    responses = context.fleet.responses[(key.profile, key.region, "describe_instances")]
+    pages += sum(1 for _page in store.put_pages(key, responses))
+  store.flush()
+  return pages
+
+
+@benchmark("cache.read")
+def bench_cache_read(context: Context) -> int:
+  from cache import open_store
+
+  store = open_store(context.directory)
+  return sum(len(pages) for pages in store.get_many(_cache_keys(context)).values())
+
+
+def _parse(rows: Iterator[list[Any]]) -> int:
+  return sum(1 for _row in rows)
+
+
+@benchmark("parse.gci")
+def bench_parse_gci(context: Context) -> int:
+  from output_parsing import iter_gci
+
+  return _parse(iter_gci(context.fleet.results("get_caller_identity", "sts")))
+
+
+@benchmark("parse.ec2list")
+def bench_parse_ec2list(context: Context) -> int:
+  from output_parsing import iter_ec2list
+
+  return _parse(iter_ec2list(context.fleet.results("describe_instances")))
+
+
+@benchmark("parse.ebslist")
+def bench_parse_ebslist(context: Context) -> int:
+  from output_parsing import iter_ebslist
+
+  return _parse(iter_ebslist(context.fleet.results("describe_volumes")))
+
+
+@benchmark("parse.rdslist")
+def bench_parse_rdslist(context: Context) -> int:
+  from output_parsing import iter_rdslist
+
+  return _parse(
+    iter_rdslist(
+      context.fleet.results("describe_db_instances", "rds"),
+      context.fleet.results("describe_db_clusters", "rds"),
+    )
+  )
+
+
+@benchmark("parse.s3list")
+def bench_parse_s3list(context: Context) -> int:
+  from output_parsing import iter_s3list
+
+  return _parse(iter_s3list(context.fleet.results("list_buckets", "s3")))
+
+
+@benchmark("parse.s3sizes")
+def bench_parse_s3sizes(context: Context) -> int:
+  from output_parsing import iter_s3sizes
+
+  return _parse(iter_s3sizes(context.fleet.metric_results()))
+
+
+def _write(context: Context, out_type: str, suffix: str) -> int:
+  from output import write_output
+  from output_parsing import COLUMN_TYPES, EBSLIST_HEADERS, iter_ebslist
+
+  rows = iter_ebslist(context.fleet.results("describe_volumes"))
+  filename = str(Path(context.directory) / f"bench_output.{suffix}")
+  with open(os.devnull, "w", encoding="utf-8") as devnull, redirect_stdout(devnull):
+    return write_output(EBSLIST_HEADERS, rows, out_type, filename, column_types=COLUMN_TYPES)
+
+
+@benchmark("output.console")
+def bench_output_console(context: Context) -> int:
+  return _write(context, "console", "txt")
+
+
+@benchmark("output.csv")
+def bench_output_csv(context: Context) -> int:
+  return _write(context, "csv", "csv")
+
+
+@benchmark("output.ndjson")
+def bench_output_ndjson(context: Context) -> int:
+  return _write(context, "ndjson", "ndjson")
+
+
+@benchmark("output.excel", "openpyxl")
+def bench_output_excel(context: Context) -> int:
+  return _write(context, "excel", "xlsx")
+
+
+@benchmark("output.parquet", "pyarrow")
+def bench_output_parquet(context: Context) -> int:
+  return _write(context, "parquet", "parquet")
+
+
+@benchmark("output.arrow", "pyarrow")
+def bench_output_arrow(context: Context) -> int:
+  return _write(context, "arrow", "arrow")
+
+
+@benchmark("startup.version")
+def bench_startup_version(context: Context) -> int:
+  subprocess.run([sys.executable, str(ROOT / "at.py"), "-v"], check=True, stdout=subprocess.DEVNULL)
+  return 1
+
+
+def run_benchmarks(
+  fleet: Fleet,
+  *,
+  repeat: int = 3,
+  latency: float = 0.02,
+  only: list[str] | None = None,
+) -> dict[str, dict[str, Any]]:
+  """Run the selected benchmarks; return name -> {seconds, items} or {skipped}.
+
+  seconds is the best of `repeat` runs. Benchmarks run in registration
+  order and share one cache directory, so invoke.threads.read and
+  cache.read read what the write benchmarks before them stored.
+  """
+  results: dict[str, dict[str, Any]] = {}
+  synthetic = SyntheticFleet(fleet)
+  with tempfile.TemporaryDirectory() as directory:
+    context = Context(synthetic, latency, directory)
+    for name, (fn, requires) in BENCHMARKS.items():
+      if only and not any(fnmatch.fnmatchcase(name, pattern) for pattern in only):
+        continue
+      missing = [module for module in requires if importlib.util.find_spec(module) is None]
+      if missing:
+        results[name] = {"skipped": f"needs {', '.join(missing)}"}
+        continue
+      timings = []
+      items = 0
+      for _ in range(repeat):
+        started = time.perf_counter()
+        items = fn(context)
+        timings.append(time.perf_counter() - started)
+      results[name] = {"seconds": min(timings), "items": items}
+    from cache import close_stores
+
+    close_stores()
+  return results
+
+
+def _commit() -> str | None:
+  try:
+    result = subprocess.run(
+      ["git", "rev-parse", "--short", "HEAD"],
+      cwd=ROOT,
+      capture_output=True,
+      text=True,
+      check=True,
+    )
+  except (OSError, subprocess.CalledProcessError):
+    return None
+  return result.stdout.strip() or None
+
+
+def load_history(path: Path) -> list[dict[str, Any]]:
+  if not path.exists():
+    return []
+  with path.open("r", encoding="utf-8") as handle:
+    return [json.loads(line) for line in handle if line.strip()]
+
+
+def previous_run(history: list[dict[str, Any]], fleet: Fleet, latency: float) -> dict[str, Any] | None:
+  for record in reversed(history):
+    if record.get("fleet") == asdict(fleet) and record.get("latency") == latency:
+      return record
+  return None
+
+
+def report(
+  results: dict[str, dict[str, Any]],
+  previous: dict[str, Any] | None,
+  threshold: float = REGRESSION_THRESHOLD,
+) -> tuple[str, list[str]]:
+  """Format results against a previous run; return the text and regressed names."""
+  earlier = (previous or {}).get("results", {})
+  lines = [f"{'benchmark':<24} {'seconds':>10} {'items/s':>12} {'previous':>10} {'change':>8}"]
+  regressions = []
+  for name, result in results.items():
+    if "skipped" in result:
+      lines.append(f"{name:<24} {'skipped':>10}  ({result['skipped']})")
+      continue
+    seconds = result["seconds"]
+    rate = result["items"] / seconds if seconds else 0.0
+    before = earlier.get(name, {}).get("seconds")
+    if before:
+      change = (seconds - before) / before
+      flag = " !" if change > threshold else ""
+      if flag:
+        regressions.append(name)
+      lines.append(f"{name:<24} {seconds:>10.4f} {rate:>12.0f} {before:>10.4f} {change:>+7.0%}{flag}")
+    else:
+      lines.append(f"{name:<24} {seconds:>10.4f} {rate:>12.0f} {'-':>10} {'-':>8}")
+  return "\n".join(lines) + "\n", regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("--scale", type=float, default=1.0, help="Fleet size relative to the default (default: 1).")
+  parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the best counts (default: 3).")
+  parser.add_argument(
+    "--latency",
+    type=float,
+    default=0.02,
+    metavar="SECONDS",
+    help="Injected latency per fake API request (default: 0.02).",
+  )
+  parser.add_argument("--only", nargs="+", metavar="PATTERN", help="Run benchmarks matching these globs.")
+  parser.add_argument(
+    "--history",
+    default=str(HISTORY_FILE),
+    metavar="FILE",
+    help="JSON lines history to compare with and append to (default: bench_history.jsonl).",
+  )
+  parser.add_argument(
+    "--no-record",
+    action="store_true",
+    help="Compare without appending to the history or writing bench_output.txt.",
+  )
+  parser.add_argument(
+    "--fail-on-regression",
+    action="store_true",
+    help=f"Exit 1 when a benchmark is more than {REGRESSION_THRESHOLD:.0%}% slower than the previous run.",
+  )
+  args = parser.parse_args(argv)
+
+  fleet = Fleet().scaled(args.scale)
+  history_path = Path(args.history)
+  previous = previous_run(load_history(history_path), fleet, args.latency)
+  results = run_benchmarks(fleet, repeat=args.repeat, latency=args.latency, only=args.only)
+
+  text, regressions = report(results, previous)
+  header = f"fleet: {asdict(fleet)}  latency: {args.latency}s  repeat: {args.repeat}\n"
+  print(header + text, end="")
+
+  if not args.no_record:
+    REPORT_FILE.write_text(header + text, encoding="utf-8")
+    record = {
+      "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+      "commit": _commit(),
+      "python": platform.python_version(),
+      "machine": platform.machine(),
+      "fleet": asdict(fleet),
+      "latency": args.latency,
+      "results": results,
+    }
+    with history_path.open("a", encoding="utf-8") as handle:
+      handle.write(json.dumps(record) + "\n")
+
+  if regressions and args.fail_on_regression:
+    print(f"regressed: {', '.join(regressions)}", file=sys.stderr)
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Measure `at` start-up time for commands that make no AWS calls.
+
+Each command runs in a fresh interpreter; the report lists min, median
+and max wall time in milliseconds, next to a bare `python -c pass`
+baseline, and is also written to bench_startup_output.txt.
+"""
+
+from __future__ import annotations
+
+import argparse
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent
+
+COMMANDS = {
+  "python": ["-c", "pass"],
+  "at -v": [str(ROOT / "at.py"), "-v"],
+  "at --help": [str(ROOT / "at.py"), "--help"],
+  "at debug": [str(ROOT / "at.py"), "-c", str(ROOT / "config.yaml"), "-d", "{cache}", "debug"],
+}
+
+
+def time_command(arguments: list[str], runs: int) -> list[float]:
+  timings = []
+  for _ in range(runs):
+    started = time.perf_counter()
+    subprocess.run([sys.executable, *arguments], check=True, stdout=subprocess.DEVNULL)
+    timings.append((time.perf_counter() - started) * 1000)
+  return timings
+
+
+def main(argv: list[str] | None = None) -> int:
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument("-n", "--runs", type=int, default=20, help="Runs per command (default: 20).")
+  parser.add_argument(
+    "-o",
+    "--output",
+    default=str(ROOT / "bench_startup_output.txt"),
+    metavar="FILE",
+    help="Report file (default: bench_startup_output.txt).",
+  )
+  args = parser.parse_args(argv)
+
+  lines = [f"{'command':<12} {'min ms':>8} {'median ms':>10} {'max ms':>8}"]
+  with tempfile.TemporaryDirectory() as cache_dir:
+    for name, arguments in COMMANDS.items():
+      arguments = [argument.replace("{cache}", cache_dir) for argument in arguments]
+      timings = time_command(arguments, args.runs)
+      lines.append(
+        f"{name:<12} {min(timings):>8.1f} {statistics.median(timings):>10.1f} {max(timings):>8.1f}"
+      )
+
+  report = "\n".join(lines) + "\n"
+  print(report, end="")
+  Path(args.output).write_text(report, encoding="utf-8")
+  return 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main(sys.argv[1:]))
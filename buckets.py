@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, wait
+import json
+from pathlib import Path
+import threading
+from typing import Any, Iterable, Mapping
+
+from scheduler import Scheduler
+
+LOCATION_CACHE_FILE = "bucket_regions.json"
+
+_locations: dict[str, str] = {}
+_locations_lock = threading.Lock()
+
+
+def normalize_location(location_constraint: str | None) -> str:
+  # get_bucket_location reports us-east-1 as null and eu-west-1 as the legacy "EU".
+  if not location_constraint:
+    return "us-east-1"
+  if location_constraint == "EU":
+    return "eu-west-1"
+  return location_constraint
+
+
+def _load_locations(directory: str) -> None:
+  cache_path = Path(directory) / LOCATION_CACHE_FILE
+  if not cache_path.exists():
+    return
+  with cache_path.open("r", encoding="utf-8") as handle:
+    stored = json.load(handle)
+  with _locations_lock:
+    for bucket, region in stored.items():
+      _locations.setdefault(bucket, region)
+
+
+def _save_locations(directory: str) -> None:
+  cache_dir = Path(directory)
+  cache_dir.mkdir(parents=True, exist_ok=True)
+  with _locations_lock:
+    stored = dict(sorted(_locations.items()))
+  partial_path = cache_dir / f"{LOCATION_CACHE_FILE}.partial"
+  with partial_path.open("w", encoding="utf-8") as handle:
+    json.dump(stored, handle, indent=1)
+  partial_path.replace(cache_dir / LOCATION_CACHE_FILE)
+
+
+def bucket_regions(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  results: Iterable[tuple[str, str, str, dict[str, Any]]],
+  *,
+  scheduler: Scheduler,
+  directory: str = "./cache/",
+  lookup: bool = True,
+) -> dict[str, str]:
+  """Map every bucket in the list_buckets results to the region it lives in.
+
+  BucketRegion from list_buckets is used when present. Other buckets are
+  looked up with get_bucket_location in parallel; answers are kept in
+  memory and in bucket_regions.json under the cache directory, since a
+  bucket never changes region. Buckets whose lookup fails, that are not
+  cached when lookup is off, or whose profile has no clients are left out.
+  """
+  _load_locations(directory)
+  missing: dict[str, str] = {}
+  with _locations_lock:
+    for profile_name, _region, _client_type, response in results:
+      for bucket in response.get("Buckets", []) or []:
+        name = bucket.get("Name")
+        if not name:
+          continue
+        if bucket.get("BucketRegion"):
+          _locations[name] = bucket["BucketRegion"]
+        elif lookup and name not in _locations and profile_name in clients:
+          missing.setdefault(name, profile_name)
+
+  lookups: dict[Future[Any], str] = {}
+  for name, profile_name in missing.items():
+    region_clients = next(iter(clients[profile_name].values()))
+    lookups[
+      scheduler.submit(
+        scheduler.call,
+        (profile_name, "global", "s3"),
+        region_clients["s3"].get_bucket_location,
+        Bucket=name,
+      )
+    ] = name
+  wait(lookups)
+
+  found = False
+  with _locations_lock:
+    for future, name in lookups.items():
+      if future.exception() is None:
+        _locations[name] = normalize_location(future.result().get("LocationConstraint"))
+        found = True
+    locations = dict(_locations)
+  if found:
+    _save_locations(directory)
+  return locations
@@ -0,0 +1,368 @@
+from __future__ import annotations
+
+import atexit
+from dataclasses import astuple, dataclass, replace
+import hashlib
+import json
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import Any, Iterable, Iterator, Mapping
+
+from codec import decode, encode
+
+CACHE_FILE = "cache.sqlite3"
+FLUSH_ROWS = 256
+# Committed entries are written at least this often, so a crash loses at most a few seconds of cells.
+FLUSH_SECONDS = 2.0
+DEFAULT_TTL = 900.0
+
+# Response keys that differ between identical fetches, left out of digests.
+VOLATILE_KEYS = frozenset(
+  {
+    "ContinuationToken",
+    "Marker",
+    "NextContinuationToken",
+    "NextMarker",
+    "NextToken",
+    "ResponseMetadata",
+  }
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+  cell_id TEXT PRIMARY KEY,
+  run_key TEXT NOT NULL,
+  profile TEXT NOT NULL,
+  region TEXT NOT NULL,
+  service TEXT NOT NULL,
+  operation TEXT NOT NULL,
+  params_hash TEXT NOT NULL,
+  nickname TEXT NOT NULL,
+  pages INTEGER NOT NULL,
+  created REAL NOT NULL,
+  digest TEXT NOT NULL DEFAULT ''
+);
+CREATE INDEX IF NOT EXISTS entries_by_run ON entries (run_key, service, operation);
+CREATE INDEX IF NOT EXISTS entries_by_cell ON entries (profile, region, service, operation, created);
+CREATE TABLE IF NOT EXISTS pages (
+  cell_id TEXT NOT NULL,
+  page INTEGER NOT NULL,
+  body BLOB NOT NULL,
+  PRIMARY KEY (cell_id, page)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS empty_cells (
+  cell_id TEXT PRIMARY KEY,
+  checked REAL NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def params_hash(parameters: Any) -> str:
+  if not parameters:
+    return ""
+  encoded = json.dumps(parameters, sort_keys=True, default=str).encode("utf-8")
+  return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def resolve_ttls(
+  config_data: Mapping[str, Any] | None,
+  override: float | None = None,
+) -> dict[str, float]:
+  """Per-service TTLs in seconds from the `cache_ttl` section of config.yaml."""
+  if override is not None:
+    return {"default": float(override)}
+  section = (config_data or {}).get("cache_ttl") or {}
+  ttls = {"default": DEFAULT_TTL}
+  ttls.update({service: float(seconds) for service, seconds in section.items()})
+  return ttls
+
+
+def service_ttl(ttls: Mapping[str, float] | None, service: str) -> float | None:
+  if ttls is None:
+    return None
+  return ttls.get(service, ttls.get("default"))
+
+
+@dataclass(frozen=True)
+class CacheKey:
+  run_key: str
+  profile: str
+  region: str
+  service: str
+  operation: str
+  params_hash: str = ""
+  nickname: str = ""
+
+  @property
+  def cell_id(self) -> str:
+    return hashlib.sha256("\0".join(astuple(self)).encode("utf-8")).hexdigest()
+
+
+class CacheStore:
+  """Response cache for one cache directory, backed by a single SQLite file.
+
+  Writes are buffered; an entry row is written only after all its pages.
+  """
+
+  def __init__(self, directory: str) -> None:
+    cache_dir = Path(directory)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    self.path = cache_dir / CACHE_FILE
+    self._lock = threading.RLock()
+    self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+    self._connection.execute("PRAGMA journal_mode=WAL")
+    self._connection.execute("PRAGMA synchronous=NORMAL")
+    self._connection.executescript(_SCHEMA)
+    columns = {row[1] for row in self._connection.execute("PRAGMA table_info(entries)")}
+    if "digest" not in columns:
+      self._connection.execute("ALTER TABLE entries ADD COLUMN digest TEXT NOT NULL DEFAULT ''")
+    self._page_rows: list[tuple[str, int, bytes]] = []
+    self._entry_rows: list[tuple[Any, ...]] = []
+    self._digests: dict[str, Any] = {}
+    self._flushed = time.monotonic()
+
+  def _entry_row(self, key: CacheKey, pages: int, digest: str) -> tuple[Any, ...]:
+    return (key.cell_id, *astuple(key), pages, time.time(), digest)
+
+  def _flush_locked(self) -> None:
+    self._flushed = time.monotonic()
+    if not self._page_rows and not self._entry_rows:
+      return
+    with self._connection:
+      self._connection.execute("BEGIN")
+      self._connection.executemany(
+        "INSERT OR REPLACE INTO pages (cell_id, page, body) VALUES (?, ?, ?)",
+        self._page_rows,
+      )
+      for row in self._entry_rows:
+        self._connection.execute(
+          "DELETE FROM pages WHERE cell_id = ? AND page >= ?",
+          (row[0], row[8]),
+        )
+      self._connection.executemany(
+        "INSERT OR REPLACE INTO entries"
+        " (cell_id, run_key, profile, region, service, operation, params_hash, nickname, pages, created, digest)"
+        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        self._entry_rows,
+      )
+    self._page_rows = []
+    self._entry_rows = []
+
+  def flush(self) -> None:
+    with self._lock:
+      self._flush_locked()
+
+  def add_page(self, key: CacheKey, page: int, response: Any) -> None:
+    body = encode(response)
+    if isinstance(response, Mapping):
+      response = {name: value for name, value in response.items() if name not in VOLATILE_KEYS}
+    content = encode(response, compress=False)
+    with self._lock:
+      if page == 0:
+        self._digests[key.cell_id] = hashlib.sha256()
+      self._digests[key.cell_id].update(content)
+      self._page_rows.append((key.cell_id, page, body))
+      if len(self._page_rows) >= FLUSH_ROWS:
+        self._flush_locked()
+
+  def commit(self, key: CacheKey, pages: int) -> None:
+    """Record an entry whose pages 0..pages-1 have been added."""
+    with self._lock:
+      digest = self._digests.pop(key.cell_id, None)
+      digest = digest or hashlib.sha256()
+      self._entry_rows.append(self._entry_row(key, pages, digest.hexdigest()))
+      if time.monotonic() - self._flushed >= FLUSH_SECONDS:
+        self._flush_locked()
+
+  def put(self, key: CacheKey, response: Any) -> None:
+    self.add_page(key, 0, response)
+    self.commit(key, 1)
+
+  def put_pages(self, key: CacheKey, pages: Iterable[Any]) -> Iterator[Any]:
+    """Store pages as they pass through; the entry is committed at the end."""
+    self.discard(key)
+    count = 0
+    for page in pages:
+      self.add_page(key, count, page)
+      count += 1
+      yield page
+    self.commit(key, count)
+
+  def discard(self, key: CacheKey) -> None:
+    """Drop a cell's entry so it reads as a miss until it is committed again."""
+    with self._lock:
+      self._connection.execute("DELETE FROM entries WHERE cell_id = ?", (key.cell_id,))
+
+  def page_count(self, key: CacheKey) -> int | None:
+    with self._lock:
+      self._flush_locked()
+      row = self._connection.execute(
+        "SELECT pages FROM entries WHERE cell_id = ?",
+        (key.cell_id,),
+      ).fetchone()
+    return None if row is None else row[0]
+
+  def get_pages(self, key: CacheKey) -> Iterator[Any] | None:
+    """Return an iterator over a cached cell's pages, or None on a miss.
+
+    Pages are decoded one at a time so a large cell is never held whole.
+    """
+    pages = self.page_count(key)
+    if pages is None:
+      return None
+
+    def _pages() -> Iterator[Any]:
+      for page in range(pages):
+        with self._lock:
+          row = self._connection.execute(
+            "SELECT body FROM pages WHERE cell_id = ? AND page = ?",
+            (key.cell_id, page),
+          ).fetchone()
+        yield decode(row[0])
+
+    return _pages()
+
+  def get_many(self, keys: Iterable[CacheKey]) -> dict[CacheKey, list[Any]]:
+    """Read every cached key in one transaction; misses are left out."""
+    wanted = {key.cell_id: key for key in keys}
+    found: dict[CacheKey, list[Any]] = {}
+    if not wanted:
+      return found
+    with self._lock:
+      self._flush_locked()
+      with self._connection:
+        self._connection.execute("BEGIN")
+        self._connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (cell_id TEXT PRIMARY KEY)")
+        self._connection.execute("DELETE FROM wanted")
+        self._connection.executemany("INSERT INTO wanted VALUES (?)", [(cell_id,) for cell_id in wanted])
+        rows = self._connection.execute(
+          "SELECT pages.cell_id, pages.body FROM wanted"
+          " JOIN entries ON entries.cell_id = wanted.cell_id"
+          " JOIN pages ON pages.cell_id = wanted.cell_id AND pages.page < entries.pages"
+          " ORDER BY pages.cell_id, pages.page"
+        ).fetchall()
+    for cell_id, body in rows:
+      found.setdefault(wanted[cell_id], []).append(decode(body))
+    return found
+
+  def fresh_keys(self, keys: Iterable[CacheKey], max_age: float) -> dict[CacheKey, CacheKey]:
+    """Map each key to its newest entry under any run key younger than max_age."""
+    groups: dict[tuple[str, str, str, str], dict[tuple[str, str], CacheKey]] = {}
+    for key in keys:
+      group = (key.profile, key.region, key.service, key.operation)
+      groups.setdefault(group, {})[(key.params_hash, key.nickname)] = key
+    fresh: dict[CacheKey, CacheKey] = {}
+    oldest = time.time() - max_age
+    with self._lock:
+      self._flush_locked()
+      for group, wanted in groups.items():
+        rows = self._connection.execute(
+          "SELECT run_key, params_hash, nickname FROM entries"
+          " WHERE profile = ? AND region = ? AND service = ? AND operation = ? AND created >= ?"
+          " ORDER BY created",
+          (*group, oldest),
+        ).fetchall()
+        for run_key, hashed, nickname in rows:
+          key = wanted.get((hashed, nickname))
+          if key is not None:
+            fresh[key] = replace(key, run_key=run_key)
+    return fresh
+
+  def keys(
+    self,
+    run_key: str,
+    service: str | None = None,
+    operation: str | None = None,
+  ) -> list[CacheKey]:
+    query = (
+      "SELECT run_key, profile, region, service, operation, params_hash, nickname"
+      " FROM entries WHERE run_key = ?"
+    )
+    arguments: list[Any] = [run_key]
+    if service is not None:
+      query += " AND service = ?"
+      arguments.append(service)
+    if operation is not None:
+      query += " AND operation = ?"
+      arguments.append(operation)
+    with self._lock:
+      self._flush_locked()
+      rows = self._connection.execute(query, arguments).fetchall()
+    return [CacheKey(*row) for row in rows]
+
+  def digests(
+    self,
+    run_key: str,
+    service: str | None = None,
+    operation: str | None = None,
+  ) -> dict[CacheKey, str]:
+    """Map a run's keys to a digest of their pages' content ("" for old entries)."""
+    query = (
+      "SELECT run_key, profile, region, service, operation, params_hash, nickname, digest"
+      " FROM entries WHERE run_key = ?"
+    )
+    arguments: list[Any] = [run_key]
+    if service is not None:
+      query += " AND service = ?"
+      arguments.append(service)
+    if operation is not None:
+      query += " AND operation = ?"
+      arguments.append(operation)
+    with self._lock:
+      self._flush_locked()
+      rows = self._connection.execute(query, arguments).fetchall()
+    return {CacheKey(*row[:7]): row[7] for row in rows}
+
+  def mark_empty(self, key: CacheKey, empty: bool) -> None:
+    """Remember whether a fetch of key's cell, under any run key, returned nothing."""
+    cell_id = replace(key, run_key="").cell_id
+    with self._lock:
+      if empty:
+        self._connection.execute(
+          "INSERT OR REPLACE INTO empty_cells (cell_id, checked) VALUES (?, ?)",
+          (cell_id, time.time()),
+        )
+      else:
+        self._connection.execute("DELETE FROM empty_cells WHERE cell_id = ?", (cell_id,))
+
+  def recently_empty(self, keys: Iterable[CacheKey], max_age: float) -> set[CacheKey]:
+    """Return the keys whose cell was marked empty less than max_age seconds ago."""
+    wanted = {replace(key, run_key="").cell_id: key for key in keys}
+    with self._lock:
+      rows = self._connection.execute(
+        "SELECT cell_id FROM empty_cells WHERE checked >= ?",
+        (time.time() - max_age,),
+      ).fetchall()
+    return {wanted[cell_id] for (cell_id,) in rows if cell_id in wanted}
+
+  def close(self) -> None:
+    with self._lock:
+      self._flush_locked()
+      self._connection.close()
+
+
+_stores: dict[Path, CacheStore] = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(directory: str) -> CacheStore:
+  """Return the process-wide store for a cache directory, opening it once."""
+  path = Path(directory).resolve()
+  with _stores_lock:
+    store = _stores.get(path)
+    if store is None:
+      store = CacheStore(directory)
+      _stores[path] = store
+    return store
+
+
+def close_stores() -> None:
+  with _stores_lock:
+    for store in _stores.values():
+      store.close()
+    _stores.clear()
+
+
+atexit.register(close_stores)
@@ -1,26 +1,231 @@
 from __future__ import annotations
 
-from typing import Iterable
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Any, Callable, Iterable, Iterator, Mapping
 
 import boto3
+from botocore.config import Config
+
+# Client options for services without their own entry under `clients` in
+# config.yaml. botocore's standard retry mode retries transient network and
+# 5xx errors and throttling codes too, so each scheduler attempt can be up to
+# max_attempts requests and the scheduler's backoff and concurrency limit
+# only see a throttle botocore gave up on. Its retries are counted in the
+# --stats attempts (ResponseMetadata.RetryAttempts).
+DEFAULT_CLIENT_OPTIONS: dict[str, Any] = {
+  "tcp_keepalive": True,
+  "connect_timeout": 10,
+  "read_timeout": 60,
+  "retries": {"mode": "standard", "max_attempts": 3},
+}
+
+
+def resolve_client_options(
+  config_data: Mapping[str, Any] | None,
+  *,
+  max_pool_connections: int | None = None,
+) -> dict[str, dict[str, Any]]:
+  """Per-service botocore Config options from the `clients` section of config.yaml.
+
+  The "default" entry is merged over DEFAULT_CLIENT_OPTIONS and each
+  service's entry over that. max_pool_connections, normally the
+  scheduler's max_workers, applies wherever the config does not set one.
+  """
+  section = dict((config_data or {}).get("clients") or {})
+  default = {**DEFAULT_CLIENT_OPTIONS, **(section.pop("default", None) or {})}
+  if max_pool_connections is not None:
+    default.setdefault("max_pool_connections", max_pool_connections)
+  options = {"default": default}
+  for client_type, service_options in section.items():
+    options[client_type] = {**default, **(service_options or {})}
+  return options
+
+
+class LazyMapping(Mapping[str, Any]):
+  """Mapping over a fixed set of keys whose values are built on first access."""
+
+  def __init__(self, keys: Iterable[str], factory: Callable[[str], Any]) -> None:
+    self._keys = list(dict.fromkeys(keys))
+    self._factory = factory
+
+  def __getitem__(self, key: str) -> Any:
+    if key not in self._keys:
+      raise KeyError(key)
+    return self._factory(key)
+
+  def __iter__(self) -> Iterator[str]:
+    return iter(self._keys)
+
+  def __len__(self) -> int:
+    return len(self._keys)
+
+
+class ClientCache:
+  """Process-wide cache of one Session per profile and one client per cell.
+
+  All sessions share the first session's botocore data loader, so each
+  service model and the endpoint data are read from disk once per process.
+  Every client is built with its service's botocore Config (see
+  configure) and reused by every operation in the process, so its pooled
+  keep-alive connections are too.
+  boto3 sessions are not thread-safe, so client construction for a profile
+  is serialised on that profile's lock.
+  """
+
+  def __init__(self, options: Mapping[str, Mapping[str, Any]] | None = None) -> None:
+    self._lock = threading.Lock()
+    self._profile_locks: dict[str, threading.Lock] = {}
+    self._sessions: dict[str, boto3.session.Session] = {}
+    self._clients: dict[tuple[str, str, str], Any] = {}
+    self._loader: Any = None
+    self._options: dict[str, dict[str, Any]] = {}
+    self._configs: dict[str, Config] = {}
+    self.configure(resolve_client_options(None) if options is None else options)
+
+  def configure(self, options: Mapping[str, Mapping[str, Any]] | None) -> None:
+    """Set per-service client options (see resolve_client_options).
+
+    Clients built under different options are dropped, so later calls get
+    clients with the new configuration.
+    """
+    options = {client_type: dict(value) for client_type, value in (options or {}).items()}
+    if options == self._options:
+      return
+    with self._lock:
+      self._options = options
+      self._configs = {}
+      self._clients.clear()
+
+  @property
+  def options(self) -> dict[str, dict[str, Any]]:
+    """The per-service options clients are built with, as last configured."""
+    return {client_type: dict(value) for client_type, value in self._options.items()}
+
+  def client_options(self, client_type: str) -> dict[str, Any]:
+    return dict(self._options.get(client_type, self._options.get("default", {})))
+
+  def _config(self, client_type: str) -> Config | None:
+    config = self._configs.get(client_type)
+    if config is None:
+      options = self.client_options(client_type)
+      if not options:
+        return None
+      config = Config(**options)
+      self._configs[client_type] = config
+    return config
+
+  def _profile_lock(self, profile_name: str) -> threading.Lock:
+    with self._lock:
+      return self._profile_locks.setdefault(profile_name, threading.Lock())
+
+  def _session_locked(self, profile_name: str) -> boto3.session.Session:
+    session = self._sessions.get(profile_name)
+    if session is None:
+      session = boto3.Session(profile_name=profile_name)
+      with self._lock:
+        if self._loader is None:
+          self._loader = session._session.get_component("data_loader")
+        else:
+          session._session.register_component("data_loader", self._loader)
+      self._sessions[profile_name] = session
+    return session
+
+  def session(self, profile_name: str) -> boto3.session.Session:
+    with self._profile_lock(profile_name):
+      return self._session_locked(profile_name)
+
+  def client(self, profile_name: str, region: str, client_type: str) -> Any:
+    cell = (profile_name, region, client_type)
+    client = self._clients.get(cell)
+    if client is not None:
+      return client
+    with self._profile_lock(profile_name):
+      client = self._clients.get(cell)
+      if client is None:
+        session = self._session_locked(profile_name)
+        client = session.client(client_type, region_name=region, config=self._config(client_type))
+        self._clients[cell] = client
+    return client
+
+  def clear(self) -> None:
+    with self._lock:
+      self._profile_locks.clear()
+      self._sessions.clear()
+      self._clients.clear()
+      self._loader = None
+
+
+CLIENT_CACHE = ClientCache()
 
 
 def create_clients(
   profiles: Iterable[str],
-  regions: Iterable[str],
+  regions: Iterable[str] | Mapping[str, Iterable[str]],
   client_types: Iterable[str],
-) -> tuple[dict[str, dict[str, boto3.session.Session]], dict[str, dict[str, dict[str, object]]]]:
-  sessions: dict[str, dict[str, boto3.session.Session]] = {}
-  clients: dict[str, dict[str, dict[str, object]]] = {}
+  *,
+  lazy: bool = True,
+  max_workers: int | None = None,
+  cache: ClientCache | None = None,
+) -> tuple[dict[str, Mapping[str, boto3.session.Session]], dict[str, dict[str, Mapping[str, Any]]]]:
+  """Map profile -> region -> client type -> client.
+
+  regions is one list for every profile, or a mapping from each profile
+  to its own list, as returned by regions.discover_regions.
+  """
+  cache = cache or CLIENT_CACHE
+  profiles = list(dict.fromkeys(profiles))
+  if isinstance(regions, Mapping):
+    profile_regions = {
+      profile_name: list(dict.fromkeys(regions.get(profile_name, ())))
+      for profile_name in profiles
+    }
+  else:
+    regions = list(dict.fromkeys(regions))
+    profile_regions = {profile_name: regions for profile_name in profiles}
+  client_types = list(dict.fromkeys(client_types))
+  sessions: dict[str, Mapping[str, boto3.session.Session]] = {}
+  clients: dict[str, dict[str, Mapping[str, Any]]] = {}
 
   for profile_name in profiles:
-    sessions[profile_name] = {}
+    sessions[profile_name] = LazyMapping(
+      profile_regions[profile_name],
+      lambda _region, profile_name=profile_name: cache.session(profile_name),
+    )
     clients[profile_name] = {}
-    for region in regions:
-      session = boto3.Session(profile_name=profile_name, region_name=region)
-      sessions[profile_name][region] = session
-      clients[profile_name][region] = {}
+    for region in profile_regions[profile_name]:
+      clients[profile_name][region] = LazyMapping(
+        client_types,
+        lambda client_type, profile_name=profile_name, region=region: cache.client(
+          profile_name, region, client_type
+        ),
+      )
+
+  if lazy:
+    return sessions, clients
+
+  def _build_profile(profile_name: str) -> None:
+    for region in profile_regions[profile_name]:
       for client_type in client_types:
-        clients[profile_name][region][client_type] = session.client(client_type)
+        cache.client(profile_name, region, client_type)
+
+  with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    for future in [executor.submit(_build_profile, profile_name) for profile_name in profiles]:
+      future.result()
 
   return sessions, clients
+
+
+def select_clients(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  client_types: Iterable[str],
+) -> dict[str, dict[str, Mapping[str, Any]]]:
+  """Narrow a create_clients mapping to client_types without building any client."""
+  client_types = list(client_types)
+  return {
+    profile_name: {
+      region: LazyMapping(client_types, region_clients.__getitem__)
+      for region, region_clients in regions.items()
+    }
+    for profile_name, regions in clients.items()
+  }
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Iterable
+
+MAX_QUERIES_PER_REQUEST = 500
+S3_SIZE_PERIOD = 86400
+# BucketSizeBytes is published once a day, up to a day or two late.
+S3_SIZE_WINDOW = timedelta(days=3)
+# The window moves every hour, so it is left out of the cache key; pass as
+# unhashed to invoke_function_special_parameters.
+S3_SIZE_WINDOW_PARAMETERS = frozenset({"StartTime", "EndTime"})
+
+
+def s3_size_metrics(
+  results: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> dict[str, dict[str, list[tuple[str, str]]]]:
+  """Group list_metrics pages into (bucket, storage_type) pairs per cell."""
+  metrics: dict[str, dict[str, list[tuple[str, str]]]] = {}
+  for profile, region, _client_type, response in results:
+    cell_metrics = metrics.setdefault(profile, {}).setdefault(region, [])
+    for metric in response.get("Metrics", []) or []:
+      dimensions = {
+        dimension["Name"]: dimension["Value"]
+        for dimension in metric.get("Dimensions", [])
+      }
+      bucket = dimensions.get("BucketName")
+      storage_type = dimensions.get("StorageType")
+      if bucket and storage_type:
+        cell_metrics.append((bucket, storage_type))
+  return metrics
+
+
+def build_s3_size_queries(pairs: Iterable[tuple[str, str]]) -> list[dict[str, Any]]:
+  queries: list[dict[str, Any]] = []
+  for index, (bucket, storage_type) in enumerate(sorted(set(pairs))):
+    queries.append(
+      {
+        "Id": f"m{index}",
+        # Bucket names cannot contain spaces, so the label round-trips.
+        "Label": f"{bucket} {storage_type}",
+        "MetricStat": {
+          "Metric": {
+            "Namespace": "AWS/S3",
+            "MetricName": "BucketSizeBytes",
+            "Dimensions": [
+              {"Name": "BucketName", "Value": bucket},
+              {"Name": "StorageType", "Value": storage_type},
+            ],
+          },
+          "Period": S3_SIZE_PERIOD,
+          "Stat": "Average",
+        },
+        "ReturnData": True,
+      }
+    )
+  return queries
+
+
+def build_s3_size_parameters(
+  metrics: dict[str, dict[str, list[tuple[str, str]]]],
+  *,
+  now: datetime | None = None,
+  batch_size: int = MAX_QUERIES_PER_REQUEST,
+) -> dict[str, dict[str, dict[str, dict[str, Any]]]]:
+  """Pack every cell's queries into get_metric_data calls of batch_size.
+
+  The result plugs into invoke_function_special_parameters, one nickname
+  per batch, with unhashed=S3_SIZE_WINDOW_PARAMETERS. The window ends on
+  the current hour.
+  """
+  end_time = (now or datetime.now(timezone.utc)).replace(minute=0, second=0, microsecond=0)
+  start_time = end_time - S3_SIZE_WINDOW
+  parameters: dict[str, dict[str, dict[str, dict[str, Any]]]] = {}
+  for profile, regions in metrics.items():
+    for region, pairs in regions.items():
+      queries = build_s3_size_queries(pairs)
+      for batch_start in range(0, len(queries), batch_size):
+        nickname = f"sizes{batch_start // batch_size:04d}"
+        parameters.setdefault(profile, {}).setdefault(region, {})[nickname] = {
+          "MetricDataQueries": queries[batch_start:batch_start + batch_size],
+          "StartTime": start_time,
+          "EndTime": end_time,
+          "ScanBy": "TimestampDescending",
+        }
+  return parameters
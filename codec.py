@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timezone
+import json
+import zlib
+from typing import Any
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+try:
+  import msgpack
+except ImportError:
+  msgpack = None
+
+# Every encoded body starts with a two-byte header: compression, encoding.
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+ENCODING_JSON = 0
+ENCODING_MSGPACK = 1
+
+_DATETIME_TAG = "$datetime"
+
+
+def _json_default(value: Any) -> Any:
+  if isinstance(value, datetime):
+    return {_DATETIME_TAG: value.isoformat()}
+  if isinstance(value, date):
+    return value.isoformat()
+  if isinstance(value, (bytes, bytearray)):
+    return bytes(value).decode("utf-8", "replace")
+  return str(value)
+
+
+def _json_object_hook(value: dict[str, Any]) -> Any:
+  if len(value) == 1 and _DATETIME_TAG in value:
+    return datetime.fromisoformat(value[_DATETIME_TAG])
+  return value
+
+
+def _msgpack_default(value: Any) -> Any:
+  if isinstance(value, datetime):
+    # msgpack's timestamp type needs an aware datetime; boto3 always returns UTC.
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+  return _json_default(value)
+
+
+def encode(value: Any, *, compress: bool = True) -> bytes:
+  """Serialise a response, keeping datetimes typed, and compress it.
+
+  msgpack and zstd are used when installed, falling back to JSON and zlib.
+  """
+  if msgpack is not None:
+    encoding = ENCODING_MSGPACK
+    body = msgpack.packb(value, default=_msgpack_default, datetime=True)
+  else:
+    encoding = ENCODING_JSON
+    body = json.dumps(value, default=_json_default, separators=(",", ":")).encode("utf-8")
+  if not compress:
+    compression = COMPRESSION_NONE
+  elif zstandard is not None:
+    compression = COMPRESSION_ZSTD
+    body = zstandard.ZstdCompressor(level=3).compress(body)
+  else:
+    compression = COMPRESSION_ZLIB
+    body = zlib.compress(body, 6)
+  return bytes((compression, encoding)) + body
+
+
+def decode(body: bytes | str) -> Any:
+  """Decode a body from encode(); plain JSON text from older caches also works."""
+  if isinstance(body, str):
+    return json.loads(body, object_hook=_json_object_hook)
+  compression, encoding, payload = body[0], body[1], body[2:]
+  if compression == COMPRESSION_ZLIB:
+    payload = zlib.decompress(payload)
+  elif compression == COMPRESSION_ZSTD:
+    if zstandard is None:
+      raise RuntimeError("cache entry is zstd-compressed; install zstandard to read it")
+    payload = zstandard.ZstdDecompressor().decompress(payload)
+  if encoding == ENCODING_MSGPACK:
+    if msgpack is None:
+      raise RuntimeError("cache entry is msgpack-encoded; install msgpack to read it")
+    return msgpack.unpackb(payload, timestamp=3, strict_map_key=False)
+  return json.loads(payload, object_hook=_json_object_hook)
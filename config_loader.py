@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any
+
+CONFIG_CACHE_FILE = "config_cache.json"
+
+_loaded: dict[tuple[str, int, int], dict[str, Any]] = {}
+
+
+def _stamp(path: Path) -> tuple[str, int, int]:
+  stat = path.stat()
+  return str(path), stat.st_size, stat.st_mtime_ns
+
+
+def _read_cached(cache_path: Path, stamp: tuple[str, int, int]) -> dict[str, Any] | None:
+  try:
+    with cache_path.open("r", encoding="utf-8") as handle:
+      stored = json.load(handle).get(stamp[0])
+  except (OSError, ValueError, AttributeError):
+    return None
+  if not stored or stored.get("stamp") != list(stamp):
+    return None
+  return stored["config"]
+
+
+def _write_cached(cache_path: Path, stamp: tuple[str, int, int], config_data: dict[str, Any]) -> None:
+  try:
+    with cache_path.open("r", encoding="utf-8") as handle:
+      stored = json.load(handle)
+  except (OSError, ValueError):
+    stored = {}
+  if not isinstance(stored, dict):
+    stored = {}
+  stored[stamp[0]] = {"stamp": list(stamp), "config": config_data}
+  try:
+    encoded = json.dumps(stored, indent=1)
+  except (TypeError, ValueError):
+    # Values JSON cannot represent, such as YAML dates, are never cached.
+    return
+  partial_path = cache_path.with_name(f"{cache_path.name}.partial")
+  try:
+    partial_path.write_text(encoded, encoding="utf-8")
+    partial_path.replace(cache_path)
+  except OSError:
+    pass
+
+
+def load_config(path: str, cache_dir: str | None = None) -> dict[str, Any]:
+  """Parse a config.yaml, reusing an earlier parse while the file is unchanged.
+
+  Parses are kept in memory and, when cache_dir exists, in
+  config_cache.json there, keyed by the file's path, size and mtime, so a
+  repeat run neither imports PyYAML nor parses the file again.
+  """
+  resolved = Path(path).resolve()
+  stamp = _stamp(resolved)
+  config_data = _loaded.get(stamp)
+  if config_data is not None:
+    return config_data
+
+  cache_path = Path(cache_dir) / CONFIG_CACHE_FILE if cache_dir and Path(cache_dir).is_dir() else None
+  if cache_path is not None:
+    config_data = _read_cached(cache_path, stamp)
+  if config_data is None:
+    import yaml
+
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    with resolved.open("r", encoding="utf-8") as handle:
+      config_data = yaml.load(handle, Loader=loader) or {}
+    if cache_path is not None:
+      _write_cached(cache_path, stamp, config_data)
+  _loaded[stamp] = config_data
+  return config_data
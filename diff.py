@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from collections import Counter
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Iterable, Iterator
+
+import output_parsing
+from cache import CacheKey, CacheStore
+
+
+@dataclass(frozen=True)
+class DiffSpec:
+  """How to rebuild one command's rows from a cached run.
+
+  operations are the (service, operation) cells the command caches; rows
+  turns (operation, profile, region, client_type, page) tuples into rows
+  with headers; rows are matched between runs on profile, region and
+  id_column.
+  """
+
+  headers: list[str]
+  operations: tuple[tuple[str, str], ...]
+  rows: Callable[[Iterable[tuple[str, str, str, str, Any]]], Iterator[list[Any]]]
+  id_column: str
+
+  @property
+  def diff_headers(self) -> list[str]:
+    return ["change", *self.headers, "changed"]
+
+
+def _without_operation(
+  results: Iterable[tuple[str, str, str, str, Any]],
+) -> Iterator[tuple[str, str, str, Any]]:
+  for _operation, profile, region, client_type, page in results:
+    yield profile, region, client_type, page
+
+
+DIFF_SPECS = {
+  "ec2list": DiffSpec(
+    output_parsing.EC2LIST_HEADERS,
+    (("ec2", "describe_instances"),),
+    lambda results: output_parsing.iter_ec2list(_without_operation(results)),
+    "instance_id",
+  ),
+  "ebslist": DiffSpec(
+    output_parsing.EBSLIST_HEADERS,
+    (("ec2", "describe_volumes"),),
+    lambda results: output_parsing.iter_ebslist(_without_operation(results)),
+    "volume_id",
+  ),
+  "rdslist": DiffSpec(
+    output_parsing.RDSLIST_HEADERS,
+    (("rds", "describe_db_clusters"), ("rds", "describe_db_instances")),
+    output_parsing.iter_rdslist_jobs,
+    "name",
+  ),
+}
+
+
+def has_run(store: CacheStore, run_key: str, spec: DiffSpec) -> bool:
+  """Whether run_key cached any cell of spec's operations."""
+  return any(store.keys(run_key, service, operation) for service, operation in spec.operations)
+
+
+def changed_cells(
+  store: CacheStore,
+  run_a: str,
+  run_b: str,
+  service: str,
+  operation: str,
+) -> tuple[list[CacheKey], list[CacheKey]]:
+  """Return the cells of each run whose content differs from the other run's.
+
+  Cells are paired on everything but the run key and compared by digest,
+  so unchanged cells are never read. A cell only one run has is changed.
+  """
+  digests_a = {
+    replace(key, run_key=""): (key, digest)
+    for key, digest in store.digests(run_a, service, operation).items()
+  }
+  digests_b = {
+    replace(key, run_key=""): (key, digest)
+    for key, digest in store.digests(run_b, service, operation).items()
+  }
+  changed_a: list[CacheKey] = []
+  changed_b: list[CacheKey] = []
+  for cell in digests_a.keys() | digests_b.keys():
+    key_a, digest_a = digests_a.get(cell, (None, None))
+    key_b, digest_b = digests_b.get(cell, (None, None))
+    if digest_a and digest_a == digest_b:
+      continue
+    if key_a is not None:
+      changed_a.append(key_a)
+    if key_b is not None:
+      changed_b.append(key_b)
+  return changed_a, changed_b
+
+
+def cached_rows(store: CacheStore, spec: DiffSpec, keys: list[CacheKey]) -> Iterator[list[Any]]:
+  """Parse the cached pages of keys, cells of spec's operations, into rows."""
+  stored = store.get_many(keys)
+  return spec.rows(
+    (key.operation, key.profile, key.region, key.service, page)
+    for key in keys
+    for page in stored.get(key, [])
+  )
+
+
+def _rows(
+  store: CacheStore,
+  spec: DiffSpec,
+  keys: list[CacheKey],
+) -> dict[tuple[Any, ...], list[list[Any]]]:
+  id_index = spec.headers.index(spec.id_column)
+  rows: dict[tuple[Any, ...], list[list[Any]]] = {}
+  for row in cached_rows(store, spec, keys):
+    rows.setdefault((row[0], row[1], row[id_index]), []).append(row)
+  return rows
+
+
+def diff_runs(
+  store: CacheStore,
+  run_a: str,
+  run_b: str,
+  spec: DiffSpec,
+) -> Iterator[list[Any]]:
+  """Yield added, removed and changed rows between two cached runs.
+
+  Rows follow spec.diff_headers, [change, *headers, changed columns]:
+  added and changed rows carry run_b's values, removed rows run_a's. Only
+  cells whose digest differs are decoded and parsed, so the work follows
+  the size of the change rather than of the fleet. Rows sharing a profile, region and ID
+  are compared as a multiset; a one-to-one pair that differs is changed.
+  """
+  keys_a: list[CacheKey] = []
+  keys_b: list[CacheKey] = []
+  for service, operation in spec.operations:
+    changed_a, changed_b = changed_cells(store, run_a, run_b, service, operation)
+    keys_a.extend(changed_a)
+    keys_b.extend(changed_b)
+  rows_a = _rows(store, spec, keys_a)
+  rows_b = _rows(store, spec, keys_b)
+
+  for row_id in sorted(rows_a.keys() | rows_b.keys(), key=lambda row_id: tuple(map(str, row_id))):
+    before = Counter(map(tuple, rows_a.get(row_id, [])))
+    after = Counter(map(tuple, rows_b.get(row_id, [])))
+    removed = list((before - after).elements())
+    added = list((after - before).elements())
+    if len(removed) == 1 and len(added) == 1:
+      changed = [
+        header
+        for header, old, new in zip(spec.headers, removed[0], added[0])
+        if old != new
+      ]
+      yield ["changed", *added[0], ",".join(changed)]
+      continue
+    for row in removed:
+      yield ["removed", *row, ""]
+    for row in added:
+      yield ["added", *row, ""]
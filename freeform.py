@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from cache import CacheStore
+from diff import DIFF_SPECS, cached_rows
+from function import GLOBAL_REGION
+from output import to_json
+from output_parsing import S3LIST_HEADERS, iter_s3list
+
+FREEFORM_HEADERS = ["profile", "region", "service", "nickname", "response"]
+# Cached commands --fan-out can read, with their columns.
+FAN_OUT_SOURCES = {
+  **{command: spec.headers for command, spec in DIFF_SPECS.items()},
+  "s3list": S3LIST_HEADERS,
+}
+
+
+@dataclass(frozen=True)
+class FanOut:
+  """Set parameter to each value of column in a cached run of command."""
+
+  parameter: str
+  command: str
+  column: str
+
+
+def parse_parameters(text: str) -> list[dict[str, Any]]:
+  """Parse request parameters given as JSON or YAML, inline or as @FILE.
+
+  A mapping is one set of parameters; a list of mappings is a fan-out,
+  one call per set in every cell.
+  """
+  if text.startswith("@"):
+    try:
+      text = Path(text[1:]).read_text(encoding="utf-8")
+    except OSError as error:
+      raise ValueError(f"cannot read {text[1:]}: {error.strerror}") from None
+  import yaml
+
+  loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+  try:
+    value = yaml.load(text, Loader=loader)
+  except yaml.YAMLError as error:
+    raise ValueError(f"expected JSON or YAML: {error}") from None
+  if value is None:
+    return [{}]
+  parameter_sets = value if isinstance(value, list) else [value]
+  if not parameter_sets or not all(isinstance(item, Mapping) for item in parameter_sets):
+    raise ValueError("expected a mapping of parameters or a list of mappings")
+  return [dict(item) for item in parameter_sets]
+
+
+def parse_fan_out(expression: str) -> FanOut:
+  """Parse PARAMETER=COMMAND.COLUMN, e.g. InstanceId=ec2list.instance_id."""
+  parameter, separator, source = expression.partition("=")
+  command, dot, column = source.partition(".")
+  if not separator or not dot or not parameter.strip():
+    raise ValueError(f"expected PARAMETER=COMMAND.COLUMN, got {expression!r}")
+  headers = FAN_OUT_SOURCES.get(command.strip())
+  if headers is None:
+    raise ValueError(f"fan-out reads {', '.join(FAN_OUT_SOURCES)}, not {command.strip()!r}")
+  if column.strip() not in headers:
+    raise ValueError(f"unknown column {column.strip()!r}; columns are {', '.join(headers)}")
+  return FanOut(parameter.strip(), command.strip(), column.strip())
+
+
+def s3list_results(store: CacheStore, run_key: str) -> list[tuple[str, str, str, Any]]:
+  """The list_buckets pages of a cached s3list run, as stream_function yields them."""
+  keys = list(store.digests(run_key, "s3", "list_buckets"))
+  stored = store.get_many(keys)
+  return [(key.profile, key.region, key.service, page) for key in keys for page in stored.get(key, [])]
+
+
+def fan_out_values(
+  store: CacheStore,
+  run_key: str,
+  fan_out: FanOut,
+  locations: Mapping[str, str] | None = None,
+) -> dict[str, dict[str, list[str]]]:
+  """Map profile -> region -> distinct non-empty values of the column in a cached run.
+
+  An s3list bucket belongs to the profile that lists it and is placed in
+  its region from locations (see buckets.bucket_regions) or list_buckets;
+  buckets whose region is unknown are left out.
+  """
+  if fan_out.command == "s3list":
+    headers = S3LIST_HEADERS
+    rows: Iterable[list[Any]] = (
+      row
+      for row in iter_s3list(s3list_results(store, run_key), locations)
+      if row[1] != GLOBAL_REGION
+    )
+  else:
+    spec = DIFF_SPECS[fan_out.command]
+    headers = spec.headers
+    keys = [key for service, operation in spec.operations for key in store.digests(run_key, service, operation)]
+    rows = cached_rows(store, spec, keys)
+  column = headers.index(fan_out.column)
+  values: dict[str, dict[str, dict[str, None]]] = {}
+  for row in rows:
+    if row[column] not in (None, ""):
+      values.setdefault(row[0], {}).setdefault(row[1], {})[str(row[column])] = None
+  return {
+    profile_name: {region: list(region_values) for region, region_values in regions.items()}
+    for profile_name, regions in values.items()
+  }
+
+
+def parameters_by_cell(
+  cells: Mapping[str, Iterable[str]],
+  parameter_sets: list[dict[str, Any]],
+  parameter: str | None = None,
+  values: Mapping[str, Mapping[str, Iterable[str]]] | None = None,
+) -> dict[str, dict[str, dict[str, dict[str, Any]]]]:
+  """Build function.invoke_function_special_parameters' parameters_dict.
+
+  cells maps each profile to its regions. Without parameter every cell
+  calls once per set, nicknamed by the set's position. With parameter, a
+  cell calls once per set for each of its values (see fan_out_values),
+  nicknamed by the value, or value#position with several sets; cells
+  without values are left out.
+  """
+  values = values or {}
+  by_cell: dict[str, dict[str, dict[str, dict[str, Any]]]] = {}
+  for profile_name, regions in cells.items():
+    for region in regions:
+      if parameter is None:
+        nicknamed = {str(index): parameter_set for index, parameter_set in enumerate(parameter_sets)}
+      else:
+        nicknamed = {
+          value if len(parameter_sets) == 1 else f"{value}#{index}": {**parameter_set, parameter: value}
+          for value in values.get(profile_name, {}).get(region, [])
+          for index, parameter_set in enumerate(parameter_sets)
+        }
+      if nicknamed:
+        by_cell.setdefault(profile_name, {})[region] = nicknamed
+  return by_cell
+
+
+def compile_query(expression: str) -> Callable[[Any], Any]:
+  """Compile a JMESPath expression into a function of one response."""
+  import jmespath
+  from jmespath.exceptions import JMESPathError
+
+  try:
+    return jmespath.compile(expression).search
+  except JMESPathError as error:
+    raise ValueError(f"invalid JMESPath expression {expression!r}: {error}") from None
+
+
+def freeform_rows(
+  results: Iterable[tuple[str, str, str, str, Any]],
+  search: Callable[[Any], Any] | None = None,
+  *,
+  encode: bool = True,
+) -> Iterator[list[Any]]:
+  """Yield FREEFORM_HEADERS rows, the response searched and, with encode, as JSON text."""
+  for profile_name, region, client_type, nickname, response in results:
+    if search is not None:
+      response = search(response)
+    yield [profile_name, region, client_type, nickname, to_json(response) if encode else response]
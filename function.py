@@ -1,9 +1,30 @@
 from __future__ import annotations
 
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, as_completed, wait
+from dataclasses import dataclass
 import json
 from pathlib import Path
-from typing import Any, Iterable, Mapping
+import time
+from typing import Any, Collection, Iterable, Iterator, Mapping
+
+from cache import CacheKey, CacheStore, open_store, params_hash, service_ttl
+from pipeline import END, PageQueue, ReorderBuffer
+from scheduler import Scheduler, default_scheduler
+from stats import CACHE
+
+
+GLOBAL_REGION = "global"
+GLOBAL_SERVICES = frozenset({"cloudfront", "iam", "organizations", "route53"})
+GLOBAL_OPERATIONS = frozenset(
+  {
+    ("s3", "list_buckets"),
+    ("sts", "get_caller_identity"),
+  }
+)
+
+
+def is_global(client_type: str, function_name: str) -> bool:
+  return client_type in GLOBAL_SERVICES or (client_type, function_name) in GLOBAL_OPERATIONS
 
 
 def build_filename(
@@ -14,7 +35,6 @@ def build_filename(
   directory: str,
 ) -> Path:
   cache_dir = Path(directory)
-  cache_dir.mkdir(parents=True, exist_ok=True)
   key_prefix = f"{key}_" if key else ""
   return cache_dir / f"{key_prefix}{profile_name}_{region}_{client_type}.json"
 
@@ -28,76 +48,581 @@ def build_filename_with_nickname(
   directory: str,
 ) -> Path:
   cache_dir = Path(directory)
-  cache_dir.mkdir(parents=True, exist_ok=True)
   key_prefix = f"{key}_" if key else ""
   return cache_dir / f"{key_prefix}{profile_name}_{region}_{client_type}_{nickname}.json"
 
 
-def invoke_function(
-  clients: dict[str, dict[str, dict[str, Any]]],
+def split_parameters(
+  parameters: Iterable[Any] | Mapping[str, Any] | None,
+) -> tuple[list[Any], dict[str, Any]]:
+  if parameters is None:
+    return [], {}
+  if isinstance(parameters, Mapping):
+    return [], dict(parameters)
+  return list(parameters), {}
+
+
+def parse_filters(
+  expressions: Iterable[str],
+  aliases: Mapping[str, str] | None = None,
+) -> list[dict[str, Any]]:
+  """Turn NAME=VALUE[,VALUE...] expressions into a Filters parameter; names go through aliases."""
+  aliases = aliases or {}
+  values: dict[str, list[str]] = {}
+  for expression in expressions:
+    name, separator, value = expression.partition("=")
+    name = name.strip()
+    if not separator or not name or not value:
+      raise ValueError(f"expected NAME=VALUE[,VALUE...], got {expression!r}")
+    values.setdefault(aliases.get(name, name), []).extend(value.split(","))
+  return [{"Name": name, "Values": name_values} for name, name_values in values.items()]
+
+
+def project(value: Any, fields: Mapping[str, Any] | None) -> Any:
+  """Keep only the keys in fields, a tree of nested dicts; lists are projected item by item."""
+  if not fields:
+    return value
+  if isinstance(value, list):
+    return [project(item, fields) for item in value]
+  if isinstance(value, Mapping):
+    return {name: project(value[name], subfields) for name, subfields in fields.items() if name in value}
+  return value
+
+
+def _iter_pages(
+  client: Any,
   function_name: str,
+  parameters: Iterable[Any] | Mapping[str, Any] | None,
+  paginate: bool,
+  scheduler: Scheduler,
+  cell: tuple[str, str, str],
+) -> Iterator[Any]:
+  args, kwargs = split_parameters(parameters)
+  if paginate and client.can_paginate(function_name):
+    paginator = client.get_paginator(function_name)
+    yield from scheduler.iterate(
+      cell,
+      lambda: iter(paginator.paginate(*args, **kwargs)),
+      operation=function_name,
+    )
+  else:
+    yield scheduler.call(cell, getattr(client, function_name), *args, **kwargs)
+
+
+def read_legacy_pages(
+  profile_name: str,
+  region: str,
+  client_type: str,
+  key: str | None,
+  directory: str,
+  paginate: bool,
+) -> Iterator[Any] | None:
+  """Read a response cached as per-call JSON files before the cache store."""
+  cache_path = build_filename(profile_name, region, client_type, key, directory)
+  pages_path = cache_path.with_suffix(".jsonl")
+  if paginate and pages_path.exists():
+    return _read_json_lines(pages_path)
+  if cache_path.exists():
+    with cache_path.open("r", encoding="utf-8") as handle:
+      return iter([json.load(handle)])
+  return None
+
+
+def _read_json_lines(pages_path: Path) -> Iterator[Any]:
+  with pages_path.open("r", encoding="utf-8") as handle:
+    for line in handle:
+      if line.strip():
+        yield json.loads(line)
+
+
+def build_cache_key(
+  key: str | None,
+  profile_name: str,
+  region: str,
+  client_type: str,
+  function_name: str,
+  parameters: Any,
+  paginate: bool,
+  nickname: str = "",
+  projection: Mapping[str, Any] | None = None,
+  unhashed: Collection[str] = (),
+) -> CacheKey:
+  # Parameters named in unhashed (a time window that moves with the clock)
+  # are left out, so a replayed run finds the cell it cached.
+  if unhashed and isinstance(parameters, Mapping):
+    parameters = {name: value for name, value in parameters.items() if name not in unhashed}
+  # A first-page-only response must not satisfy a paginated read, nor a
+  # projected one a read of the full response.
+  hashed = parameters
+  if not paginate or projection:
+    hashed = {"parameters": parameters}
+    if not paginate:
+      hashed["paginate"] = False
+    if projection:
+      hashed["projection"] = projection
+  return CacheKey(
+    key or "",
+    profile_name,
+    region,
+    client_type,
+    function_name,
+    params_hash(hashed),
+    nickname,
+  )
+
+
+def cached_pages(
+  store: CacheStore | None,
+  cache_key: CacheKey,
+  *,
+  read: bool,
+  max_age: float | None,
+  directory: str,
+  paginate: bool,
+  full_key: CacheKey | None = None,
+) -> Iterator[Any] | None:
+  """Return the cached pages for a cell, or None when it has to be fetched.
+
+  A projected cell falls back to full_key, the same cell's unprojected entry.
+  """
+  keys = [cache_key] if full_key is None else [cache_key, full_key]
+  if max_age is not None:
+    fresh = store.fresh_keys(keys, max_age)
+    for wanted in keys:
+      if wanted in fresh:
+        return store.get_pages(fresh[wanted])
+    return None
+  if not read:
+    return None
+  for wanted in keys:
+    cached = store.get_pages(wanted)
+    if cached is not None:
+      return cached
+  return read_legacy_pages(
+    cache_key.profile,
+    cache_key.region,
+    cache_key.service,
+    cache_key.run_key or None,
+    directory,
+    paginate,
+  )
+
+
+def cached_responses(
+  store: CacheStore | None,
+  cache_keys: Mapping[str, CacheKey],
+  *,
+  read: bool,
+  max_age: float | None,
+  directory: str,
+) -> dict[str, Any]:
+  """Look up single-page responses by nickname in one store transaction."""
+  if max_age is not None:
+    fresh = store.fresh_keys(cache_keys.values(), max_age)
+    stored = store.get_many(fresh.values())
+    return {
+      nickname: stored[fresh[cache_key]][0]
+      for nickname, cache_key in cache_keys.items()
+      if cache_key in fresh and fresh[cache_key] in stored
+    }
+  if not read:
+    return {}
+  stored = store.get_many(cache_keys.values())
+  responses: dict[str, Any] = {}
+  for nickname, cache_key in cache_keys.items():
+    if cache_key in stored:
+      responses[nickname] = stored[cache_key][0]
+      continue
+    cache_path = build_filename_with_nickname(
+      cache_key.profile,
+      cache_key.region,
+      cache_key.service,
+      nickname,
+      cache_key.run_key or None,
+      directory,
+    )
+    if cache_path.exists():
+      with cache_path.open("r", encoding="utf-8") as handle:
+        responses[nickname] = json.load(handle)
+  return responses
+
+
+@dataclass(frozen=True)
+class Job:
+  """One operation for stream_jobs; client_type limits it to one service."""
+
+  function_name: str
+  parameters: Iterable[Any] | Mapping[str, Any] | None = None
+  client_type: str | None = None
+  name: str | None = None
+  projection: Mapping[str, Any] | None = None
+
+  @property
+  def label(self) -> str:
+    return self.name or self.function_name
+
+
+def job_cache_keys(
+  key: str | None,
+  job: Job,
+  profile_name: str,
+  region: str,
+  client_type: str,
+  paginate: bool,
+) -> tuple[CacheKey, CacheKey | None]:
+  """Return a job cell's cache key and, for a projected job, its unprojected key."""
+  full_key = build_cache_key(
+    key,
+    profile_name,
+    region,
+    client_type,
+    job.function_name,
+    job.parameters,
+    paginate,
+  )
+  if not job.projection:
+    return full_key, None
+  cache_key = build_cache_key(
+    key,
+    profile_name,
+    region,
+    client_type,
+    job.function_name,
+    job.parameters,
+    paginate,
+    projection=job.projection,
+  )
+  return cache_key, full_key
+
+
+@dataclass(frozen=True)
+class CellFailure:
+  """A cell that raised instead of returning its pages; job is its label or nickname."""
+
+  job: str
+  profile: str
+  region: str
+  client_type: str
+  error: Exception
+
+  @property
+  def message(self) -> str:
+    return f"{type(self.error).__name__}: {self.error}"
+
+
+def is_empty_page(page: Any) -> bool:
+  """True for a response whose lists are all empty, such as a region with no instances."""
+  if not isinstance(page, Mapping):
+    return False
+  lists = [value for value in page.values() if isinstance(value, list)]
+  return bool(lists) and not any(lists)
+
+
+def empty_cell_key(job: Job, profile_name: str, region: str, client_type: str, paginate: bool) -> CacheKey:
+  # Emptiness is tracked across runs and projections; see CacheStore.mark_empty.
+  return build_cache_key(None, profile_name, region, client_type, job.function_name, job.parameters, paginate)
+
+
+def skip_recently_empty(
+  store: CacheStore,
+  cells: list[tuple[Job, str, str, str, Mapping[str, Any], list[str]]],
+  paginate: bool,
+  recheck_empty: float,
+) -> list[tuple[Job, str, str, str, Mapping[str, Any], list[str]]]:
+  """Leave out the job_cells that came back empty less than recheck_empty seconds ago."""
+  keys = [
+    empty_cell_key(job, profile_name, region, client_type, paginate)
+    for job, profile_name, region, client_type, *_rest in cells
+  ]
+  empty = store.recently_empty(keys, recheck_empty)
+  return [cell for cell, cell_key in zip(cells, keys) if cell_key not in empty]
+
+
+def track_empty(store: CacheStore, cell_key: CacheKey, pages: Iterable[Any]) -> Iterator[Any]:
+  """Pass pages through, then mark the cell empty or not in the store."""
+  empty = True
+  for page in pages:
+    empty = empty and is_empty_page(page)
+    yield page
+  store.mark_empty(cell_key, empty)
+
+
+def job_cells(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  jobs: Iterable[Job],
+) -> list[tuple[Job, str, str, str, Mapping[str, Any], list[str]]]:
+  """List (job, profile, region, client_type, region_clients, fan_out) cells in order."""
+  cells: list[tuple[Job, str, str, str, Mapping[str, Any], list[str]]] = []
+  for job in jobs:
+    for profile_name, regions in clients.items():
+      global_cells: dict[str, tuple[Mapping[str, Any], list[str]]] = {}
+      for region, region_clients in regions.items():
+        for client_type in region_clients:
+          if job.client_type is not None and client_type != job.client_type:
+            continue
+          if is_global(client_type, job.function_name):
+            global_cells.setdefault(client_type, (region_clients, []))[1].append(region)
+          else:
+            cells.append((job, profile_name, region, client_type, region_clients, [region]))
+      for client_type, (region_clients, fan_out) in global_cells.items():
+        cells.append((job, profile_name, GLOBAL_REGION, client_type, region_clients, fan_out))
+  return cells
+
+
+def stream_jobs(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  jobs: Iterable[Job],
   *,
-  parameters: Iterable[Any] | None = None,
   read: bool = False,
   write: bool = False,
   key: str | None = None,
   directory: str = "./cache/",
-) -> list[tuple[str, str, str, Any]]:
-  results: list[tuple[str, str, str, Any]] = []
-  parameters = list(parameters or [])
+  paginate: bool = True,
+  max_pending_pages: int = 64,
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  engine: str = "threads",
+  recheck_empty: float | None = None,
+  failures: list[CellFailure] | None = None,
+) -> Iterator[tuple[str, str, str, str, Any]]:
+  """Yield (job, profile, region, client_type, page) tuples as pages arrive.
+
+  All cells run on one scheduler and pages pass through a bounded channel.
+  With failures, a failing cell is recorded there and the others carry on.
+  """
+  if engine == "async":
+    import async_engine
+
+    yield from async_engine.stream_jobs(
+      clients,
+      jobs,
+      read=read,
+      write=write,
+      key=key,
+      directory=directory,
+      paginate=paginate,
+      max_pending_pages=max_pending_pages,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      recheck_empty=recheck_empty,
+      failures=failures,
+    )
+    return
+  scheduler = scheduler or default_scheduler()
+  uses_store = read or write or ttl is not None or recheck_empty is not None
+  store = open_store(directory) if uses_store else None
 
-  def _call_method(
+  def _cell_pages(
+    job: Job,
     profile_name: str,
     region: str,
     client_type: str,
-    client: Any,
-    read: bool,
-    write: bool,
-    key: str | None,
-    directory: str,
-  ) -> tuple[str, str, str, Any]:
-    cache_path = build_filename(profile_name, region, client_type, key, directory)
-    if read and cache_path.exists():
-      with cache_path.open("r", encoding="utf-8") as handle:
-        response = json.load(handle)
-    else:
-      method = getattr(client, function_name)
-      if parameters:
-        response = method(*parameters)
+    region_clients: Mapping[str, Any],
+  ) -> Iterator[Any]:
+    cache_key, full_key = job_cache_keys(key, job, profile_name, region, client_type, paginate)
+    max_age = service_ttl(ttl, client_type)
+    cached = cached_pages(
+      store,
+      cache_key,
+      read=read,
+      max_age=max_age,
+      directory=directory,
+      paginate=paginate,
+      full_key=full_key,
+    )
+    if cached is not None:
+      if scheduler.recorder is not None:
+        cached = scheduler.recorder.cached((profile_name, region, client_type), job.function_name, cached)
+      yield from cached
+      return
+    pages = _iter_pages(
+      region_clients[client_type],
+      job.function_name,
+      job.parameters,
+      paginate,
+      scheduler,
+      (profile_name, region, client_type),
+    )
+    if job.projection:
+      pages = (project(page, job.projection) for page in pages)
+    if write or max_age is not None:
+      pages = store.put_pages(cache_key, pages)
+    if recheck_empty is not None:
+      pages = track_empty(store, empty_cell_key(job, profile_name, region, client_type, paginate), pages)
+    yield from pages
+
+  def _produce(
+    index: int,
+    job: Job,
+    profile_name: str,
+    region: str,
+    client_type: str,
+    region_clients: Mapping[str, Any],
+    fan_out: list[str],
+  ) -> None:
+    try:
+      for page in _cell_pages(job, profile_name, region, client_type, region_clients):
+        for fan_out_region in fan_out:
+          if not channel.put(index, (job.label, profile_name, fan_out_region, client_type, page)):
+            return
+    except Exception as error:
+      if failures is None:
+        channel.put(index, error)
       else:
-        response = method()
-      if write:
-        with cache_path.open("w", encoding="utf-8") as handle:
-          json.dump(response, handle, default=str)
-    return profile_name, region, client_type, response
-
-  futures = []
-  with ThreadPoolExecutor() as executor:
-    for profile_name, regions in clients.items():
-      for region, region_clients in regions.items():
-        for client_type, client in region_clients.items():
-          futures.append(
-            executor.submit(
-              _call_method,
-              profile_name,
-              region,
-              client_type,
-              client,
-              read,
-              write,
-              key,
-              directory,
-            )
-          )
+        failures.append(CellFailure(job.label, profile_name, region, client_type, error))
+    except BaseException as error:
+      channel.put(index, error)
+    finally:
+      channel.finish(index)
 
-    for future in as_completed(futures):
-      results.append(future.result())
+  cells = job_cells(clients, jobs)
+  if recheck_empty is not None:
+    cells = skip_recently_empty(store, cells, paginate, recheck_empty)
+  channel_type = ReorderBuffer if ordered else PageQueue
+  channel = channel_type(len(cells), max_pending_pages)
+  futures: list[Future[None]] = []
+  try:
+    for index, cell in enumerate(cells):
+      futures.append(scheduler.submit(_produce, index, *cell))
 
+    while True:
+      item = channel.get()
+      if item is END:
+        break
+      if isinstance(item, BaseException):
+        raise item
+      yield item
+  finally:
+    channel.stop()
+    for future in futures:
+      future.cancel()
+    wait(futures)
+    if store is not None:
+      store.flush()
+
+
+def stream_function(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  function_name: str,
+  *,
+  parameters: Iterable[Any] | Mapping[str, Any] | None = None,
+  read: bool = False,
+  write: bool = False,
+  key: str | None = None,
+  directory: str = "./cache/",
+  paginate: bool = True,
+  max_pending_pages: int = 64,
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  engine: str = "threads",
+  projection: Mapping[str, Any] | None = None,
+  recheck_empty: float | None = None,
+  failures: list[CellFailure] | None = None,
+) -> Iterator[tuple[str, str, str, Any]]:
+  """Yield (profile, region, client_type, page) tuples for one operation.
+
+  A single-job stream_jobs; see there for caching, pagination and ordering.
+  """
+  for _job, profile_name, region, client_type, page in stream_jobs(
+    clients,
+    [Job(function_name, parameters, projection=projection)],
+    read=read,
+    write=write,
+    key=key,
+    directory=directory,
+    paginate=paginate,
+    max_pending_pages=max_pending_pages,
+    scheduler=scheduler,
+    ttl=ttl,
+    ordered=ordered,
+    engine=engine,
+    recheck_empty=recheck_empty,
+    failures=failures,
+  ):
+    yield profile_name, region, client_type, page
+
+
+def invoke_jobs(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  jobs: Iterable[Job],
+  *,
+  read: bool = False,
+  write: bool = False,
+  key: str | None = None,
+  directory: str = "./cache/",
+  paginate: bool = False,
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  engine: str = "threads",
+  recheck_empty: float | None = None,
+  failures: list[CellFailure] | None = None,
+) -> dict[str, list[tuple[str, str, str, Any]]]:
+  jobs = list(jobs)
+  results: dict[str, list[tuple[str, str, str, Any]]] = {job.label: [] for job in jobs}
+  for job_label, profile_name, region, client_type, page in stream_jobs(
+    clients,
+    jobs,
+    read=read,
+    write=write,
+    key=key,
+    directory=directory,
+    paginate=paginate,
+    scheduler=scheduler,
+    ttl=ttl,
+    ordered=ordered,
+    engine=engine,
+    recheck_empty=recheck_empty,
+    failures=failures,
+  ):
+    results[job_label].append((profile_name, region, client_type, page))
   return results
 
 
-def invoke_function_special_parameters(
-  clients: dict[str, dict[str, dict[str, Any]]],
+def invoke_function(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  function_name: str,
+  *,
+  parameters: Iterable[Any] | Mapping[str, Any] | None = None,
+  read: bool = False,
+  write: bool = False,
+  key: str | None = None,
+  directory: str = "./cache/",
+  paginate: bool = False,
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  engine: str = "threads",
+  projection: Mapping[str, Any] | None = None,
+  recheck_empty: float | None = None,
+  failures: list[CellFailure] | None = None,
+) -> list[tuple[str, str, str, Any]]:
+  return list(
+    stream_function(
+      clients,
+      function_name,
+      parameters=parameters,
+      read=read,
+      write=write,
+      key=key,
+      directory=directory,
+      paginate=paginate,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      projection=projection,
+      recheck_empty=recheck_empty,
+      failures=failures,
+    )
+  )
+
+
+def stream_function_special_parameters(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
   function_name: str,
   parameters_dict: Mapping[str, Mapping[str, Mapping[str, Any]]],
   *,
@@ -105,68 +630,174 @@ def invoke_function_special_parameters(
   write: bool = False,
   key: str | None = None,
   directory: str = "./cache/",
-) -> list[tuple[str, str, str, str, Any]]:
-  results: list[tuple[str, str, str, str, Any]] = []
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  engine: str = "threads",
+  failures: list[CellFailure] | None = None,
+  unhashed: Collection[str] = (),
+) -> Iterator[tuple[str, str, str, str, Any]]:
+  """Yield (profile, region, client_type, nickname, response) as calls finish.
+
+  Each nickname in parameters_dict[profile][region] is its own scheduler task.
+  """
+  if engine == "async":
+    import async_engine
+
+    yield from async_engine.invoke_function_special_parameters(
+      clients,
+      function_name,
+      parameters_dict,
+      read=read,
+      write=write,
+      key=key,
+      directory=directory,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      failures=failures,
+      unhashed=unhashed,
+    )
+    return
+  scheduler = scheduler or default_scheduler()
+  store = open_store(directory) if read or write or ttl is not None else None
 
-  def _call_method_for_region(
+  def _call_nickname(
     profile_name: str,
     region: str,
-    region_clients: dict[str, Any],
-    region_parameters: Mapping[str, Any],
-    read: bool,
-    write: bool,
-    key: str | None,
-    directory: str,
-  ) -> list[tuple[str, str, str, str, Any]]:
-    local_results: list[tuple[str, str, str, str, Any]] = []
-    for client_type, client in region_clients.items():
-      method = getattr(client, function_name)
-      for nickname, params in region_parameters.items():
-        cache_path = build_filename_with_nickname(
-          profile_name,
-          region,
-          client_type,
-          nickname,
-          key,
-          directory,
-        )
-        if read and cache_path.exists():
-          with cache_path.open("r", encoding="utf-8") as handle:
-            response = json.load(handle)
-        else:
-          if params is None:
-            response = method()
-          elif isinstance(params, dict):
-            response = method(**params)
-          else:
-            response = method(*params)
-          if write:
-            with cache_path.open("w", encoding="utf-8") as handle:
-              json.dump(response, handle, default=str)
-        local_results.append((profile_name, region, client_type, nickname, response))
-    return local_results
-
-  futures = []
-  with ThreadPoolExecutor() as executor:
+    client_type: str,
+    region_clients: Mapping[str, Any],
+    nickname: str,
+    params: Any,
+    cache_key: CacheKey | None,
+  ) -> tuple[str, str, str, str, Any] | None:
+    try:
+      args, kwargs = split_parameters(params)
+      response = scheduler.call(
+        (profile_name, region, client_type),
+        getattr(region_clients[client_type], function_name),
+        *args,
+        **kwargs,
+      )
+    except Exception as error:
+      if failures is None:
+        raise
+      failures.append(CellFailure(nickname, profile_name, region, client_type, error))
+      return None
+    if cache_key is not None:
+      store.put(cache_key, response)
+    return profile_name, region, client_type, nickname, response
+
+  results: list[tuple[str, str, str, str, Any] | Future[Any]] = []
+  futures: list[Future[Any]] = []
+  try:
     for profile_name, regions in clients.items():
       profile_params = parameters_dict.get(profile_name, {})
       for region, region_clients in regions.items():
         region_parameters = profile_params.get(region, {})
-        futures.append(
-          executor.submit(
-            _call_method_for_region,
-            profile_name,
-            region,
-            region_clients,
-            region_parameters,
-            read,
-            write,
-            key,
-            directory,
+        for client_type in region_clients:
+          cache_keys = {
+            nickname: build_cache_key(
+              key,
+              profile_name,
+              region,
+              client_type,
+              function_name,
+              params,
+              True,
+              nickname,
+              unhashed=unhashed,
+            )
+            for nickname, params in region_parameters.items()
+          }
+          max_age = service_ttl(ttl, client_type)
+          started = time.perf_counter()
+          cached = cached_responses(
+            store,
+            cache_keys,
+            read=read,
+            max_age=max_age,
+            directory=directory,
           )
-        )
+          if cached and scheduler.recorder is not None:
+            scheduler.recorder.record(
+              (profile_name, region, client_type),
+              function_name,
+              started,
+              source=CACHE,
+              attempts=0,
+              pages=len(cached),
+            )
+          for nickname, params in region_parameters.items():
+            if nickname in cached:
+              results.append((profile_name, region, client_type, nickname, cached[nickname]))
+              continue
+            future = scheduler.submit(
+              _call_nickname,
+              profile_name,
+              region,
+              client_type,
+              region_clients,
+              nickname,
+              params,
+              cache_keys[nickname] if write or max_age is not None else None,
+            )
+            futures.append(future)
+            results.append(future)
 
-    for future in as_completed(futures):
-      results.extend(future.result())
+    if ordered:
+      for result in results:
+        if isinstance(result, Future):
+          result = result.result()
+        if result is not None:
+          yield result
+    else:
+      for result in results:
+        if not isinstance(result, Future):
+          yield result
+      for future in as_completed(futures):
+        result = future.result()
+        if result is not None:
+          yield result
+  finally:
+    for future in futures:
+      future.cancel()
+    wait(futures)
+    if store is not None:
+      store.flush()
 
-  return results
+
+def invoke_function_special_parameters(
+  clients: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  function_name: str,
+  parameters_dict: Mapping[str, Mapping[str, Mapping[str, Any]]],
+  *,
+  read: bool = False,
+  write: bool = False,
+  key: str | None = None,
+  directory: str = "./cache/",
+  scheduler: Scheduler | None = None,
+  ttl: Mapping[str, float] | None = None,
+  ordered: bool = False,
+  engine: str = "threads",
+  failures: list[CellFailure] | None = None,
+  unhashed: Collection[str] = (),
+) -> list[tuple[str, str, str, str, Any]]:
+  """Collect stream_function_special_parameters into a list."""
+  return list(
+    stream_function_special_parameters(
+      clients,
+      function_name,
+      parameters_dict,
+      read=read,
+      write=write,
+      key=key,
+      directory=directory,
+      scheduler=scheduler,
+      ttl=ttl,
+      ordered=ordered,
+      engine=engine,
+      failures=failures,
+      unhashed=unhashed,
+    )
+  )
@@ -11,6 +11,6 @@ subcommands=(
 	example
 )
 
-for subcommand in "${subcommands[@]}"; do
-	at -t iter_run --write "$subcommand"
-done
+# One shell process runs every subcommand, so sessions and clients are
+# built once instead of once per subcommand.
+printf '%s\n' "${subcommands[@]}" | at -t iter_run --write shell
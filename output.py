@@ -1,31 +1,136 @@
 from __future__ import annotations
 
+from contextlib import ExitStack
 import csv
+from datetime import date, datetime
+import json
+import sys
+from typing import Any, Callable, Iterable, Mapping
 
-from openpyxl import Workbook
+ARROW_FORMATS = ("parquet", "arrow")
+# The extension of the default output file, out.<extension>, per file type.
+FILE_EXTENSIONS = {"csv": "csv", "excel": "xlsx", "ndjson": "ndjson", "parquet": "parquet", "arrow": "arrow"}
+ARROW_BATCH_ROWS = 10000
+
+
+def _json_default(value: Any) -> Any:
+	if isinstance(value, (datetime, date)):
+		return value.isoformat()
+	return str(value)
+
+
+def to_json(value: Any) -> str:
+	"""Encode a value as JSON, dates as ISO 8601 and anything else JSON lacks as str."""
+	return json.dumps(value, default=_json_default)
+
+
+def _arrow_writer(
+	headers: list[str],
+	column_types: Mapping[str, str],
+	out_type: str,
+	filename: str,
+	stack: ExitStack,
+) -> tuple[Callable[[list[Any]], None], Callable[[], None]]:
+	try:
+		import pyarrow
+	except ImportError as error:
+		raise RuntimeError(f"{out_type} output requires pyarrow") from error
+
+	arrow_types = {
+		"string": pyarrow.string(),
+		"int": pyarrow.int64(),
+		"float": pyarrow.float64(),
+		"bool": pyarrow.bool_(),
+		"timestamp": pyarrow.timestamp("us", tz="UTC"),
+	}
+	schema = pyarrow.schema(
+		[(header, arrow_types[column_types.get(header, "string")]) for header in headers]
+	)
+	if out_type == "parquet":
+		import pyarrow.parquet
+
+		writer = stack.enter_context(pyarrow.parquet.ParquetWriter(filename, schema))
+	else:
+		import pyarrow.ipc
+
+		writer = stack.enter_context(pyarrow.ipc.new_file(filename, schema))
+	columns: list[list[Any]] = [[] for _ in headers]
+
+	def _flush() -> None:
+		if columns[0]:
+			writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+			for column in columns:
+				column.clear()
+
+	def _write(row: list[Any]) -> None:
+		for column, value in zip(columns, row):
+			column.append(value)
+		if len(columns[0]) >= ARROW_BATCH_ROWS:
+			_flush()
+
+	return _write, _flush
 
 
 def write_output(
 	headers: list[str],
-	output: list[list[str]],
+	output: Iterable[list[Any]],
 	out_type: str,
 	filename: str,
-) -> None:
-	print(",".join(headers))
-	for row in output:
-		template = "{}," * (len(row) - 1) + "{}"
-		print(template.format(*row))
-
-	if out_type == "csv":
-		with open(filename, "w", newline="", encoding="utf-8") as handle:
-			writer = csv.writer(handle)
-			writer.writerow(headers)
-			writer.writerows(output)
-
-	if out_type == "excel":
-		workbook = Workbook()
-		worksheet = workbook.active
-		worksheet.append(headers)
+	*,
+	echo: bool | None = None,
+	column_types: Mapping[str, str] | None = None,
+) -> int:
+	"""Stream rows to the console and/or a file in one pass; return the row count.
+
+	Rows are written as they are produced, so the full output never has to
+	be in memory. The console is always written for the console type and
+	only with echo for file types. Parquet and Arrow IPC files are typed
+	from column_types (header -> string/int/float/bool/timestamp) and
+	written in record batches of ARROW_BATCH_ROWS.
+	"""
+	if echo is None:
+		echo = out_type == "console"
+
+	with ExitStack() as stack:
+		writers: list[Callable[[list[Any]], Any]] = []
+		finishers: list[Callable[[], Any]] = []
+		if echo:
+			writers.append(csv.writer(sys.stdout, lineterminator="\n").writerow)
+			writers[-1](headers)
+			finishers.append(sys.stdout.flush)
+
+		if out_type == "csv":
+			handle = stack.enter_context(open(filename, "w", newline="", encoding="utf-8"))
+			writers.append(csv.writer(handle).writerow)
+			writers[-1](headers)
+
+		if out_type == "excel":
+			from openpyxl import Workbook
+
+			workbook = Workbook(write_only=True)
+			worksheet = workbook.create_sheet()
+			worksheet.append(headers)
+			writers.append(worksheet.append)
+			finishers.append(lambda: workbook.save(filename))
+
+		if out_type == "ndjson":
+			handle = stack.enter_context(open(filename, "w", encoding="utf-8"))
+			writers.append(
+				lambda row: handle.write(to_json(dict(zip(headers, row))) + "\n")
+			)
+
+		if out_type in ARROW_FORMATS:
+			write, flush = _arrow_writer(headers, column_types or {}, out_type, filename, stack)
+			writers.append(write)
+			finishers.append(flush)
+
+		count = 0
 		for row in output:
-			worksheet.append(row)
-		workbook.save(filename)
\ No newline at end of file
+			for writer in writers:
+				writer(row)
+			count += 1
+
+		for finish in finishers:
+			finish()
+
+	return count
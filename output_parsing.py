@@ -1,142 +1,307 @@
 from __future__ import annotations
 
-from typing import Any
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any, Callable, Iterable, Iterator, Mapping
 
+# Column types for typed outputs (see output.write_output); other columns are strings.
+COLUMN_TYPES = {
+	"size": "int",
+	"iops": "int",
+	"size in MB": "float",
+}
 
-def parse_gci(
-	results: list[tuple[str, str, str, dict[str, Any]]],
-) -> tuple[list[str], list[list[str]]]:
-	headers = ["profile", "region", "userID", "account", "ARN"]
-	output: list[list[str]] = []
 
-	for profile, region, _client_type, response in results:
-		output.append(
-			[
-				profile,
-				region,
-				str(response.get("UserId", "")),
-				str(response.get("Account", "")),
-				str(response.get("Arn", "")),
+def _int_or_none(value: Any) -> int | None:
+	return None if value is None or value == "" else int(value)
+
+
+def _text(value: Any) -> str:
+	return "" if value is None else str(value)
+
+
+def _raw(value: Any) -> Any:
+	return value
+
+
+def _sequence(value: Any) -> Any:
+	return value or ()
+
+
+def _getter(path: tuple[str, ...]) -> Callable[[Any], Any]:
+	if len(path) == 1:
+		(name,) = path
+		return lambda item: item.get(name)
+	if len(path) == 2:
+		outer, inner = path
+
+		def _get_nested(item: Any) -> Any:
+			value = item.get(outer)
+			return value.get(inner) if isinstance(value, Mapping) else None
+
+		return _get_nested
+
+	def _get_path(item: Any) -> Any:
+		for name in path:
+			item = item.get(name) if isinstance(item, Mapping) else None
+		return item
+
+	return _get_path
+
+
+@dataclass(frozen=True)
+class Column:
+	"""One output column: the header and the key path read from each item."""
+
+	header: str
+	path: tuple[str, ...]
+	convert: Callable[[Any], Any] = _text
+
+	@cached_property
+	def get(self) -> Callable[[Any], Any]:
+		return _getter(self.path)
+
+	def values(self, items: list[Any]) -> list[Any]:
+		get = self.get
+		if self.convert is _raw:
+			return list(map(get, items))
+		if self.convert is _text:
+			return [
+				value if value.__class__ is str else _text(value)
+				for value in map(get, items)
 			]
-		)
+		return list(map(self.convert, map(get, items)))
+
+
+@dataclass(frozen=True)
+class RowSpec:
+	"""A parser declared as data: one row per item, one column per field.
+
+	items is the key path from a response to its items, where every key
+	holds a list (("Reservations", "Instances") walks both levels); an
+	empty path makes the response itself the only item. Missing keys read
+	as None. projection lists every key the parser reads, for
+	function.project.
+
+	A response is flattened a column at a time (see column_values), so each
+	field is read by one comprehension over all items; rows are zipped from
+	the columns.
+	"""
+
+	items: tuple[str, ...]
+	columns: tuple[Column, ...]
+
+	@property
+	def headers(self) -> list[str]:
+		return ["profile", "region", *(column.header for column in self.columns)]
+
+	@property
+	def projection(self) -> dict[str, Any]:
+		tree: dict[str, Any] = {}
+		for column in self.columns:
+			node = tree
+			for name in self.items + column.path:
+				node = node.setdefault(name, {})
+		return tree
+
+	def items_of(self, response: Any) -> list[Any]:
+		if len(self.items) == 1:
+			return response.get(self.items[0]) or []
+		items = [response]
+		for name in self.items:
+			items = [child for item in items for child in item.get(name) or ()]
+		return items
+
+	def column_values(self, response: Any) -> list[list[Any]]:
+		"""Flatten one response into one list per column, in column order."""
+		items = self.items_of(response)
+		return [column.values(items) for column in self.columns]
+
+	def rows(
+		self,
+		results: Iterable[tuple[str, str, str, dict[str, Any]]],
+	) -> Iterator[list[Any]]:
+		for profile, region, _client_type, response in results:
+			for values in zip(*self.column_values(response)):
+				yield [profile, region, *values]
+
+
+GCI = RowSpec(
+	(),
+	(
+		Column("userID", ("UserId",)),
+		Column("account", ("Account",)),
+		Column("ARN", ("Arn",)),
+	),
+)
+GCI_HEADERS = GCI.headers
 
-	return headers, output
+
+def iter_gci(
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> Iterator[list[Any]]:
+	return GCI.rows(results)
+
+
+def parse_gci(
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> tuple[list[str], list[list[Any]]]:
+	return list(GCI_HEADERS), list(iter_gci(results))
+
+
+EC2LIST = RowSpec(
+	("Reservations", "Instances"),
+	(
+		Column("instance_id", ("InstanceId",)),
+		Column("status", ("State", "Name")),
+		Column("instance_type", ("InstanceType",)),
+	),
+)
+EC2LIST_HEADERS = EC2LIST.headers
+
+
+def iter_ec2list(
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> Iterator[list[Any]]:
+	return EC2LIST.rows(results)
 
 
 def parse_ec2list(
-	results: list[tuple[str, str, str, dict[str, Any]]],
-) -> tuple[list[str], list[list[str]]]:
-	headers = ["profile", "region", "instance_id", "status", "instance_type"]
-	output: list[list[str]] = []
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> tuple[list[str], list[list[Any]]]:
+	return list(EC2LIST_HEADERS), list(iter_ec2list(results))
 
-	for profile, region, _client_type, response in results:
-		for reservation in response.get("Reservations", []) or []:
-			for instance in reservation.get("Instances", []) or []:
-				output.append(
-					[
-						profile,
-						region,
-						str(instance.get("InstanceId", "")),
-						str(instance.get("State", {}).get("Name", "")),
-						str(instance.get("InstanceType", "")),
-					]
-				)
 
-	return headers, output
+EBSLIST = RowSpec(
+	("Volumes",),
+	(
+		Column("volume_id", ("VolumeId",)),
+		Column("state", ("State",)),
+		Column("size", ("Size",), _int_or_none),
+		Column("volume_type", ("VolumeType",)),
+		Column("iops", ("Iops",), _int_or_none),
+	),
+)
+EBSLIST_HEADERS = EBSLIST.headers
+
+
+def iter_ebslist(
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> Iterator[list[Any]]:
+	return EBSLIST.rows(results)
 
 
 def parse_ebslist(
-	results: list[tuple[str, str, str, dict[str, Any]]],
-) -> tuple[list[str], list[list[str]]]:
-	headers = ["profile", "region", "volume_id", "state", "size", "volume_type", "iops"]
-	output: list[list[str]] = []
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> tuple[list[str], list[list[Any]]]:
+	return list(EBSLIST_HEADERS), list(iter_ebslist(results))
 
-	for profile, region, _client_type, response in results:
-		for volume in response.get("Volumes", []) or []:
-			output.append(
-				[
-					profile,
-					region,
-					str(volume.get("VolumeId", "")),
-					str(volume.get("State", "")),
-					str(volume.get("Size", "")),
-					str(volume.get("VolumeType", "")),
-					str(volume.get("Iops", "")),
-				]
-			)
-
-	return headers, output
+
+RDS_CLUSTERS = RowSpec(("DBClusters",), (Column("name", ("DatabaseName",)),))
+RDS_INSTANCES = RowSpec(("DBInstances",), (Column("name", ("DBName",)),))
+RDSLIST_HEADERS = RDS_INSTANCES.headers
+
+
+def iter_rdslist(
+	instances: Iterable[tuple[str, str, str, dict[str, Any]]],
+	clusters: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> Iterator[list[Any]]:
+	yield from RDS_CLUSTERS.rows(clusters)
+	yield from RDS_INSTANCES.rows(instances)
 
 
 def parse_rdslist(
-	instances: list[tuple[str, str, str, dict[str, Any]]],
-	clusters: list[tuple[str, str, str, dict[str, Any]]],
-) -> tuple[list[str], list[list[str]]]:
-	headers = ["profile", "region", "name"]
-	output: list[list[str]] = []
-
-	for profile, region, _client_type, response in clusters:
-		for cluster in response.get("DBClusters", []) or []:
-			output.append(
-				[
-					profile,
-					region,
-					str(cluster.get("DatabaseName", "")),
-				]
-			)
-	for profile, region, _client_type, response in instances:
-		for instance in response.get("DBInstances", []) or []:
-			output.append(
-				[
-					profile,
-					region,
-					str(instance.get("DBName", "")),
-				]
-			)
-
-	return headers, output
+	instances: Iterable[tuple[str, str, str, dict[str, Any]]],
+	clusters: Iterable[tuple[str, str, str, dict[str, Any]]],
+) -> tuple[list[str], list[list[Any]]]:
+	return list(RDSLIST_HEADERS), list(iter_rdslist(instances, clusters))
 
 
-def parse_s3list(
-	results: list[tuple[str, str, str, dict[str, Any]]],
-) -> tuple[list[str], list[list[str]]]:
-	headers = ["profile", "region", "bucket_name"]
-	output: list[list[str]] = []
+def iter_rdslist_jobs(
+	results: Iterable[tuple[str, str, str, str, dict[str, Any]]],
+) -> Iterator[list[Any]]:
+	for job, profile, region, client_type, response in results:
+		result = [(profile, region, client_type, response)]
+		if job == "describe_db_clusters":
+			yield from iter_rdslist([], result)
+		else:
+			yield from iter_rdslist(result, [])
+
+
+S3_BUCKETS = RowSpec(
+	("Buckets",),
+	(
+		Column("bucket_name", ("Name",)),
+		Column("bucket_region", ("BucketRegion",), _raw),
+	),
+)
+S3LIST_HEADERS = ["profile", "region", "bucket_name"]
+
+
+def iter_s3list(
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+	locations: Mapping[str, str] | None = None,
+) -> Iterator[list[Any]]:
+	seen: set[tuple[str, str]] = set()
+	locations = locations or {}
 
 	for profile, region, _client_type, response in results:
-		for bucket in response.get("Buckets", []) or []:
-			output.append(
-				[
-					profile,
-					region,
-					str(bucket.get("Name", "")),
-				]
-			)
+		for bucket_name, bucket_region in zip(*S3_BUCKETS.column_values(response)):
+			if (profile, bucket_name) in seen:
+				continue
+			seen.add((profile, bucket_name))
+			yield [profile, str(locations.get(bucket_name) or bucket_region or region), bucket_name]
+
+
+def parse_s3list(
+	results: Iterable[tuple[str, str, str, dict[str, Any]]],
+	locations: Mapping[str, str] | None = None,
+) -> tuple[list[str], list[list[Any]]]:
+	return list(S3LIST_HEADERS), list(iter_s3list(results, locations))
+
+
+METRIC_DATA = RowSpec(
+	("MetricDataResults",),
+	(
+		Column("label", ("Label",)),
+		Column("timestamps", ("Timestamps",), _sequence),
+		Column("values", ("Values",), _sequence),
+	),
+)
+S3SIZES_HEADERS = ["profile", "region", "bucket_name", "storage_type", "size in MB"]
+
+
+def latest_value(timestamps: Any, values: Any) -> Any:
+	"""Return the value at the newest timestamp, or None, with a linear max instead of a sort."""
+	if not timestamps:
+		return None
+	# boto3 gives datetimes and the cache UTC ISO 8601 strings; max orders either.
+	index = timestamps.index(max(timestamps))
+	return values[index] if index < len(values) else None
+
+
+def iter_s3sizes(
+	results: Iterable[tuple[str, str, str, str, dict[str, Any]]],
+	buckets: Iterable[list[str]] = (),
+) -> Iterator[list[Any]]:
+	sized: set[tuple[str, str]] = set()
+
+	for profile, region, _client_type, _nickname, response in results:
+		for label, timestamps, values in zip(*METRIC_DATA.column_values(response)):
+			bucket_name, _, storage_type = label.partition(" ")
+			sized.add((profile, bucket_name))
+			size_bytes = latest_value(timestamps, values)
+			size_mb = None if size_bytes is None else size_bytes / (1024 ** 2)
+			yield [profile, region, bucket_name, storage_type, size_mb]
 
-	return headers, output
+	for profile, region, bucket_name in buckets:
+		if (profile, bucket_name) not in sized:
+			sized.add((profile, bucket_name))
+			yield [profile, region, bucket_name, "", None]
 
 
 def parse_s3sizes(
-	results: list[tuple[str, str, str, dict[str, Any]]],
-) -> tuple[list[str], list[list[str]]]:
-	
-  headers = ["profile", "region", "bucket_name", "size in MB"]
-  output: list[list[str]] = []
-	
-  for profile, region, _client_type, bucket_name, response in results:
-    if response['Datapoints']:
-      # Get the most recent data point
-      latest_datapoint = sorted(response['Datapoints'], key=lambda x: x['Timestamp'], reverse=True)[0]
-      size_bytes = int(latest_datapoint['Average'])
-      size_mb = size_bytes / (1024 ** 2)
-    else:
-      size_mb = None
-
-
-    output.append([
-      profile,
-      region,
-      bucket_name,
-      size_mb,
-    ])
-  return headers, output
\ No newline at end of file
+	results: Iterable[tuple[str, str, str, str, dict[str, Any]]],
+	buckets: Iterable[list[str]] = (),
+) -> tuple[list[str], list[list[Any]]]:
+	return list(S3SIZES_HEADERS), list(iter_s3sizes(results, buckets))
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from collections import deque
+import queue
+import threading
+from typing import Any
+
+# Returned by get() once every cell has finished.
+END = object()
+
+
+class PageQueue:
+  """Bounded channel from cell producers to one consumer, in arrival order."""
+
+  def __init__(self, cells: int, limit: int) -> None:
+    self._pending: queue.Queue[tuple[int, Any]] = queue.Queue(maxsize=limit)
+    self._open = cells
+    self._stopped = threading.Event()
+    self._finished = object()
+
+  def put(self, index: int, item: Any) -> bool:
+    """Block while the channel is full; return False once stopped."""
+    while not self._stopped.is_set():
+      try:
+        self._pending.put((index, item), timeout=0.1)
+        return True
+      except queue.Full:
+        continue
+    return False
+
+  def finish(self, index: int) -> None:
+    self.put(index, self._finished)
+
+  def get(self) -> Any:
+    while self._open:
+      _index, item = self._pending.get()
+      if item is self._finished:
+        self._open -= 1
+      else:
+        return item
+    return END
+
+  def stop(self) -> None:
+    self._stopped.set()
+
+
+class ReorderBuffer:
+  """Channel that hands items over in cell order, holding at most `limit`.
+
+  The head cell's items pass straight through. Items from later cells are
+  buffered until the head finishes; when the buffer is full their
+  producers block, but the head cell can always hand over one more item,
+  so the consumer never waits on a full buffer.
+  """
+
+  def __init__(self, cells: int, limit: int) -> None:
+    self._cells = cells
+    self._limit = limit
+    self._head = 0
+    self._buffered = 0
+    self._items: dict[int, deque[Any]] = {}
+    self._finished: set[int] = set()
+    self._stopped = False
+    self._condition = threading.Condition()
+
+  def put(self, index: int, item: Any) -> bool:
+    with self._condition:
+      while not self._stopped and self._buffered >= self._limit and not self._head_is_empty(index):
+        self._condition.wait()
+      if self._stopped:
+        return False
+      self._items.setdefault(index, deque()).append(item)
+      self._buffered += 1
+      self._condition.notify_all()
+      return True
+
+  def _head_is_empty(self, index: int) -> bool:
+    return index == self._head and not self._items.get(index)
+
+  def finish(self, index: int) -> None:
+    with self._condition:
+      self._finished.add(index)
+      self._condition.notify_all()
+
+  def get(self) -> Any:
+    with self._condition:
+      while True:
+        items = self._items.get(self._head)
+        if items:
+          self._buffered -= 1
+          self._condition.notify_all()
+          return items.popleft()
+        if self._head in self._finished:
+          self._items.pop(self._head, None)
+          self._head += 1
+          self._condition.notify_all()
+          continue
+        if self._head >= self._cells:
+          return END
+        self._condition.wait()
+
+  def stop(self) -> None:
+    with self._condition:
+      self._stopped = True
+      self._condition.notify_all()
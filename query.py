@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+from pathlib import Path
+import re
+import sqlite3
+import threading
+from typing import Any, Iterable, Iterator
+
+from cache import CacheStore
+from diff import DIFF_SPECS, DiffSpec, cached_rows
+from output_parsing import COLUMN_TYPES
+
+QUERY_FILE = "query.sqlite3"
+AGGREGATES = ("count", "sum", "avg", "min", "max")
+
+_SQL_TYPES = {"int": "INTEGER", "float": "REAL"}
+_CONDITION = re.compile(r"^\s*(?P<column>[^!<>=~]+?)\s*(?P<op>!=|<=|>=|=|<|>|~)\s*(?P<value>.*?)\s*$")
+_AGGREGATE = re.compile(r"^\s*(?P<function>\w+)\s*(?:\(\s*(?P<column>[^)]*?)\s*\))?\s*$")
+_OPERATORS = {"=": "=", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "~": "LIKE"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS loaded (
+  command TEXT NOT NULL,
+  run_key TEXT NOT NULL,
+  signature TEXT NOT NULL,
+  PRIMARY KEY (command, run_key)
+) WITHOUT ROWID;
+"""
+
+
+def _quote(name: str) -> str:
+  return '"' + name.replace('"', '""') + '"'
+
+
+@dataclass(frozen=True)
+class Condition:
+  column: str
+  operator: str
+  value: Any
+
+
+@dataclass(frozen=True)
+class Aggregate:
+  function: str
+  column: str | None = None
+
+  @property
+  def label(self) -> str:
+    return f"{self.function}({self.column or '*'})"
+
+
+def parse_condition(expression: str, headers: list[str]) -> Condition:
+  """Parse COLUMN OP VALUE, where OP is =, !=, <, <=, >, >= or ~ (SQL LIKE, % and _ wildcards)."""
+  match = _CONDITION.match(expression)
+  if match is None:
+    raise ValueError(f"expected COLUMN OP VALUE, got {expression!r}")
+  column = _column(match["column"], headers)
+  value: Any = match["value"]
+  if COLUMN_TYPES.get(column) in _SQL_TYPES and match["op"] != "~":
+    try:
+      value = float(value)
+    except ValueError:
+      raise ValueError(f"{column} is numeric, got {value!r}") from None
+  return Condition(column, _OPERATORS[match["op"]], value)
+
+
+def parse_aggregate(expression: str, headers: list[str]) -> Aggregate:
+  """Parse FUNCTION(COLUMN) or count / count(*), for the functions in AGGREGATES."""
+  match = _AGGREGATE.match(expression)
+  function = match["function"].lower() if match else ""
+  if function not in AGGREGATES:
+    raise ValueError(f"expected one of {', '.join(AGGREGATES)} as FUNCTION(COLUMN), got {expression!r}")
+  column = match["column"]
+  if column in (None, "", "*"):
+    if function != "count":
+      raise ValueError(f"{function} needs a column")
+    return Aggregate(function)
+  return Aggregate(function, _column(column, headers))
+
+
+def split_columns(columns: str) -> list[str]:
+  return [column.strip() for column in columns.split(",") if column.strip()]
+
+
+def parse_columns(columns: str, headers: list[str]) -> list[str]:
+  """Parse a comma-separated list of column names."""
+  return [_column(column, headers) for column in split_columns(columns)]
+
+
+def _column(name: str, headers: list[str]) -> str:
+  name = name.strip()
+  if name not in headers:
+    raise ValueError(f"unknown column {name!r}; columns are {', '.join(headers)}")
+  return name
+
+
+class InventoryIndex:
+  """Cached runs' parsed rows in an indexed SQLite table per command.
+
+  Kept as query.sqlite3 next to the cache store. A run is parsed into its
+  command's table the first time it is queried and again only when the
+  digests of its cached cells change, so repeated queries read only this
+  file. Columns used to filter or group get an index on first use.
+  """
+
+  def __init__(self, directory: str) -> None:
+    cache_dir = Path(directory)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    self.path = cache_dir / QUERY_FILE
+    self._lock = threading.Lock()
+    self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+    self._connection.execute("PRAGMA journal_mode=WAL")
+    self._connection.executescript(_SCHEMA)
+
+  def _table(self, command: str, spec: DiffSpec) -> str:
+    table = _quote(f"inventory_{command}")
+    columns = ", ".join(
+      f"{_quote(header)} {_SQL_TYPES.get(COLUMN_TYPES.get(header, ''), 'TEXT')}"
+      for header in spec.headers
+    )
+    self._connection.execute(f"CREATE TABLE IF NOT EXISTS {table} (run_key TEXT NOT NULL, {columns})")
+    self._connection.execute(
+      f"CREATE INDEX IF NOT EXISTS {_quote(f'inventory_{command}_by_run')} ON {table} (run_key)"
+    )
+    return table
+
+  def load(self, store: CacheStore, run_key: str, command: str) -> bool:
+    """Parse a cached run into the command's table; return False when it was already up to date."""
+    spec = DIFF_SPECS[command]
+    digests: list[tuple[Any, str]] = []
+    for service, operation in spec.operations:
+      digests.extend(store.digests(run_key, service, operation).items())
+    signature = hashlib.sha256(
+      "\n".join(sorted(f"{key.cell_id} {digest}" for key, digest in digests)).encode("utf-8")
+    ).hexdigest()
+    # Entries cached before digests were kept cannot be compared, so they are always reloaded.
+    current = all(digest for _key, digest in digests)
+
+    with self._lock:
+      table = self._table(command, spec)
+      row = self._connection.execute(
+        "SELECT signature FROM loaded WHERE command = ? AND run_key = ?",
+        (command, run_key),
+      ).fetchone()
+      if current and row is not None and row[0] == signature:
+        return False
+
+      keys = [key for key, _digest in digests]
+      placeholders = ", ".join("?" for _ in range(len(spec.headers) + 1))
+      with self._connection:
+        self._connection.execute("BEGIN")
+        self._connection.execute(f"DELETE FROM {table} WHERE run_key = ?", (run_key,))
+        self._connection.executemany(
+          f"INSERT INTO {table} VALUES ({placeholders})",
+          ([run_key, *row] for row in cached_rows(store, spec, keys)),
+        )
+        self._connection.execute(
+          "INSERT OR REPLACE INTO loaded (command, run_key, signature) VALUES (?, ?, ?)",
+          (command, run_key, signature),
+        )
+    return True
+
+  def _index(self, command: str, table: str, column: str) -> None:
+    suffix = re.sub(r"\W", "_", column)
+    name = _quote(f"inventory_{command}_by_{suffix}")
+    self._connection.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} (run_key, {_quote(column)})")
+
+  def query(
+    self,
+    run_key: str,
+    command: str,
+    *,
+    where: Iterable[Condition] = (),
+    group_by: Iterable[str] = (),
+    aggregates: Iterable[Aggregate] = (),
+    order_by: Iterable[str] = (),
+    limit: int | None = None,
+  ) -> tuple[list[str], Iterator[list[Any]]]:
+    """Return (headers, rows) for a loaded run.
+
+    Without group_by or aggregates every column of each matching row is
+    returned; otherwise one row per group with the group columns and the
+    aggregates. order_by names output columns, with a leading - for
+    descending order.
+    """
+    spec = DIFF_SPECS[command]
+    where = list(where)
+    group_by = list(group_by)
+    aggregates = list(aggregates)
+    with self._lock:
+      table = self._table(command, spec)
+      for column in dict.fromkeys([condition.column for condition in where] + group_by):
+        self._index(command, table, column)
+
+    if group_by or aggregates:
+      headers = group_by + [aggregate.label for aggregate in aggregates]
+      selected = [_quote(column) for column in group_by] + [
+        f"{aggregate.function}({_quote(aggregate.column) if aggregate.column else '*'})"
+        for aggregate in aggregates
+      ]
+    else:
+      headers = list(spec.headers)
+      selected = [_quote(header) for header in headers]
+
+    sql = f"SELECT {', '.join(selected)} FROM {table} WHERE run_key = ?"
+    arguments: list[Any] = [run_key]
+    for condition in where:
+      sql += f" AND {_quote(condition.column)} {condition.operator} ?"
+      arguments.append(condition.value)
+    if group_by:
+      sql += " GROUP BY " + ", ".join(_quote(column) for column in group_by)
+    terms = []
+    for term in order_by:
+      descending = term.startswith("-")
+      column = term[1:] if descending else term
+      if column not in headers:
+        raise ValueError(f"cannot order by {column!r}; output columns are {', '.join(headers)}")
+      terms.append(f"{headers.index(column) + 1}{' DESC' if descending else ''}")
+    if terms:
+      sql += " ORDER BY " + ", ".join(terms)
+    if limit is not None:
+      sql += " LIMIT ?"
+      arguments.append(limit)
+
+    with self._lock:
+      rows = self._connection.execute(sql, arguments).fetchall()
+    return headers, (list(row) for row in rows)
+
+  def close(self) -> None:
+    with self._lock:
+      self._connection.close()
+
+
+def aggregate_column_types(aggregates: Iterable[Aggregate]) -> dict[str, str]:
+  """Typed-output column types for aggregate labels (see output.write_output)."""
+  column_types: dict[str, str] = {}
+  for aggregate in aggregates:
+    if aggregate.function == "count":
+      column_types[aggregate.label] = "int"
+    elif COLUMN_TYPES.get(aggregate.column or "") in _SQL_TYPES:
+      column_types[aggregate.label] = "float" if aggregate.function == "avg" else COLUMN_TYPES[aggregate.column]
+  return column_types
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from typing import Any, Iterable, Mapping
+
+from function import CellFailure, stream_function
+from scheduler import Scheduler
+
+# Defaults for the `discovery` section of config.yaml, in seconds.
+REGIONS_TTL = 86400.0
+EMPTY_RECHECK = 86400.0
+
+_REGIONS_PROJECTION = {"Regions": {"RegionName": {}}}
+
+
+def discovery_settings(config_data: Mapping[str, Any] | None) -> tuple[float, float]:
+  """Return (regions_ttl, empty_recheck) from the `discovery` section of config.yaml.
+
+  regions_ttl is how long an account's enabled regions are reused;
+  empty_recheck how long a cell that came back empty is skipped.
+  """
+  section = (config_data or {}).get("discovery") or {}
+  return (
+    float(section.get("regions_ttl", REGIONS_TTL)),
+    float(section.get("empty_recheck", EMPTY_RECHECK)),
+  )
+
+
+def discover_regions(
+  profiles: Iterable[str],
+  home_region: str,
+  *,
+  directory: str = "./cache/",
+  scheduler: Scheduler | None = None,
+  regions_ttl: float = REGIONS_TTL,
+  engine: str = "threads",
+  failures: list[CellFailure] | None = None,
+) -> dict[str, list[str]]:
+  """Map each profile to the regions enabled for its account.
+
+  One ec2.describe_regions per profile, called from home_region; the
+  calls run in parallel on the scheduler, and each answer is kept in the
+  directory's cache store and reused for regions_ttl seconds by any run.
+  describe_regions leaves out opt-in regions the account has not enabled.
+  With failures, a profile whose call fails is recorded there and left
+  out of the result instead of raising.
+  """
+  from clients import create_clients
+
+  profiles = list(dict.fromkeys(profiles))
+  _sessions, clients = create_clients(profiles, [home_region], ["ec2"])
+  discovered: dict[str, list[str]] = {profile_name: [] for profile_name in profiles}
+  for profile_name, _region, _client_type, page in stream_function(
+    clients,
+    "describe_regions",
+    directory=directory,
+    paginate=False,
+    scheduler=scheduler,
+    ttl={"ec2": regions_ttl},
+    engine=engine,
+    projection=_REGIONS_PROJECTION,
+    failures=failures,
+  ):
+    discovered[profile_name].extend(region["RegionName"] for region in page.get("Regions", []) or [])
+  failed = {failure.profile for failure in failures or ()}
+  return {
+    profile_name: sorted(regions)
+    for profile_name, regions in discovered.items()
+    if profile_name not in failed
+  }
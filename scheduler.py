@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, fields, replace
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Iterator, Mapping
+
+if TYPE_CHECKING:
+  from async_engine import AsyncClients
+  from stats import Recorder
+
+THROTTLE_ERROR_CODES = frozenset(
+  {
+    "BandwidthLimitExceeded",
+    "EC2ThrottledException",
+    "PriorRequestNotComplete",
+    "ProvisionedThroughputExceededException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "SlowDown",
+    "Throttled",
+    "Throttling",
+    "ThrottlingException",
+    "TooManyRequestsException",
+  }
+)
+
+
+def is_throttle_error(error: BaseException) -> bool:
+  response = getattr(error, "response", None)
+  if not isinstance(response, Mapping):
+    return False
+  return response.get("Error", {}).get("Code") in THROTTLE_ERROR_CODES
+
+
+def botocore_retries(response: Any) -> int:
+  """Retries botocore made inside one request, per ResponseMetadata.RetryAttempts."""
+  try:
+    return int(response["ResponseMetadata"]["RetryAttempts"])
+  except (KeyError, TypeError, ValueError):
+    return 0
+
+
+@dataclass(frozen=True)
+class SchedulerSettings:
+  max_workers: int = 32
+  min_workers: int = 2
+  rate: float = 10.0
+  burst: int = 20
+  max_attempts: int = 8
+  base_delay: float = 0.5
+  max_delay: float = 20.0
+  async_concurrency: int = 512
+
+  @classmethod
+  def from_config(
+    cls,
+    config_data: Mapping[str, Any] | None,
+    **overrides: Any,
+  ) -> SchedulerSettings:
+    """Read the `scheduler` section of config.yaml; non-None overrides win."""
+    section = dict((config_data or {}).get("scheduler") or {})
+    names = {field.name for field in fields(cls)}
+    settings = cls(**{name: value for name, value in section.items() if name in names})
+    return replace(settings, **{name: value for name, value in overrides.items() if value is not None})
+
+
+class TokenBucket:
+  """Blocking token bucket; a rate of zero or less disables the limit."""
+
+  def __init__(self, rate: float, burst: int) -> None:
+    self.rate = rate
+    self.capacity = max(1, burst)
+    self._tokens = float(self.capacity)
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def acquire(self) -> None:
+    if self.rate <= 0:
+      return
+    while True:
+      with self._lock:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+          self._tokens -= 1
+          return
+        wait = (1 - self._tokens) / self.rate
+      time.sleep(wait)
+
+
+class Scheduler:
+  """Thread pool with per-cell rate limits and throttle-driven concurrency.
+
+  Every API request goes through call() or iterate(), which take a token
+  from the bucket for its (account, region, service) cell and hold one of
+  `limit` concurrency slots while the request is in flight. The limit
+  halves on each throttling error and grows by one after `limit`
+  consecutive successes (AIMD), bounded by min_workers and max_workers.
+  Throttled requests are retried with full-jitter exponential backoff.
+  """
+
+  def __init__(self, settings: SchedulerSettings | None = None) -> None:
+    self.settings = settings or SchedulerSettings()
+    self.limit = self.settings.max_workers
+    self.throttles = 0
+    self._in_flight = 0
+    self._successes = 0
+    self._slots = threading.Condition()
+    self._buckets: dict[Hashable, TokenBucket] = {}
+    self._buckets_lock = threading.Lock()
+    self._executor = ThreadPoolExecutor(max_workers=self.settings.max_workers)
+    # Set to a stats.Recorder to record every request made through call() and iterate().
+    self.recorder: Recorder | None = None
+    # Set to an async_engine.AsyncClients so every async engine call in a run
+    # shares its event loop and connection pools; whoever sets it closes it.
+    self.async_clients: AsyncClients | None = None
+
+  def __enter__(self) -> Scheduler:
+    return self
+
+  def __exit__(self, *exc_info: Any) -> None:
+    self.shutdown()
+
+  def shutdown(self, wait: bool = True) -> None:
+    self._executor.shutdown(wait=wait, cancel_futures=True)
+
+  def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Future[Any]:
+    return self._executor.submit(fn, *args, **kwargs)
+
+  def bucket(self, cell: Hashable) -> TokenBucket:
+    with self._buckets_lock:
+      bucket = self._buckets.get(cell)
+      if bucket is None:
+        bucket = TokenBucket(self.settings.rate, self.settings.burst)
+        self._buckets[cell] = bucket
+      return bucket
+
+  def backoff(self, attempt: int) -> float:
+    ceiling = min(self.settings.max_delay, self.settings.base_delay * (2 ** attempt))
+    return random.uniform(0, ceiling)
+
+  def _acquire_slot(self) -> None:
+    with self._slots:
+      while self._in_flight >= self.limit:
+        self._slots.wait()
+      self._in_flight += 1
+
+  def _release_slot(self, throttled: bool) -> None:
+    with self._slots:
+      self._in_flight -= 1
+      if throttled:
+        self.throttles += 1
+        self._successes = 0
+        self.limit = max(self.settings.min_workers, self.limit // 2)
+      else:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.settings.max_workers:
+          self.limit += 1
+          self._successes = 0
+      self._slots.notify_all()
+
+  def _attempt(self, cell: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    self.bucket(cell).acquire()
+    self._acquire_slot()
+    throttled = False
+    try:
+      return fn(*args, **kwargs)
+    except Exception as error:
+      throttled = is_throttle_error(error)
+      raise
+    finally:
+      self._release_slot(throttled)
+
+  def call(self, cell: Hashable, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    started = time.perf_counter()
+    attempt = 0
+    retried = 0
+    while True:
+      try:
+        response = self._attempt(cell, fn, *args, **kwargs)
+      except Exception as error:
+        attempt += 1
+        retried += botocore_retries(getattr(error, "response", None))
+        if not is_throttle_error(error) or attempt >= self.settings.max_attempts:
+          if self.recorder is not None:
+            self.recorder.record(cell, operation_name(fn), started, attempts=attempt + retried, error=error)
+          raise
+        time.sleep(self.backoff(attempt))
+        continue
+      if self.recorder is not None:
+        self.recorder.record(
+          cell,
+          operation_name(fn),
+          started,
+          attempts=attempt + 1 + retried + botocore_retries(response),
+          response=response,
+        )
+      return response
+
+  def iterate(
+    self,
+    cell: Hashable,
+    factory: Callable[[], Iterator[Any]],
+    *,
+    operation: str = "",
+  ) -> Iterator[Any]:
+    """Yield from factory(), fetching each item as one scheduled request.
+
+    A generator that raised cannot be resumed, so after a throttled page
+    the iterator is rebuilt and the pages already delivered are skipped.
+    operation names the pages' requests for the recorder.
+    """
+    iterator = factory()
+    delivered = 0
+    skip = 0
+    attempt = 0
+    retried = 0
+    started = time.perf_counter()
+    while True:
+      try:
+        item = self._attempt(cell, next, iterator, _EXHAUSTED)
+      except Exception as error:
+        attempt += 1
+        retried += botocore_retries(getattr(error, "response", None))
+        if not is_throttle_error(error) or attempt >= self.settings.max_attempts:
+          if self.recorder is not None:
+            self.recorder.record(cell, operation, started, attempts=attempt + retried, error=error)
+          raise
+        time.sleep(self.backoff(attempt))
+        iterator = factory()
+        skip = delivered
+        continue
+      if item is _EXHAUSTED:
+        return
+      if skip:
+        skip -= 1
+        continue
+      if self.recorder is not None:
+        self.recorder.record(
+          cell,
+          operation,
+          started,
+          attempts=attempt + 1 + retried + botocore_retries(item),
+          response=item,
+        )
+      attempt = 0
+      retried = 0
+      delivered += 1
+      yield item
+      started = time.perf_counter()
+
+
+_EXHAUSTED = object()
+
+
+def operation_name(fn: Callable[..., Any]) -> str:
+  # botocore names each client method after its operation.
+  return getattr(fn, "__name__", "") or type(fn).__name__
+
+
+_default_scheduler: Scheduler | None = None
+_default_lock = threading.Lock()
+
+
+def default_scheduler() -> Scheduler:
+  """Return the long-lived scheduler shared by callers that do not pass one."""
+  global _default_scheduler
+  with _default_lock:
+    if _default_scheduler is None:
+      _default_scheduler = Scheduler()
+    return _default_scheduler
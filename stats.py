@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+import math
+import threading
+import time
+from typing import Any, Hashable, Iterable, Iterator
+
+NETWORK = "network"
+CACHE = "cache"
+SLOWEST_CELLS = 10
+
+
+@dataclass(frozen=True)
+class CallRecord:
+  """One API request, including its retries, or one read from the cache.
+
+  started is a time.perf_counter() value; duration includes time spent
+  waiting for a rate-limit token or concurrency slot and throttle
+  backoff. pages is the number of responses a cache read served.
+  """
+
+  profile: str
+  region: str
+  service: str
+  operation: str
+  source: str
+  started: float
+  duration: float
+  attempts: int = 1
+  bytes: int = 0
+  pages: int = 1
+  error: str = ""
+  thread: int = 0
+
+
+def response_bytes(response: Any) -> int:
+  try:
+    return int(response["ResponseMetadata"]["HTTPHeaders"]["content-length"])
+  except (KeyError, TypeError, ValueError):
+    return 0
+
+
+def _cell_names(cell: Hashable) -> tuple[str, str, str]:
+  if isinstance(cell, tuple) and len(cell) == 3:
+    return tuple(str(part) for part in cell)
+  return str(cell), "", ""
+
+
+class Recorder:
+  """Collects CallRecords for one run.
+
+  Each thread appends to its own list, so recording a call takes no lock;
+  the lock is only taken when a thread records for the first time and
+  when records() gathers the lists.
+  """
+
+  def __init__(self) -> None:
+    self.origin = time.perf_counter()
+    self._local = threading.local()
+    self._lists: list[list[CallRecord]] = []
+    self._lists_lock = threading.Lock()
+
+  def _thread_records(self) -> list[CallRecord]:
+    records = getattr(self._local, "records", None)
+    if records is None:
+      records = self._local.records = []
+      with self._lists_lock:
+        self._lists.append(records)
+    return records
+
+  def record(
+    self,
+    cell: Hashable,
+    operation: str,
+    started: float,
+    *,
+    source: str = NETWORK,
+    attempts: int = 1,
+    response: Any = None,
+    pages: int = 1,
+    error: BaseException | None = None,
+  ) -> None:
+    profile, region, service = _cell_names(cell)
+    self._thread_records().append(
+      CallRecord(
+        profile,
+        region,
+        service,
+        operation,
+        source,
+        started,
+        time.perf_counter() - started,
+        attempts,
+        response_bytes(response),
+        pages,
+        type(error).__name__ if error is not None else "",
+        threading.get_ident(),
+      )
+    )
+
+  def cached(self, cell: Hashable, operation: str, pages: Iterable[Any]) -> Iterator[Any]:
+    """Yield cached pages, recording one cache read for the time spent reading them."""
+    started = time.perf_counter()
+    reading = 0.0
+    count = 0
+    iterator = iter(pages)
+    while True:
+      before = time.perf_counter()
+      page = next(iterator, _END)
+      reading += time.perf_counter() - before
+      if page is _END:
+        break
+      count += 1
+      yield page
+    profile, region, service = _cell_names(cell)
+    self._thread_records().append(
+      CallRecord(
+        profile,
+        region,
+        service,
+        operation,
+        CACHE,
+        started,
+        reading,
+        attempts=0,
+        pages=count,
+        thread=threading.get_ident(),
+      )
+    )
+
+  def records(self) -> list[CallRecord]:
+    with self._lists_lock:
+      return [record for records in self._lists for record in records]
+
+
+_END = object()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+  """Nearest-rank percentile of already sorted values."""
+  if not values:
+    return 0.0
+  rank = max(1, math.ceil(fraction * len(values)))
+  return values[min(rank, len(values)) - 1]
+
+
+def summarize(records: Iterable[CallRecord]) -> str:
+  """Render the run report: totals, per-operation latency and the slowest cells."""
+  records = list(records)
+  network = [record for record in records if record.source == NETWORK]
+  cached_pages = sum(record.pages for record in records if record.source == CACHE)
+  served = cached_pages + len(network)
+  retries = sum(max(0, record.attempts - 1) for record in network)
+  lines = [
+    f"requests: {len(network)}  retries: {retries}  errors: {sum(1 for record in network if record.error)}"
+    f"  bytes: {sum(record.bytes for record in network)}",
+    f"cache: {cached_pages} of {served} responses"
+    f" ({cached_pages / served if served else 0.0:.0%} hit ratio)",
+    "",
+    f"{'operation':<32} {'calls':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'retries':>8}",
+  ]
+
+  by_operation: dict[tuple[str, str], list[CallRecord]] = {}
+  for record in network:
+    by_operation.setdefault((record.service, record.operation), []).append(record)
+  for (service, operation), calls in sorted(by_operation.items()):
+    durations = sorted(record.duration * 1000 for record in calls)
+    lines.append(
+      f"{service + '.' + operation:<32} {len(calls):>7}"
+      f" {percentile(durations, 0.50):>9.1f} {percentile(durations, 0.95):>9.1f}"
+      f" {percentile(durations, 0.99):>9.1f} {durations[-1]:>9.1f}"
+      f" {sum(max(0, record.attempts - 1) for record in calls):>8}"
+    )
+
+  by_cell: dict[tuple[str, str, str], list[CallRecord]] = {}
+  for record in records:
+    by_cell.setdefault((record.profile, record.region, record.service), []).append(record)
+  slowest = sorted(by_cell.items(), key=lambda item: sum(record.duration for record in item[1]), reverse=True)
+  lines += ["", f"{'slowest cells':<56} {'total ms':>9} {'calls':>7} {'retries':>8} {'cached':>7}"]
+  for (profile, region, service), calls in slowest[:SLOWEST_CELLS]:
+    lines.append(
+      f"{f'{profile} {region} {service}':<56}"
+      f" {sum(record.duration for record in calls) * 1000:>9.1f}"
+      f" {sum(1 for record in calls if record.source == NETWORK):>7}"
+      f" {sum(max(0, record.attempts - 1) for record in calls):>8}"
+      f" {sum(record.pages for record in calls if record.source == CACHE):>7}"
+    )
+  return "\n".join(lines) + "\n"
+
+
+def chrome_trace(records: Iterable[CallRecord], origin: float) -> dict[str, Any]:
+  """Build a Chrome trace (chrome://tracing, Perfetto) with one event per record."""
+  threads: dict[int, int] = {}
+  events = []
+  for record in sorted(records, key=lambda record: record.started):
+    events.append(
+      {
+        "name": f"{record.service}.{record.operation}",
+        "cat": record.source,
+        "ph": "X",
+        "ts": round((record.started - origin) * 1_000_000),
+        "dur": round(record.duration * 1_000_000),
+        "pid": 1,
+        "tid": threads.setdefault(record.thread, len(threads) + 1),
+        "args": {
+          "profile": record.profile,
+          "region": record.region,
+          "attempts": record.attempts,
+          "bytes": record.bytes,
+          "pages": record.pages,
+          "error": record.error,
+        },
+      }
+    )
+  return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_trace(path: str, recorder: Recorder) -> None:
+  with open(path, "w", encoding="utf-8") as handle:
+    json.dump(chrome_trace(recorder.records(), recorder.origin), handle)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator
+
+import pytest
+
+from async_engine import AsyncScheduler
+from function import Job, stream_jobs
+from scheduler import SchedulerSettings
+
+
+class FakeClientError(Exception):
+	def __init__(self, code: str) -> None:
+		super().__init__(code)
+		self.response = {"Error": {"Code": code}}
+
+
+def fast_settings(**overrides: Any) -> SchedulerSettings:
+	return SchedulerSettings(rate=0, base_delay=0, max_delay=0, **overrides)
+
+
+def test_async_call_retries_throttling_and_shrinks_limit() -> None:
+	attempts = []
+
+	async def flaky() -> str:
+		attempts.append(1)
+		if len(attempts) < 3:
+			raise FakeClientError("Throttling")
+		return "ok"
+
+	async def run() -> tuple[str, AsyncScheduler]:
+		scheduler = AsyncScheduler(fast_settings(async_concurrency=64, min_workers=4))
+		return await scheduler.call(("p", "r", "s3"), flaky), scheduler
+
+	result, scheduler = asyncio.run(run())
+
+	assert result == "ok"
+	assert scheduler.throttles == 2
+	assert scheduler.limit == 16
+
+
+def test_async_iterate_resumes_after_throttled_page() -> None:
+	builds = []
+
+	async def pages() -> AsyncIterator[int]:
+		builds.append(1)
+		yield 1
+		if len(builds) == 1:
+			raise FakeClientError("Throttling")
+		yield 2
+
+	async def run() -> list[int]:
+		scheduler = AsyncScheduler(fast_settings())
+		return [page async for page in scheduler.iterate(("p", "r", "ec2"), pages)]
+
+	assert asyncio.run(run()) == [1, 2]
+	assert len(builds) == 2
+
+
+@pytest.fixture
+def moto_endpoint(monkeypatch, tmp_path):
+	pytest.importorskip("aiobotocore")
+	moto_server = pytest.importorskip("moto.server")
+	# The async engine opens sessions by profile name, so [default] must exist.
+	config_file = tmp_path / "aws_config"
+	config_file.write_text("[default]\nregion = us-east-1\n", encoding="utf-8")
+	credentials_file = tmp_path / "aws_credentials"
+	credentials_file.write_text(
+		"[default]\naws_access_key_id = testing\naws_secret_access_key = testing\n",
+		encoding="utf-8",
+	)
+	monkeypatch.setenv("AWS_CONFIG_FILE", str(config_file))
+	monkeypatch.setenv("AWS_SHARED_CREDENTIALS_FILE", str(credentials_file))
+	monkeypatch.delenv("AWS_PROFILE", raising=False)
+	monkeypatch.setenv("AWS_ACCESS_KEY_ID", "testing")
+	monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "testing")
+	server = moto_server.ThreadedMotoServer(port=0)
+	server.start()
+	host, port = server.get_host_and_port()
+	yield f"http://{host}:{port}"
+	server.stop()
+
+
+def test_async_engine_matches_thread_engine(moto_endpoint, tmp_path) -> None:
+	import boto3
+
+	import async_engine
+
+	s3 = boto3.client("s3", region_name="us-east-1", endpoint_url=moto_endpoint)
+	for name in ("alpha", "beta"):
+		s3.create_bucket(Bucket=name)
+	jobs = [Job("list_buckets")]
+	clients = {"default": {"us-east-1": {"s3": s3}, "us-east-2": {"s3": s3}}}
+
+	threaded = list(stream_jobs(clients, jobs, directory=str(tmp_path), ordered=True))
+	pooled = list(
+		async_engine.stream_jobs(
+			clients,
+			jobs,
+			directory=str(tmp_path),
+			ordered=True,
+			endpoint_url=moto_endpoint,
+		)
+	)
+
+	def summary(results: list[tuple[str, str, str, str, Any]]) -> list[tuple[Any, ...]]:
+		return [
+			(label, profile, region, client_type, [bucket["Name"] for bucket in page["Buckets"]])
+			for label, profile, region, client_type, page in results
+		]
+
+	assert summary(pooled) == summary(threaded)
+	assert [row[2] for row in summary(pooled)] == ["us-east-1", "us-east-2"]
+
+
+def test_async_entry_points_share_the_schedulers_clients(moto_endpoint, tmp_path) -> None:
+	import async_engine
+	from scheduler import Scheduler
+
+	clients = {"default": {"us-east-1": {"s3": None}}}
+	shared = async_engine.AsyncClients(8, moto_endpoint)
+	with Scheduler() as scheduler:
+		scheduler.async_clients = shared
+		try:
+			loop = shared.event_loop()
+			listed = list(async_engine.stream_jobs(clients, [Job("list_buckets")], scheduler=scheduler))
+			client = asyncio.run_coroutine_threadsafe(shared.client("default", "us-east-1", "s3"), loop).result()
+			called = async_engine.invoke_function_special_parameters(
+				clients,
+				"list_buckets",
+				{"default": {"us-east-1": {"all": {}}}},
+				scheduler=scheduler,
+			)
+
+			assert shared.event_loop() is loop
+			assert asyncio.run_coroutine_threadsafe(shared.client("default", "us-east-1", "s3"), loop).result() is client
+		finally:
+			shared.close()
+
+	assert listed[0][4]["Buckets"] == called[0][4]["Buckets"]
+	assert loop.is_closed()
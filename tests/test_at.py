@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_version_skips_heavy_imports() -> None:
+	code = (
+		"import sys, at; at.main(['-v']); "
+		"print(sorted(name for name in ('boto3', 'yaml', 'sqlite3', 'openpyxl') if name in sys.modules))"
+	)
+
+	result = subprocess.run(
+		[sys.executable, "-c", code],
+		cwd=ROOT,
+		capture_output=True,
+		text=True,
+		check=True,
+	)
+
+	assert result.stdout.splitlines() == ["at 0.2.0", "[]"]
+
+
+def test_shell_runs_each_line_with_shell_options(tmp_path) -> None:
+	config_path = tmp_path / "config.yaml"
+	config_path.write_text("profiles: [a, b]\nregions: [us-east-1]\n", encoding="utf-8")
+
+	result = subprocess.run(
+		[sys.executable, str(ROOT / "at.py"), "-c", str(config_path), "shell"],
+		input="debug\n-p c debug\nnot-a-command\n-v\nexit\ndebug\n",
+		cwd=tmp_path,
+		capture_output=True,
+		text=True,
+		check=True,
+	)
+
+	assert result.stdout.splitlines() == [
+		f"config file: {config_path}",
+		"profiles: ['a', 'b']",
+		"regions: ['us-east-1']",
+		f"config file: {config_path}",
+		"profiles: ['c']",
+		"regions: ['us-east-1']",
+		"at 0.2.0",
+	]
+	assert "invalid choice: 'not-a-command'" in result.stderr
+
+
+def test_query_and_diff_report_unknown_runs(tmp_path) -> None:
+	config_path = tmp_path / "config.yaml"
+	config_path.write_text("profiles: [a]\n", encoding="utf-8")
+	cache_dir = tmp_path / "new-cache"
+
+	for command in (["query", "missing", "ebslist"], ["diff", "missing", "other", "ec2list"]):
+		result = subprocess.run(
+			[sys.executable, str(ROOT / "at.py"), "-c", str(config_path), "-d", str(cache_dir), *command],
+			cwd=tmp_path,
+			capture_output=True,
+			text=True,
+		)
+
+		assert result.returncode == 1
+		assert "no such run: missing" in result.stderr
+
+
+def test_shell_holds_one_async_clients_for_the_session(tmp_path, monkeypatch) -> None:
+	pytest.importorskip("aiobotocore")
+	import async_engine
+	import at
+
+	config_path = tmp_path / "config.yaml"
+	config_path.write_text("profiles: [missing]\nregions: [us-east-1]\n", encoding="utf-8")
+	empty = tmp_path / "empty"
+	empty.write_text("", encoding="utf-8")
+	monkeypatch.setenv("AWS_CONFIG_FILE", str(empty))
+	monkeypatch.setenv("AWS_SHARED_CREDENTIALS_FILE", str(empty))
+	events = []
+
+	class RecordingClients(async_engine.AsyncClients):
+		def __init__(self, *args, **kwargs) -> None:
+			super().__init__(*args, **kwargs)
+			events.append("created")
+
+		def close(self) -> None:
+			events.append("closed")
+			super().close()
+
+	monkeypatch.setattr(async_engine, "AsyncClients", RecordingClients)
+	monkeypatch.setattr(sys, "stdin", io.StringIO("--engine async ec2list\n--engine async ec2list\nexit\n"))
+
+	assert at.main(["-c", str(config_path), "-d", str(tmp_path / "cache"), "shell"]) == 1
+	assert events == ["created", "closed"]
+
+
+def test_default_output_file_matches_the_output_format(tmp_path) -> None:
+	from cache import CacheKey, CacheStore
+
+	config_path = tmp_path / "config.yaml"
+	config_path.write_text("profiles: [a]\n", encoding="utf-8")
+	cache_dir = tmp_path / "cache"
+	store = CacheStore(str(cache_dir))
+	store.put(
+		CacheKey("run", "a", "us-east-1", "ec2", "describe_volumes"),
+		{"Volumes": [{"VolumeId": "vol-1", "Size": 8, "VolumeType": "gp3", "State": "in-use"}]},
+	)
+	store.flush()
+
+	subprocess.run(
+		[
+			sys.executable,
+			str(ROOT / "at.py"),
+			"-c", str(config_path),
+			"-d", str(cache_dir),
+			"-o", "ndjson",
+			"query", "run", "ebslist",
+		],
+		cwd=tmp_path,
+		capture_output=True,
+		text=True,
+		check=True,
+	)
+
+	assert (tmp_path / "out.ndjson").exists()
+	assert not (tmp_path / "out.csv").exists()
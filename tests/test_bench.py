@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import bench
+from bench import Fleet, report, run_benchmarks
+
+
+def test_benchmarks_run_on_a_small_fleet() -> None:
+	fleet = Fleet(accounts=2, regions=2, instances=2500, volumes=20, buckets=10)
+
+	results = run_benchmarks(
+		fleet,
+		repeat=1,
+		latency=0,
+		only=["invoke.*", "cache.*", "parse.*", "output.csv"],
+	)
+
+	assert results["parse.ec2list"]["items"] == 2500
+	assert results["parse.s3list"]["items"] == 10
+	assert results["output.csv"]["items"] == 20
+	# 2500 instances over 4 cells is one page of 625 each.
+	assert results["invoke.threads"]["items"] == 4
+	assert results["invoke.threads.read"]["items"] == 4
+	assert results["cache.read"]["items"] == 4
+
+
+def test_report_flags_regressions() -> None:
+	results = {"parse.gci": {"seconds": 2.0, "items": 10}, "output.excel": {"skipped": "needs openpyxl"}}
+	previous = {"results": {"parse.gci": {"seconds": 1.0, "items": 10}}}
+
+	text, regressions = report(results, previous)
+
+	assert regressions == ["parse.gci"]
+	assert "skipped" in text
+
+
+def test_no_record_leaves_the_history_and_report_alone(tmp_path, monkeypatch) -> None:
+	report_file = tmp_path / "bench_output.txt"
+	history_file = tmp_path / "history.jsonl"
+	monkeypatch.setattr(bench, "REPORT_FILE", report_file)
+
+	argv = ["--scale", "0.01", "--repeat", "1", "--latency", "0", "--only", "parse.gci", "--history", str(history_file)]
+	assert bench.main([*argv, "--no-record"]) == 0
+	assert not report_file.exists() and not history_file.exists()
+
+	assert bench.main(argv) == 0
+	assert report_file.exists() and history_file.exists()
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from cache import CacheKey, CacheStore, params_hash
+
+
+def test_operations_on_the_same_service_do_not_collide(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	instances = CacheKey("run", "profile", "us-east-1", "ec2", "describe_instances")
+	volumes = CacheKey("run", "profile", "us-east-1", "ec2", "describe_volumes")
+
+	store.put(instances, {"Reservations": []})
+	store.put(volumes, {"Volumes": []})
+
+	assert list(store.get_pages(instances)) == [{"Reservations": []}]
+	assert list(store.get_pages(volumes)) == [{"Volumes": []}]
+
+
+def test_pages_are_committed_only_when_complete(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	key = CacheKey("run", "profile", "us-east-1", "ec2", "describe_instances")
+
+	pages = store.put_pages(key, iter([{"page": 1}, {"page": 2}]))
+	next(pages)
+	assert store.get_pages(key) is None
+
+	list(pages)
+	assert list(store.get_pages(key)) == [{"page": 1}, {"page": 2}]
+
+
+def test_get_many_reads_a_whole_run_and_skips_misses(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	keys = [
+		CacheKey("run", "profile", "us-east-1", "cloudwatch", "get_metric_data", params_hash({"n": n}), f"n{n}")
+		for n in range(3)
+	]
+	for n, key in enumerate(keys[:2]):
+		store.put(key, {"n": n})
+	store.close()
+
+	reopened = CacheStore(str(tmp_path))
+
+	assert reopened.get_many(keys) == {keys[0]: [{"n": 0}], keys[1]: [{"n": 1}]}
+	assert sorted(key.nickname for key in reopened.keys("run", "cloudwatch")) == ["n0", "n1"]
+
+
+def test_datetimes_round_trip_as_typed_values(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	key = CacheKey("run", "profile", "us-east-1", "ec2", "describe_volumes")
+	created = datetime(2026, 10, 18, 2, 15, tzinfo=timezone.utc)
+
+	store.put(key, {"Volumes": [{"VolumeId": "vol-1", "CreateTime": created}]})
+
+	assert list(store.get_pages(key)) == [{"Volumes": [{"VolumeId": "vol-1", "CreateTime": created}]}]
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import pytest
+
+pytest.importorskip("boto3")
+
+from clients import DEFAULT_CLIENT_OPTIONS, ClientCache, LazyMapping, resolve_client_options, select_clients
+
+
+def test_resolve_client_options_merges_service_over_default() -> None:
+	config_data = {
+		"clients": {
+			"default": {"read_timeout": 30},
+			"cloudwatch": {"read_timeout": 120, "max_pool_connections": 8},
+		}
+	}
+
+	options = resolve_client_options(config_data, max_pool_connections=32)
+
+	assert options["default"]["read_timeout"] == 30
+	assert options["default"]["max_pool_connections"] == 32
+	assert options["default"]["retries"] == DEFAULT_CLIENT_OPTIONS["retries"]
+	assert options["cloudwatch"]["read_timeout"] == 120
+	assert options["cloudwatch"]["max_pool_connections"] == 8
+	assert options["cloudwatch"]["tcp_keepalive"] is True
+
+
+def test_client_options_fall_back_to_default() -> None:
+	cache = ClientCache(resolve_client_options({"clients": {"s3": {"read_timeout": 5}}}))
+
+	assert cache.client_options("s3")["read_timeout"] == 5
+	assert cache.client_options("ec2") == cache.client_options("default")
+
+
+def test_select_clients_builds_only_the_selected_client() -> None:
+	built = []
+	clients = {"dev": {"us-east-1": LazyMapping(["s3", "cloudwatch"], lambda client_type: built.append(client_type) or client_type)}}
+
+	selected = select_clients(clients, ["cloudwatch"])
+
+	assert built == []
+	assert dict(selected["dev"]["us-east-1"]) == {"cloudwatch": "cloudwatch"}
+	assert built == ["cloudwatch"]
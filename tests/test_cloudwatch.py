@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+from cloudwatch import build_s3_size_parameters, s3_size_metrics
+
+
+def test_build_s3_size_parameters_batches_queries() -> None:
+	metrics_pages = [
+		(
+			"profile",
+			"us-east-1",
+			"cloudwatch",
+			{
+				"Metrics": [
+					{
+						"Dimensions": [
+							{"Name": "StorageType", "Value": storage_type},
+							{"Name": "BucketName", "Value": f"bucket-{index}"},
+						]
+					}
+					for index in range(3)
+					for storage_type in ("StandardStorage", "GlacierStorage")
+				]
+			},
+		)
+	]
+	now = datetime(2026, 10, 18, 12, 34, tzinfo=timezone.utc)
+
+	parameters = build_s3_size_parameters(s3_size_metrics(metrics_pages), now=now, batch_size=4)
+
+	batches = parameters["profile"]["us-east-1"]
+	assert list(batches) == ["sizes0000", "sizes0001"]
+	assert [len(batch["MetricDataQueries"]) for batch in batches.values()] == [4, 2]
+	first = batches["sizes0000"]
+	assert first["EndTime"] == datetime(2026, 10, 18, 12, tzinfo=timezone.utc)
+	assert first["StartTime"] == datetime(2026, 10, 15, 12, tzinfo=timezone.utc)
+	assert first["MetricDataQueries"][0]["Label"] == "bucket-0 GlacierStorage"
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import json
+import os
+
+import config_loader
+from config_loader import CONFIG_CACHE_FILE, load_config
+
+
+def test_load_config_reuses_parse_until_file_changes(tmp_path) -> None:
+	config_path = tmp_path / "config.yaml"
+	config_path.write_text("regions:\n  - us-east-1\n", encoding="utf-8")
+	cache_dir = tmp_path / "cache"
+	cache_dir.mkdir()
+
+	assert load_config(str(config_path), str(cache_dir)) == {"regions": ["us-east-1"]}
+	stored = json.loads((cache_dir / CONFIG_CACHE_FILE).read_text(encoding="utf-8"))
+	assert stored[str(config_path.resolve())]["config"] == {"regions": ["us-east-1"]}
+
+	config_loader._loaded.clear()
+	assert load_config(str(config_path), str(cache_dir)) == {"regions": ["us-east-1"]}
+
+	config_path.write_text("regions:\n  - eu-west-1\n", encoding="utf-8")
+	stat = config_path.stat()
+	os.utime(config_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+	assert load_config(str(config_path), str(cache_dir)) == {"regions": ["eu-west-1"]}
+
+
+def test_load_config_without_cache_directory(tmp_path) -> None:
+	config_path = tmp_path / "config.yaml"
+	config_path.write_text("profiles: [a]\n", encoding="utf-8")
+
+	assert load_config(str(config_path), str(tmp_path / "missing")) == {"profiles": ["a"]}
+	assert not (tmp_path / "missing").exists()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from typing import Any
+
+from cache import CacheKey, CacheStore
+from diff import DIFF_SPECS, changed_cells, diff_runs
+
+
+def reservations(*instances: tuple[str, str], request_id: str) -> dict[str, Any]:
+	return {
+		"Reservations": [
+			{
+				"Instances": [
+					{"InstanceId": instance_id, "State": {"Name": state}, "InstanceType": "t3.micro"}
+					for instance_id, state in instances
+				]
+			}
+		],
+		"ResponseMetadata": {"RequestId": request_id},
+	}
+
+
+def instances_key(run_key: str, region: str) -> CacheKey:
+	return CacheKey(run_key, "profile", region, "ec2", "describe_instances")
+
+
+def test_diff_reads_only_changed_cells(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	store.put(instances_key("a", "us-east-1"), reservations(("i-1", "running"), request_id="1"))
+	store.put(instances_key("b", "us-east-1"), reservations(("i-1", "running"), request_id="2"))
+	store.put(
+		instances_key("a", "us-east-2"),
+		reservations(("i-2", "running"), ("i-3", "running"), request_id="3"),
+	)
+	store.put(
+		instances_key("b", "us-east-2"),
+		reservations(("i-2", "stopped"), ("i-4", "pending"), request_id="4"),
+	)
+
+	changed_a, changed_b = changed_cells(store, "a", "b", "ec2", "describe_instances")
+	assert changed_a == [instances_key("a", "us-east-2")]
+	assert changed_b == [instances_key("b", "us-east-2")]
+
+	rows = list(diff_runs(store, "a", "b", DIFF_SPECS["ec2list"]))
+
+	assert rows == [
+		["changed", "profile", "us-east-2", "i-2", "stopped", "t3.micro", "status"],
+		["removed", "profile", "us-east-2", "i-3", "running", "t3.micro", ""],
+		["added", "profile", "us-east-2", "i-4", "pending", "t3.micro", ""],
+	]
+
+
+def test_diff_treats_a_cell_missing_from_one_run_as_removed(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	store.put(instances_key("a", "us-east-1"), reservations(("i-1", "running"), request_id="1"))
+
+	rows = list(diff_runs(store, "a", "b", DIFF_SPECS["ec2list"]))
+
+	assert rows == [["removed", "profile", "us-east-1", "i-1", "running", "t3.micro", ""]]
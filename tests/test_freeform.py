@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+
+import pytest
+
+from cache import CacheKey, CacheStore
+from clients import create_clients
+from freeform import (
+	FanOut,
+	fan_out_values,
+	freeform_rows,
+	parameters_by_cell,
+	parse_fan_out,
+	parse_parameters,
+)
+
+
+def test_parse_parameters_reads_json_yaml_and_files(tmp_path) -> None:
+	parameters_file = tmp_path / "parameters.yaml"
+	parameters_file.write_text("- Bucket: logs\n- Bucket: assets\n", encoding="utf-8")
+
+	assert parse_parameters('{"InstanceIds": ["i-1"]}') == [{"InstanceIds": ["i-1"]}]
+	assert parse_parameters("Attribute: disableApiTermination") == [{"Attribute": "disableApiTermination"}]
+	assert parse_parameters(f"@{parameters_file}") == [{"Bucket": "logs"}, {"Bucket": "assets"}]
+	with pytest.raises(ValueError):
+		parse_parameters("[1, 2]")
+	with pytest.raises(ValueError):
+		parse_parameters(f"@{tmp_path / 'missing.yaml'}")
+
+
+def test_parse_fan_out_checks_the_command_and_column() -> None:
+	assert parse_fan_out("InstanceId=ec2list.instance_id") == FanOut("InstanceId", "ec2list", "instance_id")
+	with pytest.raises(ValueError):
+		parse_fan_out("InstanceId=ec2list")
+	with pytest.raises(ValueError):
+		parse_fan_out("Bucket=s3sizes.bucket_name")
+	with pytest.raises(ValueError):
+		parse_fan_out("InstanceId=ec2list.instance")
+
+
+def test_fan_out_values_become_nicknamed_calls_in_their_cells(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	for profile, region, instance_ids in [("a", "us-east-1", ["i-1", "i-2", "i-1"]), ("b", "us-west-2", ["i-3"])]:
+		store.put(
+			CacheKey("run", profile, region, "ec2", "describe_instances"),
+			{"Reservations": [{"Instances": [{"InstanceId": instance_id} for instance_id in instance_ids]}]},
+		)
+
+	values = fan_out_values(store, "run", FanOut("InstanceId", "ec2list", "instance_id"))
+	assert values == {"a": {"us-east-1": ["i-1", "i-2"]}, "b": {"us-west-2": ["i-3"]}}
+
+	cells = {"a": ["us-east-1", "us-east-2"], "b": ["us-west-2"]}
+	parameter_sets = [{"Attribute": "userData"}, {"Attribute": "kernel"}]
+	assert parameters_by_cell(cells, [{"Attribute": "userData"}], "InstanceId", values)["a"] == {
+		"us-east-1": {
+			"i-1": {"Attribute": "userData", "InstanceId": "i-1"},
+			"i-2": {"Attribute": "userData", "InstanceId": "i-2"},
+		},
+	}
+	assert list(parameters_by_cell(cells, parameter_sets, "InstanceId", values)["b"]["us-west-2"]) == ["i-3#0", "i-3#1"]
+	assert parameters_by_cell({"a": ["us-east-1"]}, parameter_sets) == {
+		"a": {"us-east-1": {"0": {"Attribute": "userData"}, "1": {"Attribute": "kernel"}}},
+	}
+
+
+def test_s3list_fan_out_places_buckets_in_their_region_and_profile(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	store.put(
+		CacheKey("run", "a", "global", "s3", "list_buckets"),
+		{"Buckets": [{"Name": "logs", "BucketRegion": "eu-west-1"}, {"Name": "assets"}, {"Name": "unknown"}]},
+	)
+	store.put(CacheKey("run", "b", "global", "s3", "list_buckets"), {"Buckets": [{"Name": "archive"}]})
+
+	values = fan_out_values(
+		store,
+		"run",
+		parse_fan_out("Bucket=s3list.bucket_name"),
+		{"assets": "us-east-1", "archive": "us-west-2"},
+	)
+
+	assert values == {"a": {"eu-west-1": ["logs"], "us-east-1": ["assets"]}, "b": {"us-west-2": ["archive"]}}
+
+	# at freeform builds its cells from the values, so no bucket's region is dropped.
+	_sessions, clients = create_clients(["a"], values, ["s3"])
+	assert parameters_by_cell(clients, [{}], "Bucket", values) == {
+		"a": {"eu-west-1": {"logs": {"Bucket": "logs"}}, "us-east-1": {"assets": {"Bucket": "assets"}}},
+	}
+
+
+def test_freeform_rows_search_and_encode_responses() -> None:
+	launched = datetime(2024, 5, 1, tzinfo=timezone.utc)
+	results = [("a", "us-east-1", "ec2", "i-1", {"LaunchTime": launched, "State": {"Name": "running"}})]
+
+	assert list(freeform_rows(results)) == [
+		["a", "us-east-1", "ec2", "i-1", '{"LaunchTime": "2024-05-01T00:00:00+00:00", "State": {"Name": "running"}}'],
+	]
+	assert list(freeform_rows(results, lambda response: response["State"]["Name"], encode=False)) == [
+		["a", "us-east-1", "ec2", "i-1", "running"],
+	]
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+from collections.abc import Mapping
+import threading
+import time
+from typing import Any, Iterator
+
+import pytest
+
+from function import (
+	CellFailure,
+	Job,
+	invoke_function,
+	invoke_function_special_parameters,
+	invoke_jobs,
+	parse_filters,
+	project,
+	stream_function,
+	stream_function_special_parameters,
+)
+from scheduler import Scheduler, SchedulerSettings
+
+
+class FakeClient:
+	def __init__(self, response: dict[str, Any]) -> None:
+		self.response = response
+		self.calls = 0
+
+	def describe_instances(self) -> dict[str, Any]:
+		self.calls += 1
+		return self.response
+
+
+class FakePaginator:
+	def __init__(self, pages: list[dict[str, Any]]) -> None:
+		self.pages = pages
+
+	def paginate(self) -> Iterator[dict[str, Any]]:
+		yield from self.pages
+
+
+class FakePagingClient(FakeClient):
+	def __init__(self, pages: list[dict[str, Any]]) -> None:
+		super().__init__(pages[0])
+		self.pages = pages
+
+	def can_paginate(self, function_name: str) -> bool:
+		return function_name == "describe_instances"
+
+	def get_paginator(self, function_name: str) -> FakePaginator:
+		return FakePaginator(self.pages)
+
+
+class CountingClients(Mapping[str, Any]):
+	def __init__(self, clients: dict[str, Any]) -> None:
+		self.clients = clients
+		self.built: list[str] = []
+
+	def __getitem__(self, key: str) -> Any:
+		self.built.append(key)
+		return self.clients[key]
+
+	def __iter__(self) -> Iterator[str]:
+		return iter(self.clients)
+
+	def __len__(self) -> int:
+		return len(self.clients)
+
+
+def test_invoke_function_cache_hit_never_builds_client(tmp_path) -> None:
+	client = FakeClient({"Reservations": []})
+	region_clients = CountingClients({"ec2": client})
+	clients = {"profile": {"us-east-1": region_clients}}
+
+	invoke_function(
+		clients,
+		"describe_instances",
+		write=True,
+		key="run",
+		directory=str(tmp_path),
+	)
+	assert client.calls == 1
+	region_clients.built.clear()
+
+	result = invoke_function(
+		clients,
+		"describe_instances",
+		read=True,
+		key="run",
+		directory=str(tmp_path),
+	)
+
+	assert client.calls == 1
+	assert region_clients.built == []
+	assert result == [("profile", "us-east-1", "ec2", {"Reservations": []})]
+
+
+def test_stream_function_follows_pages_and_caches_them(tmp_path) -> None:
+	pages = [
+		{"Reservations": [{"Instances": [{"InstanceId": "i-1"}]}]},
+		{"Reservations": [{"Instances": [{"InstanceId": "i-2"}]}]},
+	]
+	client = FakePagingClient(pages)
+	clients = {"profile": {"us-east-1": {"ec2": client}}}
+
+	written = list(
+		stream_function(
+			clients,
+			"describe_instances",
+			write=True,
+			key="run",
+			directory=str(tmp_path),
+		)
+	)
+	read = list(
+		stream_function(
+			clients,
+			"describe_instances",
+			read=True,
+			key="run",
+			directory=str(tmp_path),
+		)
+	)
+
+	expected = [("profile", "us-east-1", "ec2", page) for page in pages]
+	assert written == expected
+	assert read == expected
+	assert client.calls == 0
+
+
+def test_parse_filters_applies_aliases_and_merges_names() -> None:
+	filters = parse_filters(
+		["state=running,stopped", "tag:Env=prod", "state=pending"],
+		{"state": "instance-state-name"},
+	)
+
+	assert filters == [
+		{"Name": "instance-state-name", "Values": ["running", "stopped", "pending"]},
+		{"Name": "tag:Env", "Values": ["prod"]},
+	]
+	with pytest.raises(ValueError):
+		parse_filters(["running"])
+
+
+def test_project_keeps_only_named_keys_through_lists() -> None:
+	page = {
+		"Reservations": [{"OwnerId": "1", "Instances": [{"InstanceId": "i-1", "State": {"Code": 16, "Name": "running"}}]}],
+		"ResponseMetadata": {"RequestId": "r"},
+	}
+
+	projected = project(page, {"Reservations": {"Instances": {"InstanceId": {}, "State": {"Name": {}}}}})
+
+	assert projected == {"Reservations": [{"Instances": [{"InstanceId": "i-1", "State": {"Name": "running"}}]}]}
+	assert project(page, None) is page
+
+
+def test_stream_function_caches_projected_pages_and_reads_full_ones(tmp_path) -> None:
+	page = {"Reservations": [{"Instances": [{"InstanceId": "i-1", "ImageId": "ami-1"}]}]}
+	projection = {"Reservations": {"Instances": {"InstanceId": {}}}}
+	client = FakePagingClient([page])
+	clients = {"profile": {"us-east-1": {"ec2": client}}}
+
+	def run(**kwargs: Any) -> list[Any]:
+		return [
+			response
+			for _profile, _region, _client_type, response in stream_function(
+				clients,
+				"describe_instances",
+				directory=str(tmp_path),
+				**kwargs,
+			)
+		]
+
+	projected = {"Reservations": [{"Instances": [{"InstanceId": "i-1"}]}]}
+	assert run(write=True, key="projected", projection=projection) == [projected]
+	assert run(read=True, key="projected", projection=projection) == [projected]
+	# A run cached before projection still serves a projected read.
+	assert run(write=True, key="full") == [page]
+	assert run(read=True, key="full", projection=projection) == [page]
+
+
+class FakeStsClient:
+	def __init__(self) -> None:
+		self.calls = 0
+
+	def can_paginate(self, function_name: str) -> bool:
+		return False
+
+	def get_caller_identity(self) -> dict[str, Any]:
+		self.calls += 1
+		return {"Account": "123456789012"}
+
+
+def test_invoke_function_calls_global_operation_once_per_profile() -> None:
+	east_1 = FakeStsClient()
+	east_2 = FakeStsClient()
+	clients = {"profile": {"us-east-1": {"sts": east_1}, "us-east-2": {"sts": east_2}}}
+
+	result = invoke_function(clients, "get_caller_identity")
+
+	assert east_1.calls + east_2.calls == 1
+	assert sorted(region for _profile, region, _client_type, _response in result) == [
+		"us-east-1",
+		"us-east-2",
+	]
+
+
+def test_invoke_function_ttl_serves_fresh_responses_from_any_run(tmp_path) -> None:
+	client = FakeClient({"Reservations": []})
+	clients = {"profile": {"us-east-1": {"ec2": client}}}
+
+	invoke_function(clients, "describe_instances", write=True, key="first", directory=str(tmp_path))
+	result = invoke_function(
+		clients,
+		"describe_instances",
+		directory=str(tmp_path),
+		ttl={"default": 60},
+	)
+	assert client.calls == 1
+	assert result == [("profile", "us-east-1", "ec2", {"Reservations": []})]
+
+	invoke_function(clients, "describe_instances", directory=str(tmp_path), ttl={"ec2": 0})
+	assert client.calls == 2
+
+
+class SlowClient(FakeClient):
+	def __init__(self, response: dict[str, Any], delay: float) -> None:
+		super().__init__(response)
+		self.delay = delay
+
+	def can_paginate(self, function_name: str) -> bool:
+		return False
+
+	def describe_instances(self) -> dict[str, Any]:
+		time.sleep(self.delay)
+		return super().describe_instances()
+
+
+def test_stream_function_ordered_yields_in_cell_order() -> None:
+	clients = {
+		f"profile-{index}": {"us-east-1": {"ec2": SlowClient({"index": index}, delay)}}
+		for index, delay in enumerate([0.05, 0.0, 0.0])
+	}
+
+	result = list(stream_function(clients, "describe_instances", ordered=True, max_pending_pages=1))
+
+	assert [response["index"] for _profile, _region, _client_type, response in result] == [0, 1, 2]
+
+
+class FakeRdsClient:
+	def can_paginate(self, function_name: str) -> bool:
+		return False
+
+	def describe_db_instances(self) -> dict[str, Any]:
+		return {"DBInstances": [{"DBName": "orders"}]}
+
+	def describe_db_clusters(self) -> dict[str, Any]:
+		return {"DBClusters": [{"DatabaseName": "reports"}]}
+
+
+def test_invoke_jobs_runs_every_job_in_one_fan_out() -> None:
+	clients = {"profile": {"us-east-1": {"rds": FakeRdsClient(), "ec2": FakeClient({})}}}
+
+	result = invoke_jobs(
+		clients,
+		[
+			Job("describe_db_clusters", client_type="rds"),
+			Job("describe_db_instances", client_type="rds", name="instances"),
+		],
+	)
+
+	assert result == {
+		"describe_db_clusters": [
+			("profile", "us-east-1", "rds", {"DBClusters": [{"DatabaseName": "reports"}]}),
+		],
+		"instances": [
+			("profile", "us-east-1", "rds", {"DBInstances": [{"DBName": "orders"}]}),
+		],
+	}
+
+
+def test_stream_function_skips_cells_that_were_recently_empty(tmp_path) -> None:
+	empty = FakeClient({"Reservations": []})
+	busy = FakeClient({"Reservations": [{"Instances": [{"InstanceId": "i-1"}]}]})
+	clients = {"profile": {"us-east-1": {"ec2": busy}, "ap-south-1": {"ec2": empty}}}
+
+	def run(recheck_empty: float) -> list[str]:
+		return [
+			region
+			for _profile, region, _client_type, _page in stream_function(
+				clients,
+				"describe_instances",
+				paginate=False,
+				directory=str(tmp_path),
+				recheck_empty=recheck_empty,
+			)
+		]
+
+	assert sorted(run(3600)) == ["ap-south-1", "us-east-1"]
+	assert run(3600) == ["us-east-1"]
+	assert (empty.calls, busy.calls) == (1, 2)
+	# Once recheck_empty has passed, the empty cell is probed again.
+	assert sorted(run(0)) == ["ap-south-1", "us-east-1"]
+	assert empty.calls == 2
+
+
+class ExpiringClient(FakeClient):
+	def __init__(self, response: dict[str, Any]) -> None:
+		super().__init__(response)
+		self.expired = True
+
+	def describe_instances(self) -> dict[str, Any]:
+		if self.expired:
+			raise RuntimeError("token expired")
+		return super().describe_instances()
+
+
+def test_stream_function_isolates_failed_cells_and_resumes_them(tmp_path) -> None:
+	healthy = FakeClient({"Reservations": [{"Instances": [{"InstanceId": "i-1"}]}]})
+	expiring = ExpiringClient({"Reservations": [{"Instances": [{"InstanceId": "i-2"}]}]})
+	clients = {"a": {"us-east-1": {"ec2": healthy}}, "b": {"us-east-1": {"ec2": expiring}}}
+
+	def run(failures: list[CellFailure], **kwargs: Any) -> list[str]:
+		return [
+			profile
+			for profile, _region, _client_type, _page in stream_function(
+				clients,
+				"describe_instances",
+				paginate=False,
+				write=True,
+				key="run",
+				directory=str(tmp_path),
+				failures=failures,
+				**kwargs,
+			)
+		]
+
+	failures: list[CellFailure] = []
+	assert run(failures) == ["a"]
+	assert [(failure.profile, failure.job, failure.message) for failure in failures] == [
+		("b", "describe_instances", "RuntimeError: token expired"),
+	]
+
+	expiring.expired = False
+	resumed: list[CellFailure] = []
+	assert sorted(run(resumed, read=True)) == ["a", "b"]
+	assert resumed == []
+	assert (healthy.calls, expiring.calls) == (1, 1)
+
+
+class BarrierClient:
+	def __init__(self, parties: int) -> None:
+		self.barrier = threading.Barrier(parties, timeout=5)
+		self.calls = 0
+
+	def describe_instance_attribute(self, InstanceId: str) -> dict[str, Any]:
+		self.calls += 1
+		self.barrier.wait()
+		return {"InstanceId": InstanceId}
+
+
+def test_special_parameters_call_nicknames_in_parallel_and_cache_them(tmp_path) -> None:
+	client = BarrierClient(3)
+	clients = {"a": {"us-east-1": {"ec2": client}}}
+	parameters_dict = {"a": {"us-east-1": {f"i-{index}": {"InstanceId": f"i-{index}"} for index in range(3)}}}
+
+	def run() -> list[tuple[str, Any]]:
+		with Scheduler(SchedulerSettings(min_workers=3, rate=0)) as scheduler:
+			return [
+				(nickname, response["InstanceId"])
+				for _profile, _region, _client_type, nickname, response in stream_function_special_parameters(
+					clients,
+					"describe_instance_attribute",
+					parameters_dict,
+					write=True,
+					read=True,
+					key="run",
+					directory=str(tmp_path),
+					scheduler=scheduler,
+					ordered=True,
+				)
+			]
+
+	expected = [("i-0", "i-0"), ("i-1", "i-1"), ("i-2", "i-2")]
+	assert run() == expected
+	assert run() == expected
+	assert client.calls == 3
+
+
+def test_special_parameters_never_build_clients_for_idle_cells() -> None:
+	idle = CountingClients({"ec2": BarrierClient(1)})
+	clients = {"a": {"us-east-1": idle}}
+
+	assert list(stream_function_special_parameters(clients, "describe_instance_attribute", {})) == []
+	assert idle.built == []
+
+
+class FakeCloudWatchClient:
+	def __init__(self) -> None:
+		self.calls = 0
+
+	def get_metric_data(self, **kwargs: Any) -> dict[str, Any]:
+		self.calls += 1
+		return {"MetricDataResults": [{"Label": "logs StandardStorage", "Values": [1.0]}]}
+
+
+def test_special_parameters_replay_ignores_unhashed_time_window(tmp_path) -> None:
+	client = FakeCloudWatchClient()
+	clients = {"a": {"us-east-1": {"cloudwatch": client}}}
+
+	def run(hour: int) -> list[str]:
+		parameters_dict = {"a": {"us-east-1": {"sizes0000": {"MetricDataQueries": [], "StartTime": hour, "EndTime": hour + 1}}}}
+		return [
+			nickname
+			for _profile, _region, _client_type, nickname, _response in invoke_function_special_parameters(
+				clients,
+				"get_metric_data",
+				parameters_dict,
+				read=True,
+				write=True,
+				key="run",
+				directory=str(tmp_path),
+				unhashed={"StartTime", "EndTime"},
+			)
+		]
+
+	assert run(10) == ["sizes0000"]
+	assert run(11) == ["sizes0000"]
+	assert client.calls == 1
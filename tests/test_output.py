@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import json
+
+import pytest
+
+from output import write_output
+
+
+def test_write_output_streams_csv_without_echo(tmp_path, capsys) -> None:
+	path = tmp_path / "out.csv"
+	rows = (["profile", f"vol-{index}", "gp3, encrypted"] for index in range(3))
+
+	count = write_output(["profile", "volume_id", "note"], rows, "csv", str(path))
+
+	assert count == 3
+	assert capsys.readouterr().out == ""
+	assert path.read_text(encoding="utf-8").splitlines() == [
+		"profile,volume_id,note",
+		'profile,vol-0,"gp3, encrypted"',
+		'profile,vol-1,"gp3, encrypted"',
+		'profile,vol-2,"gp3, encrypted"',
+	]
+
+
+def test_write_output_console_quotes_fields(capsys) -> None:
+	write_output(["bucket_name", "size in MB"], iter([["logs, old", None]]), "console", "unused")
+
+	assert capsys.readouterr().out.splitlines() == ["bucket_name,size in MB", '"logs, old",']
+
+
+def test_write_output_console_ends_lines_with_newline_only(capsys) -> None:
+	write_output(["profile", "region"], iter([["dev", "us-east-2"]]), "console", "unused")
+
+	assert capsys.readouterr().out == "profile,region\ndev,us-east-2\n"
+
+
+def test_write_output_excel_write_only(tmp_path) -> None:
+	openpyxl = pytest.importorskip("openpyxl")
+	path = tmp_path / "out.xlsx"
+
+	write_output(["profile", "size"], iter([["p", 1]]), "excel", str(path))
+
+	rows = list(openpyxl.load_workbook(path).active.values)
+	assert rows == [("profile", "size"), ("p", 1)]
+
+
+def test_write_output_ndjson_keeps_types(tmp_path) -> None:
+	path = tmp_path / "out.ndjson"
+	created = datetime(2026, 10, 18, tzinfo=timezone.utc)
+
+	write_output(["volume_id", "size", "created"], iter([["vol-1", 8, created]]), "ndjson", str(path))
+
+	assert [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] == [
+		{"volume_id": "vol-1", "size": 8, "created": "2026-10-18T00:00:00+00:00"}
+	]
+
+
+def test_write_output_parquet_uses_column_types(tmp_path) -> None:
+	pytest.importorskip("pyarrow")
+	import pyarrow.parquet
+
+	path = tmp_path / "out.parquet"
+
+	write_output(
+		["volume_id", "size"],
+		iter([["vol-1", 8], ["vol-2", None]]),
+		"parquet",
+		str(path),
+		column_types={"size": "int"},
+	)
+
+	table = pyarrow.parquet.read_table(path)
+	assert str(table.schema.field("size").type) == "int64"
+	assert table.column("size").to_pylist() == [8, None]
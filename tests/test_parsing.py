@@ -3,7 +3,17 @@ from __future__ import annotations
 import json
 from pathlib import Path
 
-from output_parsing import parse_ec2list, parse_gci, parse_rdslist
+from output_parsing import (
+	EBSLIST,
+	EC2LIST,
+	latest_value,
+	parse_ebslist,
+	parse_ec2list,
+	parse_gci,
+	parse_rdslist,
+	parse_s3list,
+	parse_s3sizes,
+)
 
 
 def test_parse_gci_from_test_data() -> None:
@@ -123,3 +133,74 @@ def test_parse_rdslist_from_test_data_with_results() -> None:
 			"EXERCISEDATABASE",
 		]
 	]
+
+
+def test_parse_s3sizes_takes_latest_value_per_storage_type() -> None:
+	results = [
+		(
+			"AdministratorAccess-070744430225",
+			"us-east-1",
+			"cloudwatch",
+			"sizes0000",
+			{
+				"MetricDataResults": [
+					{
+						"Label": "logs StandardStorage",
+						"Timestamps": ["2026-10-16 00:00:00+00:00", "2026-10-17 00:00:00+00:00"],
+						"Values": [1024 ** 2, 2 * 1024 ** 2],
+					},
+					{"Label": "logs GlacierStorage", "Timestamps": [], "Values": []},
+				]
+			},
+		)
+	]
+	buckets = [
+		["AdministratorAccess-070744430225", "us-east-1", "logs"],
+		["AdministratorAccess-070744430225", "us-east-1", "empty"],
+	]
+
+	headers, output = parse_s3sizes(results, buckets)
+
+	assert headers == ["profile", "region", "bucket_name", "storage_type", "size in MB"]
+	assert output == [
+		["AdministratorAccess-070744430225", "us-east-1", "logs", "StandardStorage", 2.0],
+		["AdministratorAccess-070744430225", "us-east-1", "logs", "GlacierStorage", None],
+		["AdministratorAccess-070744430225", "us-east-1", "empty", "", None],
+	]
+
+
+def test_parse_s3list_reports_each_bucket_once_in_its_region() -> None:
+	response = {"Buckets": [{"Name": "logs"}, {"Name": "assets", "BucketRegion": "eu-west-1"}]}
+	results = [
+		("AdministratorAccess-070744430225", "us-east-1", "s3", response),
+		("AdministratorAccess-070744430225", "us-east-2", "s3", response),
+	]
+
+	headers, output = parse_s3list(results, {"logs": "us-east-2"})
+
+	assert headers == ["profile", "region", "bucket_name"]
+	assert output == [
+		["AdministratorAccess-070744430225", "us-east-2", "logs"],
+		["AdministratorAccess-070744430225", "eu-west-1", "assets"],
+	]
+
+
+def test_row_spec_projection_lists_every_field_the_parser_reads() -> None:
+	assert EC2LIST.projection == {
+		"Reservations": {"Instances": {"InstanceId": {}, "State": {"Name": {}}, "InstanceType": {}}},
+	}
+	assert set(EBSLIST.projection["Volumes"]) == {"VolumeId", "State", "Size", "VolumeType", "Iops"}
+
+
+def test_parse_ebslist_reads_missing_fields_as_empty() -> None:
+	response = {"Volumes": [{"VolumeId": "vol-1", "Size": 8}]}
+
+	headers, output = parse_ebslist([("AdministratorAccess-070744430225", "us-east-1", "ec2", response)])
+
+	assert headers == ["profile", "region", "volume_id", "state", "size", "volume_type", "iops"]
+	assert output == [["AdministratorAccess-070744430225", "us-east-1", "vol-1", "", 8, "", None]]
+
+
+def test_latest_value_takes_the_newest_timestamp_in_one_pass() -> None:
+	assert latest_value(["2024-06-01", "2024-06-03", "2024-06-02"], [1.0, 3.0, 2.0]) == 3.0
+	assert latest_value([], []) is None
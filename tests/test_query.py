@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from cache import CacheKey, CacheStore
+from output_parsing import EBSLIST_HEADERS
+from query import Aggregate, InventoryIndex, parse_aggregate, parse_columns, parse_condition
+
+
+def volumes(*volumes: tuple[str, int, str]) -> dict[str, Any]:
+	return {
+		"Volumes": [
+			{"VolumeId": volume_id, "Size": size, "VolumeType": volume_type, "State": "in-use"}
+			for volume_id, size, volume_type in volumes
+		]
+	}
+
+
+def volumes_key(profile: str) -> CacheKey:
+	return CacheKey("run", profile, "us-east-1", "ec2", "describe_volumes")
+
+
+def test_query_filters_groups_and_aggregates_a_cached_run(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	store.put(volumes_key("a"), volumes(("vol-1", 600, "gp2"), ("vol-2", 100, "gp3")))
+	store.put(volumes_key("b"), volumes(("vol-3", 800, "gp2")))
+	index = InventoryIndex(str(tmp_path))
+
+	assert index.load(store, "run", "ebslist") is True
+	assert index.load(store, "run", "ebslist") is False
+
+	headers, rows = index.query(
+		"run",
+		"ebslist",
+		group_by=["profile"],
+		aggregates=[Aggregate("sum", "size"), Aggregate("count")],
+		order_by=["-sum(size)"],
+	)
+	assert headers == ["profile", "sum(size)", "count(*)"]
+	assert list(rows) == [["b", 800, 1], ["a", 700, 2]]
+
+	headers, rows = index.query(
+		"run",
+		"ebslist",
+		where=[parse_condition("volume_type = gp2", EBSLIST_HEADERS), parse_condition("size>500", EBSLIST_HEADERS)],
+	)
+	assert [row[headers.index("volume_id")] for row in rows] == ["vol-1", "vol-3"]
+
+
+def test_query_reloads_a_run_whose_cache_changed(tmp_path) -> None:
+	store = CacheStore(str(tmp_path))
+	store.put(volumes_key("a"), volumes(("vol-1", 10, "gp2")))
+	index = InventoryIndex(str(tmp_path))
+	index.load(store, "run", "ebslist")
+
+	store.put(volumes_key("a"), volumes(("vol-1", 10, "gp2"), ("vol-2", 20, "gp2")))
+
+	assert index.load(store, "run", "ebslist") is True
+	_headers, rows = index.query("run", "ebslist", aggregates=[Aggregate("count")])
+	assert list(rows) == [[2]]
+
+
+def test_query_expressions_are_checked_against_the_columns() -> None:
+	assert parse_condition("status ~ stop%", ["status"]).operator == "LIKE"
+	assert parse_aggregate("COUNT", ["size"]) == Aggregate("count")
+	assert parse_columns("profile, region", EBSLIST_HEADERS) == ["profile", "region"]
+	with pytest.raises(ValueError):
+		parse_condition("size > large", EBSLIST_HEADERS)
+	with pytest.raises(ValueError):
+		parse_aggregate("median(size)", EBSLIST_HEADERS)
+	with pytest.raises(ValueError):
+		parse_columns("profile; DROP TABLE loaded", EBSLIST_HEADERS)
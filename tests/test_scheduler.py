@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+import pytest
+
+from scheduler import Scheduler, SchedulerSettings, is_throttle_error
+
+
+class FakeClientError(Exception):
+	def __init__(self, code: str) -> None:
+		super().__init__(code)
+		self.response = {"Error": {"Code": code}}
+
+
+def fast_settings(**overrides: Any) -> SchedulerSettings:
+	return SchedulerSettings(rate=0, base_delay=0, max_delay=0, **overrides)
+
+
+def test_settings_from_config_prefers_overrides() -> None:
+	config_data = {"scheduler": {"max_workers": 8, "rate": 5, "unknown": 1}}
+
+	settings = SchedulerSettings.from_config(config_data, rate=2.5, burst=None)
+
+	assert settings.max_workers == 8
+	assert settings.rate == 2.5
+	assert settings.burst == SchedulerSettings().burst
+
+
+def test_call_retries_throttling_and_shrinks_limit() -> None:
+	attempts = []
+
+	def flaky() -> str:
+		attempts.append(1)
+		if len(attempts) < 3:
+			raise FakeClientError("RequestLimitExceeded")
+		return "ok"
+
+	with Scheduler(fast_settings(max_workers=8, min_workers=2)) as scheduler:
+		assert scheduler.call(("p", "r", "s3"), flaky) == "ok"
+		assert scheduler.throttles == 2
+		assert scheduler.limit == 2
+
+
+def test_call_does_not_retry_other_errors() -> None:
+	with Scheduler(fast_settings()) as scheduler:
+		with pytest.raises(FakeClientError):
+			scheduler.call(("p", "r", "ec2"), _raise, "AccessDenied")
+
+
+def test_iterate_resumes_after_throttled_page() -> None:
+	builds = []
+
+	def factory() -> Iterator[int]:
+		builds.append(1)
+		yield 1
+		if len(builds) == 1:
+			raise FakeClientError("Throttling")
+		yield 2
+
+	with Scheduler(fast_settings()) as scheduler:
+		assert list(scheduler.iterate(("p", "r", "ec2"), factory)) == [1, 2]
+	assert len(builds) == 2
+
+
+def test_is_throttle_error() -> None:
+	assert is_throttle_error(FakeClientError("SlowDown"))
+	assert not is_throttle_error(FakeClientError("AccessDenied"))
+	assert not is_throttle_error(ValueError())
+
+
+def _raise(code: str) -> None:
+	raise FakeClientError(code)
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+import pytest
+
+from scheduler import Scheduler, SchedulerSettings
+from stats import CACHE, NETWORK, CallRecord, Recorder, chrome_trace, percentile, summarize
+
+
+class FakeClientError(Exception):
+	def __init__(self, code: str) -> None:
+		super().__init__(code)
+		self.response = {"Error": {"Code": code}}
+
+
+def fast_scheduler() -> Scheduler:
+	return Scheduler(SchedulerSettings(rate=0, base_delay=0, max_delay=0, max_attempts=3))
+
+
+def response(size: int) -> dict[str, Any]:
+	return {"ResponseMetadata": {"HTTPHeaders": {"content-length": str(size)}}}
+
+
+def test_percentile_uses_nearest_rank() -> None:
+	values = [float(value) for value in range(1, 101)]
+
+	assert percentile(values, 0.50) == 50
+	assert percentile(values, 0.99) == 99
+	assert percentile([3.0], 0.95) == 3
+	assert percentile([], 0.5) == 0
+
+
+def test_scheduler_records_calls_retries_and_errors() -> None:
+	attempts = []
+
+	def describe_instances() -> dict[str, Any]:
+		attempts.append(1)
+		if len(attempts) < 2:
+			raise FakeClientError("Throttling")
+		return response(120)
+
+	def describe_volumes() -> None:
+		raise FakeClientError("AccessDenied")
+
+	recorder = Recorder()
+	with fast_scheduler() as scheduler:
+		scheduler.recorder = recorder
+		scheduler.call(("dev", "us-east-2", "ec2"), describe_instances)
+		with pytest.raises(FakeClientError):
+			scheduler.call(("dev", "us-east-2", "ec2"), describe_volumes)
+
+	first, second = sorted(recorder.records(), key=lambda record: record.started)
+	assert (first.operation, first.attempts, first.bytes, first.error) == ("describe_instances", 2, 120, "")
+	assert (second.operation, second.attempts, second.error) == ("describe_volumes", 1, "FakeClientError")
+	assert (first.profile, first.region, first.service) == ("dev", "us-east-2", "ec2")
+
+
+def test_scheduler_counts_botocore_retries_as_attempts() -> None:
+	attempts = []
+
+	def describe_instances() -> dict[str, Any]:
+		attempts.append(1)
+		if len(attempts) < 2:
+			error = FakeClientError("Throttling")
+			error.response["ResponseMetadata"] = {"RetryAttempts": 2}
+			raise error
+		return {"ResponseMetadata": {"RetryAttempts": 1}}
+
+	recorder = Recorder()
+	with fast_scheduler() as scheduler:
+		scheduler.recorder = recorder
+		scheduler.call(("dev", "us-east-2", "ec2"), describe_instances)
+
+	[record] = recorder.records()
+	assert record.attempts == 5
+
+
+def test_scheduler_records_one_call_per_page() -> None:
+	def pages() -> Iterator[dict[str, Any]]:
+		yield response(10)
+		yield response(20)
+
+	recorder = Recorder()
+	with fast_scheduler() as scheduler:
+		scheduler.recorder = recorder
+		assert len(list(scheduler.iterate(("dev", "us-east-2", "ec2"), pages, operation="describe_instances"))) == 2
+
+	records = recorder.records()
+	assert [record.bytes for record in records] == [10, 20]
+	assert {record.operation for record in records} == {"describe_instances"}
+
+
+def test_cached_records_one_read_for_all_pages() -> None:
+	recorder = Recorder()
+
+	assert list(recorder.cached(("dev", "us-east-2", "ec2"), "describe_volumes", iter([1, 2, 3]))) == [1, 2, 3]
+
+	[record] = recorder.records()
+	assert (record.source, record.pages, record.attempts) == (CACHE, 3, 0)
+
+
+def test_summarize_reports_totals_and_operations() -> None:
+	records = [
+		CallRecord("dev", "us-east-2", "ec2", "describe_instances", NETWORK, 0.0, 0.2, attempts=3, bytes=100),
+		CallRecord("dev", "us-east-2", "ec2", "describe_instances", NETWORK, 0.1, 0.1, bytes=50),
+		CallRecord("dev", "us-west-2", "ec2", "describe_instances", CACHE, 0.2, 0.01, attempts=0, pages=2),
+	]
+
+	report = summarize(records)
+
+	assert "requests: 2  retries: 2  errors: 0  bytes: 150" in report
+	assert "cache: 2 of 4 responses (50% hit ratio)" in report
+	assert "ec2.describe_instances" in report
+	assert report.index("dev us-east-2 ec2") < report.index("dev us-west-2 ec2")
+
+
+def test_chrome_trace_has_one_complete_event_per_record() -> None:
+	records = [
+		CallRecord("dev", "us-east-2", "rds", "describe_db_instances", NETWORK, 1.5, 0.25, thread=7),
+		CallRecord("dev", "us-east-2", "rds", "describe_db_clusters", NETWORK, 1.0, 0.5, thread=9),
+	]
+
+	events = chrome_trace(records, 1.0)["traceEvents"]
+
+	assert [event["name"] for event in events] == ["rds.describe_db_clusters", "rds.describe_db_instances"]
+	assert [(event["ts"], event["dur"], event["tid"]) for event in events] == [(0, 500000, 1), (500000, 250000, 2)]
+	assert {event["ph"] for event in events} == {"X"}